@@ -7,15 +7,42 @@
 
 import os
 import re
+import math
 import sys
 import time
+import queue
+import threading
+import itertools
+from collections import deque
 from serial import Serial, SerialException
 from serial.tools import list_ports
 
+from cutcutgo.Geometry import fit_arcs, arc_deviation, clip_segments
+from cutcutgo.Journal import JobJournal, journal_path
+
 sys_platform = sys.platform.lower()
 
 # CAUTION: keep in sync with sendto_cricut.inx
-# media, pressure, speed, depth, cap-color, name
+# Each media is a motion profile, missing keys are taken from MEDIA_DEFAULTS:
+#   pressure, clearance: tool depth when cutting and raised by clearance [mm]
+#   feed: cutting feed, travel_feed: pen up moves, None for G0 rapids,
+#   plunge_feed, retract_feed: lowering and raising the tool [mm/min]
+#   max_rate, z_max_rate: grbl $110,$111 and $112 [mm/min]
+#   acceleration, z_acceleration: grbl $120,$121 and $122 [mm/s^2]
+# The grbl settings are only written when given and different from the device.
+MEDIA_DEFAULTS = {
+  "pressure": 8.5,
+  "clearance": 1.0,
+  "feed": 10,
+  "travel_feed": None,
+  "plunge_feed": 10,
+  "retract_feed": 10,
+  "max_rate": None,
+  "z_max_rate": None,
+  "acceleration": None,
+  "z_acceleration": None
+}
+
 MEDIA = {
   1: {
     "name": "Laser Copy Paper",
@@ -33,6 +60,15 @@ CRICUT_MATS = dict(
   cameo_pro_24x24=('9', 24, 24)
 )
 
+# size of the GRBL serial receive buffer, used by the character counting protocol
+GRBL_RX_BUFFER_SIZE = 128
+# planner blocks of GRBL, assumed lost on a disconnect if nothing better is known
+GRBL_PLANNER_BLOCKS = 16
+# grbl default $110 max rate, used for G0 rapids when the media does not set it [mm/min]
+GRBL_RAPID_RATE = 500.0
+# plot_cmds() converts and clips the paths in chunks of this many points
+PLOT_CHUNK_POINTS = 4096
+
 VENDOR_ID_CRICUT = 0x04d8
 PRODUCT_ID_CRICUT_MAKER1 = 0x000a
 
@@ -43,6 +79,93 @@ DEVICE = [
 ]
 
 
+def _recorded(cmds, record):
+  for cmd in cmds:
+    record.append(cmd)
+    yield cmd
+
+def find_devices():
+  """List all attached cutters as (port name, DEVICE entry) pairs."""
+  found = []
+  for port in list_ports.comports():
+    # Extract VID/PID from hardware info (should work on Linux and Windows)
+    vid_pid = re.search('VID:PID=([a-fA-F0-9]{4}):([a-fA-F0-9]{4})', port.usb_info())
+    if vid_pid is not None:
+      vid, pid = map(lambda x: int(x, 16), vid_pid.groups())
+      for hardware in DEVICE:
+        if hardware['vendor_id'] == vid and hardware['product_id'] == pid:
+          found.append((port.device, hardware))
+  return found
+
+class PathArray:
+  """A pathlist converted once: the points of all paths with at least two
+     points in one (n,2) array [mm], and the end index of each path. It
+     iterates over the paths as arrays, so it can be passed to plot(),
+     measure() and estimate_time() in place of the pathlist, e.g. to measure
+     and then plot the same paths. plot_cmds() takes its chunks from it.
+  """
+  def __init__(self, pathlist):
+    import numpy as np
+    paths = [path for path in pathlist if len(path) >= 2]
+    self.ends = np.cumsum([len(path) for path in paths], dtype=int).tolist()
+    self.points = np.array([point[:2] for path in paths for point in path], dtype=float).reshape(-1, 2)
+
+  def __len__(self):
+    return len(self.ends)
+
+  def __iter__(self):
+    start = 0
+    for end in self.ends:
+      yield self.points[start:end]
+      start = end
+
+  def extents(self):
+    """Return (llx, ury, urx, lly) of all points, or None if there are none."""
+    if not self.ends:
+      return None
+    (llx, ury), (urx, lly) = self.points.min(axis=0).tolist(), self.points.max(axis=0).tolist()
+    return llx, ury, urx, lly
+
+
+def _path_chunks(pathlist, size):
+  """Split pathlist into chunks of about size points, for plot_cmds(). Yields
+     (points, ends, first): the points of the paths with at least two points,
+     or of pieces of size+1 points of longer ones, as an (n,2) array [mm], the
+     end index of each piece, and whether it is the first piece of its path.
+     Other pieces begin with the last point of the piece before them.
+  """
+  import numpy as np
+  pieces, ends, first, n = [], [], [], 0
+  for path in pathlist:
+    if len(path) < 2:
+      continue
+    for k in range(0, len(path)-1, size):
+      piece = path[k:k+size+1]
+      if not isinstance(piece, np.ndarray):
+        piece = np.array([point[:2] for point in piece], dtype=float).reshape(-1, 2)
+      pieces.append(piece)
+      n += len(piece)
+      ends.append(n)
+      first.append(k == 0)
+      if n >= size:
+        yield np.concatenate(pieces), ends, first
+        pieces, ends, first, n = [], [], [], 0
+  if pieces:
+    yield np.concatenate(pieces), ends, first
+
+def _count_points(pathlist):
+  """Number of points of the paths with at least two points."""
+  if isinstance(pathlist, PathArray):
+    return len(pathlist.points)
+  return sum(len(path) for path in pathlist if len(path) >= 2)
+
+def _xy_offset(offset):
+  if offset is None:
+    return (0,0)
+  if type(offset) != type([]) and type(offset) != type(()):
+    return (offset, 0)
+  return offset
+
 def _bbox_extend(bb, x, y):
     # The coordinate system origin is in the top lefthand corner.
     # Downwards and rightwards we count positive. Just like SVG or HPGL.
@@ -52,16 +175,166 @@ def _bbox_extend(bb, x, y):
     if not 'lly' in bb or y > bb['lly']: bb['lly'] = y
     if not 'ury' in bb or y < bb['ury']: bb['ury'] = y
 
+def parse_status_report(report):
+  """Parse a GRBL 1.1 status report like
+     '<Run|MPos:1.000,2.000,0.000|Bf:15,128|FS:500,0>' into a dict.
+     Returns None if report is not a status report.
+  """
+  report = report.strip()
+  if not (report.startswith('<') and report.endswith('>')):
+    return None
+  fields = report[1:-1].split('|')
+  state = {
+    'state': fields[0].split(':')[0],
+    'mpos': None,
+    'feed': None,
+    'planner_free': None,
+    'rx_free': None,
+    'raw': report,
+    'time': time.monotonic()
+  }
+  for field in fields[1:]:
+    key, _, value = field.partition(':')
+    try:
+      values = [float(v) for v in value.split(',')]
+    except ValueError:
+      continue
+    if key == 'MPos':
+      state['mpos'] = tuple(values)
+    elif key in ('F', 'FS'):
+      state['feed'] = values[0]
+    elif key == 'Bf' and len(values) == 2:
+      state['planner_free'] = int(values[0])
+      state['rx_free'] = int(values[1])
+  return state
+
 def to_bytes(b_or_s):
   """Ensure a value is bytes"""
   if isinstance(b_or_s, str): return b_or_s.encode()
   if isinstance(b_or_s, bytes): return b_or_s
   raise TypeError("Value must be a string or bytes.")
 
+class GcodeEncoder:
+  """Modal G-code encoder.
+     Coordinates are rounded to the device resolution [mm] and printed without
+     trailing zeros. Only the words that changed are emitted: the G0/G1 motion
+     mode and the feed when they change, and only the axes that actually move.
+     Moves that do not change any axis return None.
+     Call reset() after sending commands that bypass the encoder.
+     Arcs are G2/G3 with the center offset I, J printed at 0.0001mm, so that
+     the radius check of grbl passes despite the rounded end points.
+  """
+  def __init__(self, resolution=0.05, feed=10):
+    self.resolution = resolution
+    self.feed = feed
+    if resolution:
+      self.digits = max(0, int(math.ceil(-math.log10(resolution) - 1e-9)))
+    else:
+      self.digits = 6
+    self.reset()
+
+  def reset(self):
+    """Forget the device state, the next commands are complete."""
+    self.mode = None
+    self.current_feed = None
+    self.pos = [None, None, None]
+
+  def quantize(self, v):
+    if self.resolution:
+      return int(round(v / self.resolution))
+    return round(v, self.digits)
+
+  def format(self, q):
+    v = q * self.resolution if self.resolution else q
+    txt = b"%.*f" % (self.digits, v)
+    if self.digits:
+      txt = txt.rstrip(b'0').rstrip(b'.')
+    if txt == b'-0':
+      txt = b'0'
+    return txt
+
+  def move(self, x=None, y=None, z=None, feed=None, rapid=False):
+    """ G1 move to the given coordinates [mm], None keeps an axis.
+        feed defaults to self.feed, rapid=True sends a G0 move instead.
+    """
+    words = []
+    for axis, v in enumerate((x, y, z)):
+      if v is None: continue
+      q = self.quantize(v)
+      if q != self.pos[axis]:
+        self.pos[axis] = q
+        words.append(b"XYZ"[axis:axis+1] + self.format(q))
+    if not words:
+      return None
+    mode = 0 if rapid else 1
+    if not rapid:
+      self._feed(words, feed)
+    if self.mode != mode:
+      self.mode = mode
+      words.insert(0, b"G%d" % mode)
+    return b"".join(words)
+
+  def _feed(self, words, feed):
+    if feed is None:
+      feed = self.feed
+    if self.current_feed != feed:
+      self.current_feed = feed
+      words.append(b"F%g" % feed)
+
+  def value(self, q):
+    return q * self.resolution if self.resolution else q
+
+  def arc_geometry(self, x, y, cx, cy):
+    """ The arc that arc() would send from the current position to (x, y)
+        around (cx, cy) [mm]: its rounded start and end point and the center
+        as sent, (sx, sy, ex, ey, cx, cy). None if arc() would not send one.
+    """
+    if self.pos[0] is None or self.pos[1] is None:
+      return None
+    qx, qy = self.quantize(x), self.quantize(y)
+    if qx == self.pos[0] and qy == self.pos[1]:
+      return None
+    sx, sy = self.value(self.pos[0]), self.value(self.pos[1])
+    ex, ey = self.value(qx), self.value(qy)
+    # move the center onto the bisector of the rounded end points
+    mx, my = 0.5*(sx+ex), 0.5*(sy+ey)
+    nx, ny = sy-ey, ex-sx
+    nn = nx*nx + ny*ny
+    t = ((cx-mx)*nx + (cy-my)*ny) / nn
+    i, j = round(mx + t*nx - sx, 4), round(my + t*ny - sy, 4)
+    return sx, sy, ex, ey, sx + i, sy + j
+
+  def arc(self, x, y, cx, cy, ccw, feed=None):
+    """ G2 (clockwise) or G3 (ccw) arc to (x, y) around (cx, cy) [mm] """
+    if self.pos[0] is None or self.pos[1] is None:
+      return self.move(x=x, y=y, feed=feed)
+    arc = self.arc_geometry(x, y, cx, cy)
+    if arc is None:
+      return None
+    sx, sy, ex, ey, cx, cy = arc
+    qx, qy = self.quantize(x), self.quantize(y)
+    words = []
+    mode = 3 if ccw else 2
+    if self.mode != mode:
+      self.mode = mode
+      words.append(b"G%d" % mode)
+    if qx != self.pos[0]: words.append(b"X" + self.format(qx))
+    if qy != self.pos[1]: words.append(b"Y" + self.format(qy))
+    self.pos[0], self.pos[1] = qx, qy
+    for axis, v in ((b"I", cx - sx), (b"J", cy - sy)):
+      txt = (b"%.4f" % v).rstrip(b'0').rstrip(b'.')
+      words.append(axis + (b'0' if txt == b'-0' else txt))
+    self._feed(words, feed)
+    return b"".join(words)
+
+
 class CricutMaker:
   def __init__(self, log=sys.stderr, cmdfile=None, inc_queries=False,
-               dry_run=False, progress_cb=None, force_hardware=None):
-    """ This initializer simply finds the first known device.
+               dry_run=False, progress_cb=None, force_hardware=None,
+               streaming=False, rx_buffer_size=GRBL_RX_BUFFER_SIZE, dev=None,
+               status_poll=None, journal=None, port=None):
+    """ This initializer simply finds the first known device, or the one
+        on the given serial port name. See find_devices() for all of them.
         The default paper alignment is left hand side for devices with known width
         (currently Cameo and Portrait). Otherwise it is right hand side.
         Use setup() to specify your needs.
@@ -82,7 +355,25 @@ class CricutMaker:
         The progress_cb is called with the following parameters:
         int(strokes_done), int(strikes_total), str(status_flags)
         The status_flags contain 't' when there was a (non-fatal) write timeout
-        on the device.
+        on the device, and 'e' when the device answered a line with an error.
+
+        If streaming is True, commands are sent with the GRBL character counting
+        protocol: as many lines as fit into the rx_buffer_size bytes of the
+        controller receive buffer are in flight, instead of waiting for the
+        'ok' of each line before sending the next one.
+
+        If dev is given, it is used instead of searching the serial ports.
+        It must behave like a serial.Serial object, e.g. the simulated
+        cutcutgo.FakeGrbl.FakeGrblSerial.
+
+        If status_poll is given, a background thread requests a '?' status
+        report every status_poll seconds and reads all replies from the device.
+        machine_state() then returns the latest report without blocking.
+
+        If journal is a path, each plot() is written to a job journal there
+        while it is sent, and the progress is checkpointed. journal=True
+        uses the journal of the device, Journal.journal_path(port). An
+        interrupted job can be continued with resume().
     """
     self.leftaligned = False            # True: only works for DEVICE with known hardware.width_mm
     self.log = log
@@ -90,36 +381,37 @@ class CricutMaker:
     self.inc_queries = inc_queries
     self.dry_run = dry_run
     self.progress_cb = progress_cb
-    dev = None
+    self.streaming = streaming
+    self.rx_buffer_size = rx_buffer_size
+    self.line_errors = []
+    self.journal = journal
+    self.toolholder = 1
     self.margins_printed = None
-    self.pressure = 8.5
-    self.clearance = 1.0
+    self.pressure = MEDIA_DEFAULTS['pressure']
+    self.clearance = MEDIA_DEFAULTS['clearance']
+    self.feed = MEDIA_DEFAULTS['feed']
+    self.travel_feed = MEDIA_DEFAULTS['travel_feed']
+    self.plunge_feed = MEDIA_DEFAULTS['plunge_feed']
+    self.retract_feed = MEDIA_DEFAULTS['retract_feed']
+    self.rapid_rate = GRBL_RAPID_RATE
 
     if self.dry_run:
       print("Dry run specified; no commands will be sent to cutter.",
             file=self.log)
 
-    dev = None
-
-    # Enumerate com ports (serial ports)
-    ports = list(list_ports.comports())
-    for port in ports:
-      # Extract VID/PID from hardware info (should work on Linux and Windows)
-      vid_pid = re.search('VID:PID=([a-fA-F0-9]{4}):([a-fA-F0-9]{4})', port.usb_info())
-      if vid_pid is not None:
-        vid, pid = map(lambda x: int(x, 16), vid_pid.groups())
-
-        # If VID/PID matches a device, then we got it ! 
-        for hardware in DEVICE:
-          if hardware['vendor_id'] == vid and hardware['product_id'] == pid:
-            self.hardware = hardware
-            # TODO: handle potential exceptions.
-            dev = Serial(port.device, baudrate=115200, timeout=5000)
-            dev_port = port.device
-        
-        # If our Cricut device has been found, exit search
-        if dev is not None:
-          break
+    dev_port = None
+    if dev is not None:
+      self.hardware = DEVICE[0]
+      dev_port = getattr(dev, 'port', None)
+
+    # Enumerate com ports (serial ports), the first matching device is ours
+    for device, hardware in find_devices() if dev is None else []:
+      if port is None or device == port:
+        self.hardware = hardware
+        # TODO: handle potential exceptions.
+        dev = Serial(device, baudrate=115200, timeout=5000)
+        dev_port = device
+        break
 
     # If no device has been found
     if dev is None:
@@ -133,6 +425,8 @@ class CricutMaker:
             raise ValueError('No Cricut Maker devices found.\nCheck USB and Power.')
         
     print("%s found on port %s" % (self.hardware['name'], dev_port), file=self.log)
+    if journal is True:
+      self.journal = journal_path(dev_port)
 
     self.dev = dev
     self.need_interface = False         # probably never needed, but harmful on some versions of usb.core
@@ -143,8 +437,22 @@ class CricutMaker:
     self.clip_fuzz = 0.05
     self.mock_response = None
     self.tool_up = True
+    self.gcode = GcodeEncoder(resolution=self.clip_fuzz)
+    self.arc_tolerance = 0.0            # 0: cut curves as lines
+
+    self.write_lock = threading.Lock()
+    self.state_cond = threading.Condition()
+    self.machine = None                 # latest parsed status report
+    self.planner_size = 0               # largest number of free planner blocks seen
+    self.replies = queue.Queue()        # non status replies, read by the reader thread
+    self.reader = None
+    self.reader_stop = threading.Event()
+    if status_poll and self.dev is not None:
+      self.start_status_polling(status_poll)
 
   def __del__(self, *args):
+    if getattr(self, 'reader', None) is not None:
+      self.stop_status_polling()
     if self.commands:
       self.commands.close()
 
@@ -157,8 +465,14 @@ class CricutMaker:
   #############################
 
   def read(self, size=64, timeout=5000):
-    """TODO: implement serial read line
+    """Read one line from the device. Returns b'' on timeout.
+       While status polling runs, lines come from the reader thread.
     """
+    if self.reader is not None:
+      try:
+        return self.replies.get(timeout=timeout)
+      except queue.Empty:
+        return b''
     self.dev.timeout = timeout
     try:
       return self.dev.readline()
@@ -169,8 +483,9 @@ class CricutMaker:
     """Send a command to the device. Long commands are sent in chunks of 4096 bytes.
        A nonblocking read() is attempted before write(), to find spurious diagnostics.
     """
-    self.dev.write_timeout = timeout
-    self.dev.write(data)
+    with self.write_lock:
+      self.dev.write_timeout = timeout
+      self.dev.write(data)
 
   def safe_write(self, data):
     """
@@ -191,6 +506,12 @@ class CricutMaker:
     """
     self.write(cmd, is_query=False, timeout=timeout)
 
+  def reply_waiting(self):
+    """True if a reply can be read without blocking."""
+    if self.reader is not None:
+      return not self.replies.empty()
+    return self.dev is not None and self.dev.in_waiting > 0
+
   def try_read(self, size=64, timeout=1000):
     ret=None
     try:
@@ -200,24 +521,50 @@ class CricutMaker:
       pass
     return ret
 
-  def send_receive_command(self, cmds, tx_timeout=10000, rx_timeout=20000, special=False):
-    if not isinstance(cmds, list):
+  def read_reply(self, timeout=5000):
+    """Read one reply line from the device. Returns it as a stripped string,
+       or None if nothing arrived within timeout.
+    """
+    try:
+      resp = self.read(timeout=timeout)
+    except ValueError:
+      return None
+    if not resp:
+      return None
+    return resp.decode(errors='replace').strip()
+
+  def send_receive_command(self, cmds, tx_timeout=10000, rx_timeout=20000, special=False, total=None,
+                           on_ack=None):
+    """Send a single command (bytes) or any iterable of commands, e.g. the
+       generator returned by plot_cmds(). Commands are consumed one at a time,
+       so a generator is never expanded in memory.
+       total is the expected number of commands for progress reporting,
+       defaults to len(cmds) if cmds has a length.
+       With streaming enabled, normal commands go through stream_commands().
+       on_ack is called with the number of lines acknowledged so far.
+    """
+    if isinstance(cmds, (bytes, str)):
       if special:
-        return '<Idle24835|MPos:0.000,0.000,0.000|F:0|Pn:P>'
-        self.send_special_command(cmd, timeout=tx_timeout)
-        try:
-          resp = self.read(timeout=rx_timeout)
-          if len(resp) > 1:
-            return resp[:-1].decode()
-        except:
-          pass
+        if to_bytes(cmds) == b'?':
+          return self.query_status(timeout=rx_timeout)
+        # other real-time commands are not answered
+        self.send_special_command(to_bytes(cmds), timeout=tx_timeout)
+        return None
       else:
         cmds = [cmds]
 
+    if total is None and hasattr(cmds, '__len__'):
+      total = len(cmds)
+
+    if self.streaming and not special:
+      return self.stream_commands(cmds, tx_timeout=tx_timeout, rx_timeout=rx_timeout, total=total,
+                                  on_ack=on_ack)
+
     msg = ''
     o = 0
     for cmd in cmds:
       """ Sends a query and returns its response as a string """
+      o += 1
       if special:
         self.send_special_command(cmd, timeout=tx_timeout)
       else:
@@ -232,50 +579,245 @@ class CricutMaker:
         msg = ''
         self.log.write("\n")
       
-      if self.progress_cb:
-          self.progress_cb(o,len(cmds), msg)
-      elif self.log:
-        self.log.write(" %d%% %s\r" % (100.*o/len(cmds),msg))
-        self.log.flush()
+      if on_ack:
+        on_ack(o)
+      self.report_progress(o, total, msg)
 
     return None
 
+  def stream_commands(self, cmds, tx_timeout=10000, rx_timeout=20000, total=None, on_ack=None):
+    """GRBL character counting protocol.
+       Each line is sent as soon as it fits into the controller receive buffer,
+       together with all lines not yet acknowledged. Every 'ok' or 'error:N'
+       reply acknowledges the oldest line in flight and frees its bytes.
+       Errors are reported with their line number and collected in
+       self.line_errors as (lineno, cmd, reply) tuples.
+    """
+    inflight = deque()      # (lineno, cmd, nbytes) not yet acknowledged
+    used = 0                # bytes in the controller receive buffer
+    sent = 0
+    acked = 0
+    msg = ''
+
+    def ack(timeout):
+      nonlocal used, acked, msg
+      resp = self.read_reply(timeout=timeout)
+      if resp is None:
+        # no answer: assume the oldest line got consumed, else we stall forever
+        msg += 't'
+      elif resp == 'ok':
+        msg = ''
+      elif resp.startswith('error'):
+        msg += 'e'
+      else:
+        if resp.startswith('ALARM'):
+          print("device alarm: %s" % resp, file=self.log)
+        return
+      lineno, cmd, nbytes = inflight.popleft()
+      used -= nbytes
+      acked += 1
+      if resp is not None and resp != 'ok':
+        self.line_errors.append((lineno, cmd, resp))
+        print("line %d: %s: %s" % (lineno, cmd.decode(errors='replace'), resp), file=self.log)
+      if on_ack:
+        on_ack(acked)
+      self.report_progress(acked, total, msg)
+
+    for cmd in cmds:
+      line = to_bytes(cmd) + b'\n'
+      if len(line) > self.rx_buffer_size:
+        raise ValueError("command longer than the receive buffer: %s" % cmd)
+      while inflight and used + len(line) > self.rx_buffer_size:
+        ack(rx_timeout)
+      self.write(line, is_query=True, timeout=tx_timeout)
+      sent += 1
+      inflight.append((sent, line[:-1], len(line)))
+      used += len(line)
+      if total is None or total < sent:
+        total = sent
+      # collect replies that already arrived, without blocking
+      while inflight and self.reply_waiting():
+        ack(rx_timeout)
+
+    while inflight:
+      ack(rx_timeout)
+
+    return None
+
+  def report_progress(self, done, total, msg):
+    """done counts the acknowledged lines. Lines that still wait in the
+       planner, according to the latest status report, are not done yet.
+    """
+    done = max(0, done - self.queued_blocks(default=0))
+    if total is None or total < done:
+      total = done
+    if self.progress_cb:
+      self.progress_cb(done, total, msg)
+    elif self.log:
+      self.log.write(" %d%% %s\r" % (100.*done/total, msg))
+      self.log.flush()
+
   #############################
   # Info getters
   #############################
 
+  def queued_blocks(self, default=GRBL_PLANNER_BLOCKS):
+    """Number of acknowledged lines still waiting in the planner, from the
+       latest status report, or default if unknown.
+    """
+    machine = self.machine
+    if machine is not None and self.planner_size and machine['planner_free'] is not None:
+      return self.planner_size - machine['planner_free']
+    return default
+
+  def start_status_polling(self, interval=0.25):
+    """Start the background thread that polls the status every interval
+       seconds. From now on it is the only reader of the device.
+    """
+    if self.reader is not None:
+      return
+    self.reader_stop.clear()
+    # set once: pyserial reconfigures the port on each change, which must
+    # not happen on the reader thread while the sender writes
+    self.dev.timeout = min(interval, 0.1)
+    self.reader = threading.Thread(target=self._reader_loop, args=(interval,),
+                                   name='cutcutgo-status', daemon=True)
+    self.reader.start()
+
+  def stop_status_polling(self):
+    if self.reader is None:
+      return
+    self.reader_stop.set()
+    self.reader.join()
+    self.reader = None
+
+  def _reader_loop(self, interval):
+    next_poll = 0.0
+    while not self.reader_stop.is_set():
+      now = time.monotonic()
+      try:
+        if now >= next_poll:
+          self.send_special_command(b'?')
+          next_poll = now + interval
+        line = self.dev.readline()
+      except SerialException as err:
+        print("status polling stopped: %s" % err, file=self.log)
+        break
+      if not line:
+        continue
+      text = line.decode(errors='replace').strip()
+      if text.startswith('<'):
+        self._update_state(text)
+      elif text:
+        self.replies.put(line)
+
+  def _update_state(self, report):
+    state = parse_status_report(report)
+    if state is None:
+      return
+    if state['planner_free'] is not None and state['planner_free'] > self.planner_size:
+      self.planner_size = state['planner_free']
+    with self.state_cond:
+      self.machine = state
+      self.state_cond.notify_all()
+
+  def machine_state(self):
+    """Return the latest status report as a dict with the keys 'state',
+       'mpos', 'feed', 'planner_free', 'rx_free', 'raw' and 'time', or None.
+       Does not block.
+    """
+    return self.machine
+
+  def query_status(self, timeout=2.0):
+    """Return a fresh raw status report like '<Idle|MPos:0.000,0.000,0.000|F:0>',
+       or None if the device does not answer.
+    """
+    if self.dev is None:
+      return None
+    asked = time.monotonic()
+    if self.reader is not None:
+      # the reader polls anyway, wait for a report newer than the question
+      deadline = asked + timeout
+      with self.state_cond:
+        while self.machine is None or self.machine['time'] < asked:
+          left = deadline - time.monotonic()
+          if left <= 0 or not self.reader.is_alive():
+            return None
+          self.state_cond.wait(left)
+        return self.machine['raw']
+    self.send_special_command(b'?')
+    while time.monotonic() - asked < timeout:
+      resp = self.read_reply(timeout=timeout)
+      if resp is None:
+        break
+      if resp.startswith('<'):
+        self._update_state(resp)
+        return resp
+    return None
+
   def status(self):
     """Query the device status. This can return one of the three strings
-       'ready', 'moving', 'unloaded' or a raw (unknown) byte sequence.
-
-      TODO: implement this feature   
+       'ready', 'moving', 'unloaded' or the lower case GRBL state
+       ('hold', 'alarm', ...), or 'None' if the device does not answer.
     """
-    return 'ready'
+    if self.dev is None:
+      return 'ready'
+    report = self.query_status()
+    if report is None:
+      return 'None'
+    state = self.machine['state']
+    if state == 'Idle':
+      return 'ready'
+    if state in ('Run', 'Jog', 'Home'):
+      return 'moving'
+    return state.lower()
    
 
   #############################
   # Commands
   #############################
 
-  def acceleration_cmd(self, acceleration):
-    """ Not supported yet """
-    return ""
+  def acceleration_cmd(self, acceleration, z_acceleration=None):
+    """ grbl settings for the acceleration [mm/s^2] """
+    cmds = [b"$120=%g" % acceleration, b"$121=%g" % acceleration]
+    if z_acceleration is not None:
+      cmds.append(b"$122=%g" % z_acceleration)
+    return cmds
+
+  def travel_mm_cmd(self, mmy, mmx):
+    """ Move with the travel feed, or rapid if none is set """
+    return self.gcode.move(x=mmx, y=mmy, feed=self.travel_feed, rapid=self.travel_feed is None)
+
+  def raise_cmd(self, depth):
+    """ Move the tool up to depth [mm] below zero """
+    return self.gcode.move(z=-depth, feed=self.retract_feed)
 
   def move_mm_cmd(self, mmy, mmx):
-    """ Raise tool and move """
-    if self.tool_up:
-      return [b"G01X%fY%fF10" % (mmx, mmy)]
-    else:
+    """ Raise tool and move. Zero length moves are dropped. """
+    cmds = []
+    if not self.tool_up:
       self.tool_up = True
-      return [b"G01Z-%fF10" % (self.pressure - self.clearance), b"G01X%fY%fF10" % (mmx, mmy)]
+      cmds.append(self.raise_cmd(self.pressure - self.clearance))
+    cmds.append(self.travel_mm_cmd(mmy, mmx))
+    return [cmd for cmd in cmds if cmd]
 
   def draw_mm_cmd(self, mmy, mmx):
-    """ Lower tool (if not lowered) and cut """
+    """ Lower tool (if not lowered) and cut. Zero length cuts are dropped. """
+    cmds = []
     if self.tool_up:
-      self.tool_up = False 
-      return [b"G01Z-%fF10" % self.pressure, b"G01X%fY%fF10" % (mmx, mmy)]
-    else:
-      return [b"G01X%fY%fF10" % (mmx, mmy)]
+      self.tool_up = False
+      cmds.append(self.gcode.move(z=-self.pressure, feed=self.plunge_feed))
+    cmds.append(self.gcode.move(x=mmx, y=mmy, feed=self.feed))
+    return [cmd for cmd in cmds if cmd]
+
+  def arc_mm_cmd(self, mmy, mmx, mmcy, mmcx, ccw):
+    """ Lower tool (if not lowered) and cut an arc around (mmcx, mmcy) """
+    cmds = []
+    if self.tool_up:
+      self.tool_up = False
+      cmds.append(self.gcode.move(z=-self.pressure, feed=self.plunge_feed))
+    cmds.append(self.gcode.arc(mmx, mmy, mmcx, mmcy, ccw, feed=self.feed))
+    return [cmd for cmd in cmds if cmd]
 
   def upper_left_mm_cmd(self, mmy, mmx):
     """" Not supported yet """
@@ -294,40 +836,20 @@ class CricutMaker:
     return []
   
 
-  def clip_point(self, x, y, bbox):
-    """
-        Clips coords x and y by the 'clip' element of bbox.
-        Returns the clipped x, clipped y, and a flag which is true if
-        no actual clipping took place.
-    """
-    inside = True
-    if 'clip' not in bbox:
-      return x, y, inside
-    if 'count' not in bbox['clip']:
-      bbox['clip']['count'] = 0
-    if bbox['clip']['llx'] - x > self.clip_fuzz:
-      x = bbox['clip']['llx']
-      inside = False
-    if x - bbox['clip']['urx'] > self.clip_fuzz:
-      x = bbox['clip']['urx']
-      inside = False
-    if bbox['clip']['ury'] - y > self.clip_fuzz:
-      y = bbox['clip']['ury']
-      inside = False
-    if y - bbox['clip']['lly'] > self.clip_fuzz:
-      y = bbox['clip']['lly']
-      inside = False
-    if not inside:
-      #print(f"Clipped point ({x},{y})", file=self.log)
-      bbox['clip']['count'] += 1
-    return x, y, inside
-  
   def plot_cmds(self, plist, bbox, x_off, y_off):
     """
         bbox coordinates are in mm
         bbox *should* contain a proper { 'clip': {'llx': , 'lly': , 'urx': , 'ury': } }
         otherwise a hardcoded flip width is used to make the coordinate system left aligned.
         x_off, y_off are in mm, relative to the clip urx, ury.
+
+        Segments are clipped to the clip box, grown by clip_fuzz. bbox['count']
+        counts the points, bbox['clip']['count'] those outside the clip box.
+
+        This is a generator, yielding one command at a time while the caller
+        sends them. plist is converted in chunks of PLOT_CHUNK_POINTS points
+        as they are needed, it may be any iterable of paths. bbox is
+        complete when the generator is exhausted.
     """
 
     # Change by Alexander Senger:
@@ -354,6 +876,7 @@ class CricutMaker:
     # The conversion to SU (SilhouetteUnits) will be done in command create function.
     # Removing all kinds of multiplying, dividing and rounding.
 
+    import numpy as np
     if bbox is None: bbox = {}
     bbox['count'] = 0
     if not 'only' in bbox: bbox['only'] = False
@@ -363,43 +886,134 @@ class CricutMaker:
       x_off += bbox['clip']['llx']
     if 'clip' in bbox and 'ury' in bbox['clip']:
       y_off += bbox['clip']['ury']
+    box = None
+    if 'clip' in bbox:
+      clip = bbox['clip']
+      clip.setdefault('count', 0)
+      # points within clip_fuzz of the media are not clipped
+      lo = np.array((clip['llx'], clip['ury']))
+      hi = np.array((clip['urx'], clip['lly']))
+      box = np.concatenate((lo - self.clip_fuzz, hi + self.clip_fuzz))
+
+    # the paths are converted and clipped in chunks of about PLOT_CHUNK_POINTS
+    # points, each segment on its own, so that memory does not grow with the job
+    at_end = False    # the tool is at the last point of the previous piece
+    for points, ends, first in _path_chunks(plist, PLOT_CHUNK_POINTS):
+      p = points + (x_off, y_off)
+      # the first point of a piece continuing a path was counted before
+      new = np.ones(len(p), dtype=bool)
+      new[[start for start, f in zip([0] + ends[:-1], first) if not f]] = False
+      (llx, ury), (urx, lly) = p.min(axis=0).tolist(), p.max(axis=0).tolist()
+      _bbox_extend(bbox, llx, ury)
+      _bbox_extend(bbox, urx, lly)
+      bbox['count'] += int(new.sum())
+
+      if box is None:
+        inside = np.ones(len(p), dtype=bool)
+      else:
+        inside = np.all((p >= box[:2]) & (p <= box[2:]), axis=1)
+        bbox['clip']['count'] += int((new & ~inside).sum())
 
-    last_inside = True
-    plotcmds=[]
-    for path in plist:
-      if len(path) < 2: continue
-      x = path[0][0] + x_off
-      y = path[0][1] + y_off
-      _bbox_extend(bbox, x, y)
-      bbox['count'] += 1
-
-      x, y, last_inside = self.clip_point(x, y, bbox)
-
-      if bbox['only'] is False:
-        plotcmds.extend(self.move_mm_cmd(y, x))
-
-      for j in range(1,len(path)):
-        x = path[j][0] + x_off
-        y = path[j][1] + y_off
-        _bbox_extend(bbox, x, y)
-        bbox['count'] += 1
-
-        x, y, inside = self.clip_point(x, y, bbox)
-
-        if bbox['only'] is False:
-          if not self.enable_sw_clipping or (inside and last_inside):
-            plotcmds.extend(self.draw_mm_cmd(y, x))
-          else:
-            # // if outside the range just move
-            plotcmds.extend(self.move_mm_cmd(y, x))
-        last_inside = inside
-    return plotcmds
-  
+      if bbox['only'] is not False: continue
+
+      if box is not None and self.enable_sw_clipping:
+        # segments crossing the media border are cut up to the border, runs
+        # outside of it become one move to where the path enters again
+        visible, t0, t1, a, b = clip_segments(p, box)
+      else:
+        if box is not None:
+          p = np.where(p < box[:2], lo, np.where(p > box[2:], hi, p))
+        n = len(p)-1
+        visible, t0, t1, a, b = np.ones(n, dtype=bool), np.zeros(n), np.ones(n), p[:-1], p[1:]
+      visible, entered, left = visible.tolist(), (t0 == 0).tolist(), (t1 == 1).tolist()
+      (ax, ay), (bx, by), (xs, ys) = a.T.tolist(), b.T.tolist(), p.T.tolist()
+
+      start = 0
+      for end, first_piece in zip(ends, first):
+        arcs = deque()
+        if self.arc_tolerance > 0 and end-start >= 4:
+          arcs.extend((start+i, start+j, cx, cy, ccw) for i, j, cx, cy, ccw
+                      in fit_arcs(xs[start:end], ys[start:end], self.arc_tolerance))
+
+        # index of the point the tool is at, if any
+        at = start if at_end and not first_piece else None
+        j = start
+        while j < end-1:
+          while arcs and arcs[0][0] < j:
+            arcs.popleft()
+          if arcs and arcs[0][0] == j:
+            i_arc, j_arc, cx, cy, ccw = arcs.popleft()
+            # arcs are not clipped, they are only used where no point was clipped
+            if inside[i_arc:j_arc+1].all():
+              if at != j:
+                yield from self.move_mm_cmd(ys[j], xs[j])
+                at = j
+              # check the arc again as sent, with rounded end points and center,
+              # and cut the segments instead where it strays too far
+              arc = self.gcode.arc_geometry(xs[j_arc], ys[j_arc], cx, cy)
+              if arc is not None:
+                sx, sy, ex, ey, cx, cy = arc
+                if arc_deviation([sx] + xs[j+1:j_arc] + [ex], [sy] + ys[j+1:j_arc] + [ey],
+                                 cx, cy, ccw) <= self.arc_tolerance:
+                  yield from self.arc_mm_cmd(ys[j_arc], xs[j_arc], cy, cx, ccw)
+                  at = j = j_arc
+                  continue
+          if visible[j]:
+            if at != j or not entered[j]:
+              yield from self.move_mm_cmd(ay[j], ax[j])
+            yield from self.draw_mm_cmd(by[j], bx[j])
+            at = j+1 if left[j] else None
+          j += 1
+        at_end = at == end-1
+        start = end
+
+
+  def _media_clip(self, mediawidth, mediaheight, margintop, marginleft):
+    """The clip box of plot(), from the media size and the top and left margin [mm]."""
+    if margintop  is None and 'margin_top_mm'  in self.hardware: margintop  = self.hardware['margin_top_mm']
+    if marginleft is None and 'margin_left_mm' in self.hardware: marginleft = self.hardware['margin_left_mm']
+    if margintop  is None: margintop = 0
+    if marginleft is None: marginleft = 0
+
+    # if 'margin_top_mm' in s.hardware:
+    #   print("hardware margin_top_mm = %s" % (s.hardware['margin_top_mm']), file=s.log)
+    # if 'margin_left_mm' in s.hardware:
+    #   print("hardware margin_left_mm = %s" % (s.hardware['margin_left_mm']), file=s.log)
+
+    if self.leftaligned and 'width_mm' in self.hardware:
+      # marginleft += s.hardware['width_mm'] - mediawidth  ## FIXME: does not work.
+      mediawidth = self.hardware['width_mm']
+
+    print("mediabox: (%g,%g)-(%g,%g)" % (marginleft,margintop, mediawidth,mediaheight), file=self.log)
+
+    width  = mediawidth
+    height = mediaheight
+    top    = margintop
+    left   = marginleft
+    if width < left: width  = left
+    if height < top: height = top
+
+    return {'urx':width, 'ury':top, 'llx':left, 'lly':height}
+
+  def measure(self, pathlist, mediawidth=210.0, mediaheight=297.0, margintop=None,
+              marginleft=None, offset=None):
+    """Return the bounding box and point counts of pathlist, as plot() would,
+       in one pass over the points and without talking to the device. The
+       arguments are those of plot(); pathlist may be a PathArray.
+       The dict holds llx, ury, urx, lly [mm], the 'count' of points and the
+       'clip' box, with the 'count' of points outside of it.
+    """
+    offset = _xy_offset(offset)
+    bbox = {'clip': self._media_clip(mediawidth, mediaheight, margintop, marginleft), 'only': None}
+    for cmd in self.plot_cmds(pathlist, bbox, offset[0], offset[1]): pass
+    for key in ('llx', 'lly', 'urx', 'ury'):
+      bbox.setdefault(key, 0)           # survive empty pathlist
+    return bbox
 
   def plot(self, mediawidth=210.0, mediaheight=297.0, margintop=None,
            marginleft=None, pathlist=None, offset=None, bboxonly=False,
            end_paper_offset=0, endposition='below', regmark=False, regsearch=False,
-           regwidth=180, reglength=230, regoriginx=15.0, regoriginy=20.0):
+           regwidth=180, reglength=230, regoriginx=15.0, regoriginy=20.0, record=None):
     """plot sends the pathlist to the device (real or dummy) and computes the
        bounding box of the pathlist, which is returned.
 
@@ -412,7 +1026,7 @@ class CricutMaker:
            desired position.  The top and left media margin is always added to the
            origin. Default: margin only.
        bboxonly:  True for drawing the bounding instead of the actual cut design;
-                  None for not moving at all (just return the bounding box).
+                  None for not moving at all (just return the bounding box, see measure()).
                   Default: False for normal cutting or drawing.
        end_paper_offset: [mm] adds to the final move, if endposition is 'below'.
                 If the end_paper_offset is negative, the end position is within the drawing
@@ -421,62 +1035,70 @@ class CricutMaker:
        endposition: Default 'below': The media is moved to a position below the actual cut (so another
                 can be started without additional steps, also good for using the cross-cutter).
                 'start': The media is returned to the position where the cut started.
+       record: a list, or anything with append(), e.g. a JobCache.JobRecord. All
+                commands of the job are appended to it as they are sent.
+                plot_compiled() sends them again.
        Example: The letter Y (20mm tall, 9mm wide) can be generated with
                 pathlist=[[(0,0),(4.5,10),(4.5,20)],[(9,0),(4.5,10)]]
     """
-    bbox = { }
-    if margintop  is None and 'margin_top_mm'  in self.hardware: margintop  = self.hardware['margin_top_mm']
-    if marginleft is None and 'margin_left_mm' in self.hardware: marginleft = self.hardware['margin_left_mm']
-    if margintop  is None: margintop = 0
-    if marginleft is None: marginleft = 0
-
-    # if 'margin_top_mm' in s.hardware:
-    #   print("hardware margin_top_mm = %s" % (s.hardware['margin_top_mm']), file=s.log)
-    # if 'margin_left_mm' in s.hardware:
-    #   print("hardware margin_left_mm = %s" % (s.hardware['margin_left_mm']), file=s.log)
-
-    if self.leftaligned and 'width_mm' in self.hardware:
-      # marginleft += s.hardware['width_mm'] - mediawidth  ## FIXME: does not work.
-      mediawidth = self.hardware['width_mm']
+    # the points are converted while the commands are generated
+    paths = pathlist if pathlist is not None else []
+    if bboxonly is None:
+      bbox = self.measure(paths, mediawidth, mediaheight, margintop, marginleft, offset)
+      print("Final bounding box and point counts: " + str(bbox), file=self.log)
+      return {
+          'bbox': bbox,
+          'unit' : 1,
+          'trailer': []
+        }
 
-    print("mediabox: (%g,%g)-(%g,%g)" % (marginleft,margintop, mediawidth,mediaheight), file=self.log)
-
-    width  = mediawidth
-    height = mediaheight
-    top    = margintop
-    left   = marginleft
-    if width < left: width  = left
-    if height < top: height = top
-
-    x_off = left
-    y_off = top
-    if offset is None:
-      offset = (0,0)
+    bbox = { }
+    if record is not None:
+      # the recording must not depend on the modal state of earlier jobs
+      self.gcode.reset()
+      recorded = lambda cmds: _recorded(cmds, record)
     else:
-      if type(offset) != type([]) and type(offset) != type(()):
-        offset = (offset, 0)
-
-    bbox['clip'] = {'urx':width, 'ury':top, 'llx':left, 'lly':height}
+      recorded = lambda cmds: cmds
+    offset = _xy_offset(offset)
+    bbox['clip'] = self._media_clip(mediawidth, mediaheight, margintop, marginleft)
     bbox['only'] = bboxonly
-    cmd_list = self.plot_cmds(pathlist,bbox,offset[0],offset[1])
-    print("Final bounding box and point counts: " + str(bbox), file=self.log)
+    # Move tool near the media. It is sent first, so it is also encoded
+    # before the commands that follow it.
+    approach = [cmd for cmd in (self.raise_cmd(self.pressure - self.clearance),) if cmd]
+
+    cmd_list = self.plot_cmds(paths,bbox,offset[0],offset[1])
+    # one command per point, plus the tool changes
+    npoints = _count_points(paths)
 
     if bboxonly == True:
+      for cmd in cmd_list: pass       # no commands, just completes the bbox
+      print("Final bounding box and point counts: " + str(bbox), file=self.log)
       # move the bounding box
-      cmd_list = [
-        self.move_mm_cmd(bbox['ury'], bbox['llx']),
-        self.draw_mm_cmd(bbox['ury'], bbox['urx']),
-        self.draw_mm_cmd(bbox['lly'], bbox['urx']),
-        self.draw_mm_cmd(bbox['lly'], bbox['llx']),
-        self.draw_mm_cmd(bbox['ury'], bbox['llx'])]
-
-    # Move tool near the media
-    self.send_receive_command([
-      b"G01Z-%fF10" % (self.pressure - self.clearance)
-    ])    
+      cmd_list = (
+        self.move_mm_cmd(bbox['ury'], bbox['llx']) +
+        self.draw_mm_cmd(bbox['ury'], bbox['urx']) +
+        self.draw_mm_cmd(bbox['lly'], bbox['urx']) +
+        self.draw_mm_cmd(bbox['lly'], bbox['llx']) +
+        self.draw_mm_cmd(bbox['ury'], bbox['llx']))
+
+    if self.journal and bboxonly == False:
+      # the job including the trailer, journaled while it is sent
+      new_home = []
+      def trailer():
+        new_home.extend(self.trailer_cmds())
+        yield from new_home
+      self.send_journaled(recorded(itertools.chain(approach, cmd_list, trailer())),
+                          total=npoints + len(approach))
+      print("Final bounding box and point counts: " + str(bbox), file=self.log)
+    else:
+      if approach:
+        self.send_receive_command(recorded(approach))
 
-    # potentially long command string needs extra care
-    self.send_receive_command(cmd_list)
+      # potentially long command stream, generated while sending
+      self.send_receive_command(recorded(cmd_list), total=npoints if bboxonly == False else None)
+      if bboxonly == False:
+        print("Final bounding box and point counts: " + str(bbox), file=self.log)
+      new_home = None
 
     # Silhouette Cameo2 does not start new job if not properly parked on left side
     # Attention: This needs the media to not extend beyond the left stop
@@ -492,8 +1114,9 @@ class CricutMaker:
       new_home = self.move_mm_cmd(bbox['lly'] + end_paper_offset, 0)
     self.send_receive_command(new_home)
     """
-    new_home = [b"G01Z0F10", b"G01Y00F10"]
-    self.send_receive_command(new_home)
+    if new_home is None:
+      new_home = self.trailer_cmds()
+      self.send_receive_command(recorded(new_home))
 
 
     # Plotting is finished, raise tool and move to lly
@@ -504,12 +1127,107 @@ class CricutMaker:
         'trailer': new_home
       }
   
+  def plot_compiled(self, cmds, bbox):
+    """Send the commands recorded by plot(record=...) again, after the same
+       setup(). bbox is the bounding box that plot() returned for them.
+    """
+    self.gcode.reset()
+    if self.journal:
+      self.send_journaled(cmds, total=len(cmds))
+    else:
+      self.send_receive_command(cmds, total=len(cmds))
+    self.gcode.reset()
+    return {
+        'bbox': bbox,
+        'unit' : 1,
+        'trailer': None
+      }
+
+  def trailer_cmds(self):
+    """ Raise the tool completely and move back to Y=0 """
+    return [cmd for cmd in (self.raise_cmd(0), self.travel_mm_cmd(0, None)) if cmd]
+
+  def send_journaled(self, cmds, total=None):
+    """Send cmds as a new job, each written to the job journal as it is sent.
+       If the device fails, the rest of the job is written as well, for
+       resume(). On other errors, or if cmds raises, the job stays incomplete.
+    """
+    if total is None and hasattr(cmds, '__len__'):
+      total = len(cmds)
+    cmds = iter(cmds)
+    job = JobJournal(self.journal)
+    job.create(toolholder=self.toolholder, plunge_feed=self.plunge_feed,
+               retract_feed=self.retract_feed)
+    print("job journal: %s" % job.cmd_path, file=self.log)
+    try:
+      self._send_job(job, job.recorded(cmds), 0, total)
+    except BaseException as err:
+      # serial and I/O errors, read() reports them as ValueError
+      if isinstance(err, (OSError, ValueError)) and not job.source_failed:
+        try:
+          for cmd in cmds:
+            job.append(cmd)
+        except BaseException:
+          job.abort()
+          raise
+        job.close()
+      else:
+        job.abort()
+      raise
+
+  def _send_job(self, job, cmds, start, total):
+    # lines in the planner are lost when the controller resets, they only
+    # count as executed when they left it.
+    def executed(acked):
+      job.executed(max(start, start + acked - self.queued_blocks()))
+    try:
+      self.send_receive_command(cmds, total=total, on_ack=executed)
+    finally:
+      job.save()
+    job.close()
+    job.finish()
+
+  def resume(self, journal=None):
+    """Continue the job in the journal after an interruption.
+       The device is homed, the tool moved up and over to the position of
+       the last executed line and lowered to its depth. Then the job is sent
+       from that line on. Returns False if there is nothing to resume.
+    """
+    journal = journal or self.journal
+    job = JobJournal.load(journal) if journal else None
+    if job is None or job.meta['done']:
+      print("no interrupted job in journal %s" % journal, file=self.log)
+      return False
+    if not job.meta.get('complete', True):
+      print("job in journal %s ended before all of it was written, cannot resume" % journal,
+            file=self.log)
+      return False
+    start = job.meta['executed']
+    state = job.state_at(start)
+    print("resuming job at line %d of %d, state %s" % (start, job.lines, state), file=self.log)
+
+    self.send_receive_command([b'T%d' % job.meta['toolholder'], b'$H'])
+    restore = [b"G1Z0F%g" % job.meta['retract_feed']]
+    if state['X'] is not None and state['Y'] is not None:
+      restore.append(b"G0X%sY%s" % (state['X'], state['Y']))
+    if state['Z'] is not None:
+      restore.append(b"G1Z%sF%g" % (state['Z'], job.meta['plunge_feed']))
+    if state['G'] is not None:
+      restore.append(b"G%d" % state['G'] + (b"F" + state['F'] if state['F'] is not None else b""))
+    self.send_receive_command(restore)
+
+    self._send_job(job, job.commands(start), start, job.lines - start)
+    self.tool_up = True
+    self.gcode.reset()
+    return True
+
   def move_origin(self, feed_mm):
     self.wait_for_ready()
     self.send_receive_command([
       b"G10L02P0Y%d" % feed_mm,
       b"G01Y0"
     ])
+    self.gcode.reset()
     self.wait_for_ready()
 
   def load_dumpfile(self,file):
@@ -529,6 +1247,10 @@ class CricutMaker:
     return data1234
   
   def wait_for_ready(self, timeout=30, poll_interval=2.0, verbose=False):
+    """Wait until the device reports Idle. With status polling running,
+       this returns as soon as the report arrives, otherwise the device is
+       asked every poll_interval seconds.
+    """
     # get_version() is likely to timeout here...
     # if verbose: print("device version: '%s'" % s.get_version(), file=sys.stderr)
     state = self.status()
@@ -536,8 +1258,9 @@ class CricutMaker:
       # not actually sending commands, so don't really care about being ready
       return state
     npolls = int(timeout/poll_interval)
-    for i in range(1, npolls):
-      if (state == 'ready'): break
+    start = time.monotonic()
+    while state != 'ready' and time.monotonic() - start < timeout:
+      i = int((time.monotonic() - start)/poll_interval) + 1
       if (state == 'None'):
         raise NotImplementedError("Waiting for ready but no device exists.")
       if verbose: print(" %d/%d: status=%s\r" % (i, npolls, state), end='', file=sys.stderr)
@@ -546,7 +1269,8 @@ class CricutMaker:
           print(" %d/%d: please load media ...\r" % (i, npolls), end='', file=sys.stderr)
         elif i > npolls/3:
           print(" %d/%d: status=%s\r" % (i, npolls, state), end='', file=sys.stderr)
-      time.sleep(poll_interval)
+      if self.reader is None:
+        time.sleep(poll_interval)
       state = self.status()
     if verbose: print("",file=sys.stderr)
     return state
@@ -580,16 +1304,15 @@ class CricutMaker:
     """
     pass
 
-  def setup(self, media=1, speed=None, pressure=None, toolholder=None, pen=None, cuttingmat=None, sharpencorners=False, sharpencorners_start=0.1, sharpencorners_end=0.1, autoblade=False, depth=None, sw_clipping=True, clip_fuzz=0.05, trackenhancing=False, bladediameter=0.9, landscape=False, leftaligned=None, mediawidth=210.0, mediaheight=297.0):
+  def setup(self, media=1, speed=None, pressure=None, toolholder=None, pen=None, cuttingmat=None, sharpencorners=False, sharpencorners_start=0.1, sharpencorners_end=0.1, autoblade=False, depth=None, sw_clipping=True, clip_fuzz=0.05, resolution=None, arc_tolerance=0.0, trackenhancing=False, bladediameter=0.9, landscape=False, leftaligned=None, mediawidth=210.0, mediaheight=297.0):
     """Setup the Cricut Device
 
     Parameters
     ----------
         media : int, optional
             range is [1..11], "Print Paper Light Weight". Defaults to 1.
-        speed : int, optional
-            range is [1..10] for Cameo3 and older,
-            range is [1..30] for Cameo4. Defaults to None, from paper (132 -> 10).
+        speed : float, optional
+            cutting feed [mm/min]. Defaults to None, the feed of the media profile.
         pressure : int, optional
             range is [1..33], Notice: Cameo runs trackenhancing if you select a pressure of 19 or more. Defaults to None, from paper (132 -> 5).
         toolholder : int, optional
@@ -612,6 +1335,13 @@ class CricutMaker:
             Defaults to True.
         clip_fuzz : float, optional
             Defaults to 1/20 mm, the device resolution
+        resolution : float, optional
+            coordinates are sent rounded to this [mm]. Defaults to clip_fuzz.
+        arc_tolerance : float, optional
+            runs of points within this distance [mm] of a circular arc are cut
+            as one G2/G3 arc of at most 180 degrees, if the arc as sent, with
+            its end points and center rounded, stays within it as well.
+            Defaults to 0.0, cutting lines only.
         trackenhancing : bool, optional
             Defaults to False.
         bladediameter : float, optional
@@ -644,22 +1374,102 @@ class CricutMaker:
                 pen = False
 
         if media in MEDIA:
-            selected_media = MEDIA[media]
+            selected_media = dict(MEDIA_DEFAULTS, **MEDIA[media])
             print("Media=%d, name='%s'" % (media, selected_media['name']), file=self.log)
             if pressure is None:
               self.pressure = selected_media['pressure']
               self.clearance = selected_media['clearance']
+            self.feed = selected_media['feed']
+            self.travel_feed = selected_media['travel_feed']
+            self.plunge_feed = selected_media['plunge_feed']
+            self.retract_feed = selected_media['retract_feed']
+            self.rapid_rate = selected_media['max_rate'] or GRBL_RAPID_RATE
+            self.apply_grbl_settings(selected_media)
+
+    if speed is not None:
+      self.feed = speed
+    print("feed: cut %g, travel %s, plunge %g, retract %g" % (self.feed,
+      "rapid" if self.travel_feed is None else "%g" % self.travel_feed,
+      self.plunge_feed, self.retract_feed), file=self.log)
 
     # Select the right toolholder
     self.send_receive_command([b'T%d' % toolholder, b'$H'])
+    self.toolholder = toolholder
     self.tool_up = True
+    self.gcode.reset()
 
     print("toolholder: %d" % toolholder, file=self.log)
 
     self.enable_sw_clipping = sw_clipping
     self.clip_fuzz = clip_fuzz
+    self.gcode = GcodeEncoder(resolution=clip_fuzz if resolution is None else resolution,
+                              feed=self.feed)
+    self.arc_tolerance = arc_tolerance
  
 
+  def read_grbl_settings(self, timeout=2):
+    """Read the '$$' settings of the device as a dict {number: value}."""
+    settings = {}
+    self.send_command(b'$$')
+    while True:
+      resp = self.read_reply(timeout=timeout)
+      if resp is None or resp == 'ok' or resp.startswith('error'):
+        break
+      m = re.match(r'\$(\d+)=([-+]?[0-9]*\.?[0-9]+)', resp)
+      if m:
+        settings[int(m.group(1))] = float(m.group(2))
+    return settings
+
+  def apply_grbl_settings(self, profile):
+    """Write the grbl max rate and acceleration settings of a media profile,
+       if they differ from the device. They are stored in the EEPROM
+       of the controller, so unchanged values are not written again.
+    """
+    wanted = {}
+    for key, numbers in (('max_rate', (110, 111)), ('z_max_rate', (112,)),
+                         ('acceleration', (120, 121)), ('z_acceleration', (122,))):
+      if profile.get(key) is not None:
+        for n in numbers:
+          wanted[n] = float(profile[key])
+    if not wanted or self.dev is None:
+      return
+    current = self.read_grbl_settings()
+    cmds = [b"$%d=%g" % (n, v) for n, v in sorted(wanted.items()) if current.get(n) != v]
+    if cmds:
+      print("grbl settings: %s" % b" ".join(cmds).decode(), file=self.log)
+      self.send_receive_command(cmds)
+
+  def output_key(self):
+    """What the commands of plot() depend on besides its arguments and the
+       setup(): the hardware with its width and margins, that give the clip
+       box, the alignment and dry_run. Cached jobs are only sent again to a
+       device with the same output_key().
+    """
+    hardware = sorted((k, repr(v)) for k, v in self.hardware.items())
+    return (hardware, self.leftaligned, bool(self.dry_run))
+
+  def estimate_time(self, cut):
+    """Estimate the seconds needed to cut all paths of cut [mm] with the
+       current feeds: cutting, travel between the paths, and lowering and
+       raising the tool for each path. Acceleration is ignored.
+    """
+    import numpy as np
+    cut_len = travel_len = 0.0
+    last = np.zeros(2)
+    npaths = 0
+    for path in cut:
+      if len(path) == 0:
+        continue
+      xy = np.asarray(path, dtype=float)[:, :2]
+      cut_len += np.hypot(*np.diff(xy, axis=0).T).sum()
+      travel_len += np.hypot(*(xy[0] - last))
+      last = xy[-1]
+      npaths += 1
+    travel_len += np.hypot(*last)       # back home
+    depth = self.pressure
+    return 60.0 * (cut_len / self.feed + travel_len / (self.travel_feed or self.rapid_rate)
+                   + npaths * (depth / self.plunge_feed + depth / self.retract_feed))
+
   def find_bbox(self, cut):
     """Find the bounding box of the cut, returns (xmin,ymin,xmax,ymax)"""
     bb = {}
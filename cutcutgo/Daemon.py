@@ -0,0 +1,296 @@
+# Job queue daemon, keeping the cutter open between jobs.
+#
+# The daemon opens the cutter once, with status polling, and listens on a
+# Unix socket. Clients send one JSON request per line and get one JSON reply
+# per line:
+#   {"op": "submit", "setup": {...}, "plot": {...}, "name": "..."}
+#       queue a job. setup holds CricutMaker.setup() arguments; the device
+#       is only set up (and homed) again when they differ from the last job.
+#       plot holds CricutMaker.plot() arguments, with "autocrop": true the
+#       design is moved to the offset. Replies with the job "id".
+#   {"op": "status"}              the device state and all jobs
+#   {"op": "wait", "id": n}       block until job n is done, reply with it
+#   {"op": "shutdown"}            finish the queued jobs and exit
+#
+# Jobs pass two stages: a prepare thread (autocrop, time estimate) works on
+# the next job while the cutter thread sends the current one.
+#
+# Usage:
+#   python3 -m cutcutgo.Daemon serve [--socket PATH] [--log FILE]
+#   python3 -m cutcutgo.Daemon status|shutdown
+#   python3 -m cutcutgo.Daemon submit dump_or_log_file [--wait]
+
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import threading
+import socketserver
+from tempfile import gettempdir
+
+from cutcutgo.Cutcutgo import CricutMaker, PathArray
+
+
+def default_socket_path():
+  rundir = os.environ.get('XDG_RUNTIME_DIR') or gettempdir()
+  return os.path.join(rundir, 'cutcutgo-%d.sock' % os.getuid())
+
+
+class _Handler(socketserver.StreamRequestHandler):
+  def handle(self):
+    for line in self.rfile:
+      try:
+        reply = self.server.daemon.request(json.loads(line))
+      except Exception as e:
+        reply = dict(ok=False, error='%s: %s' % (type(e).__name__, e))
+      self.wfile.write(json.dumps(reply).encode() + b'\n')
+      self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  daemon_threads = True
+
+
+class CutterDaemon:
+  def __init__(self, socket_path=None, log=sys.stderr, **kwargs):
+    """
+        socket_path: Unix socket to listen on, default_socket_path().
+        Other keyword arguments are passed to CricutMaker, which is
+        opened with the first job and again after a failed one.
+    """
+    self.socket_path = socket_path or default_socket_path()
+    self.log = log
+    self.kwargs = dict(dict(status_poll=0.25), **kwargs)
+    self.dev = None
+    self.last_setup = None
+    self.jobs = {}
+    self.next_id = 1
+    self.lock = threading.Condition()
+    self.prepare_queue = queue.Queue()
+    self.cut_queue = queue.Queue()
+    self.server = None
+    self.stopping = False
+
+  #############################
+  # Requests
+  #############################
+
+  def request(self, req):
+    op = req.get('op')
+    if op == 'submit':
+      return self.submit(req.get('setup', {}), req.get('plot', {}), req.get('name'))
+    if op == 'status':
+      return self.status()
+    if op == 'wait':
+      return self.wait(req['id'], req.get('timeout'))
+    if op == 'shutdown':
+      threading.Thread(target=self.shutdown, daemon=True).start()
+      return dict(ok=True)
+    return dict(ok=False, error='unknown op %r' % op)
+
+  def submit(self, setup, plot, name=None):
+    with self.lock:
+      if self.stopping:
+        return dict(ok=False, error='daemon is shutting down')
+      job = dict(id=self.next_id, name=name, state='queued', estimate=None,
+                 bbox=None, error=None, submitted=time.time())
+      self.next_id += 1
+      self.jobs[job['id']] = job
+    self.prepare_queue.put((job, setup, plot))
+    print("job %d queued: %s" % (job['id'], name), file=self.log)
+    return dict(ok=True, id=job['id'], queued=self.prepare_queue.qsize() + self.cut_queue.qsize())
+
+  def status(self):
+    dev = self.dev
+    return dict(ok=True, device=None if dev is None else dev.status(),
+                machine=None if dev is None else dev.machine_state(),
+                jobs=[dict(job) for job in self.jobs.values()])
+
+  def wait(self, job_id, timeout=None):
+    with self.lock:
+      job = self.jobs[job_id]
+      self.lock.wait_for(lambda: job['state'] in ('done', 'failed'), timeout)
+      return dict(ok=True, job=dict(job))
+
+  def _set_state(self, job, state, **kwargs):
+    with self.lock:
+      job.update(kwargs, state=state)
+      self.lock.notify_all()
+
+  #############################
+  # Pipeline
+  #############################
+
+  def _prepare_loop(self):
+    while True:
+      item = self.prepare_queue.get()
+      if item is None:
+        self.cut_queue.put(None)
+        return
+      job, setup, plot = item
+      try:
+        self._set_state(job, 'preparing')
+        # the points are converted once, for autocrop, the estimate and the plot
+        plot['pathlist'] = PathArray(plot.get('pathlist') or [])
+        if plot.pop('autocrop', False) and plot['pathlist']:
+          llx, ury, urx, lly = plot['pathlist'].extents()
+          x_off, y_off = plot.get('offset') or (0, 0)
+          plot['offset'] = (x_off - llx, y_off - ury)
+          print("job %d: autocrop left=%.1fmm top=%.1fmm" % (job['id'], llx, ury), file=self.log)
+        estimate = None
+        if self.dev is not None and plot.get('pathlist'):
+          estimate = self.dev.estimate_time(plot['pathlist'])
+        self._set_state(job, 'ready', estimate=estimate)
+        self.cut_queue.put(item)
+      except Exception as e:
+        self._set_state(job, 'failed', error='%s: %s' % (type(e).__name__, e))
+
+  def _cut_loop(self):
+    while True:
+      item = self.cut_queue.get()
+      if item is None:
+        return
+      job, setup, plot = item
+      try:
+        self._set_state(job, 'cutting', started=time.time())
+        if self.dev is None:
+          self.dev = CricutMaker(log=self.log, **self.kwargs)
+          self.last_setup = None
+        if setup != self.last_setup:
+          self.dev.setup(**setup)
+          self.last_setup = setup
+        result = self.dev.plot(**plot)
+        self._set_state(job, 'done', bbox=result['bbox'], finished=time.time())
+      except Exception as e:
+        print("job %d failed: %s" % (job['id'], e), file=self.log)
+        self._set_state(job, 'failed', error='%s: %s' % (type(e).__name__, e))
+        # reopen the device for the next job, it may have been unplugged
+        if self.dev is not None:
+          self.dev.stop_status_polling()
+        self.dev = None
+
+  #############################
+  # Server
+  #############################
+
+  def serve_forever(self):
+    if os.path.exists(self.socket_path):
+      if DaemonClient.connect(self.socket_path) is not None:
+        raise ValueError('A daemon is already listening on %s' % self.socket_path)
+      os.unlink(self.socket_path)       # stale socket of a dead daemon
+    self.server = _Server(self.socket_path, _Handler)
+    self.server.daemon = self
+    os.chmod(self.socket_path, 0o600)
+    for loop in (self._prepare_loop, self._cut_loop):
+      threading.Thread(target=loop, daemon=True).start()
+    print("cutcutgo daemon listening on %s" % self.socket_path, file=self.log)
+    try:
+      self.server.serve_forever()
+    finally:
+      self.server.server_close()
+      os.unlink(self.socket_path)
+      if self.dev is not None:
+        self.dev.stop_status_polling()
+
+  def shutdown(self):
+    """Cut the queued jobs, then stop serving."""
+    with self.lock:
+      self.stopping = True
+      self.prepare_queue.put(None)
+      self.lock.wait_for(lambda: all(job['state'] in ('done', 'failed') for job in self.jobs.values()))
+    self.server.shutdown()
+
+
+class DaemonClient:
+  def __init__(self, sock):
+    self.sock = sock
+    self.rfile = sock.makefile('rb')
+
+  @classmethod
+  def connect(cls, socket_path=None, timeout=None):
+    """Return a client connected to the daemon, or None if none is running."""
+    if not hasattr(socket, 'AF_UNIX'):
+      return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+      sock.connect(socket_path or default_socket_path())
+    except OSError:
+      sock.close()
+      return None
+    return cls(sock)
+
+  def request(self, **req):
+    # numpy values in the paths are sent as plain numbers
+    tolist = lambda o: o.tolist()
+    self.sock.sendall(json.dumps(req, default=tolist).encode() + b'\n')
+    line = self.rfile.readline()
+    if not line:
+      raise ConnectionError('daemon closed the connection')
+    reply = json.loads(line)
+    if not reply.get('ok'):
+      raise ValueError(reply.get('error'))
+    return reply
+
+  def submit(self, setup, plot, name=None):
+    """Queue a job, return its id."""
+    return self.request(op='submit', setup=setup, plot=plot, name=name)['id']
+
+  def status(self):
+    return self.request(op='status')
+
+  def wait(self, job_id, timeout=None):
+    return self.request(op='wait', id=job_id, timeout=timeout)['job']
+
+  def shutdown(self):
+    return self.request(op='shutdown')
+
+  def close(self):
+    self.rfile.close()
+    self.sock.close()
+
+
+if __name__ == "__main__":
+  import argparse
+  from cutcutgo.read_dump import read_cutpaths
+
+  parser = argparse.ArgumentParser(description='Job queue daemon for cutters running CutcutGo.')
+  parser.add_argument('op', choices=('serve', 'status', 'submit', 'shutdown'))
+  parser.add_argument('files', nargs='*', help="submit: dump or log files with cut paths, one job each")
+  parser.add_argument('--socket', default=None, help="Unix socket, default %s" % default_socket_path())
+  parser.add_argument('--log', default=None, help="serve: log file, default stderr")
+  parser.add_argument('--streaming', action='store_true', help="serve: stream commands with GRBL character counting")
+  parser.add_argument('--media', type=int, default=1, help="submit: media profile")
+  parser.add_argument('--toolholder', type=int, default=1, help="submit: toolholder")
+  parser.add_argument('--wait', action='store_true', help="submit: wait until the jobs are done")
+  args = parser.parse_args()
+
+  if args.op == 'serve':
+    log = open(args.log, 'a', buffering=1) if args.log else sys.stderr
+    CutterDaemon(args.socket, log=log, streaming=args.streaming).serve_forever()
+    sys.exit(0)
+
+  client = DaemonClient.connect(args.socket)
+  if client is None:
+    sys.exit("No daemon listening on %s" % (args.socket or default_socket_path()))
+  if args.op == 'status':
+    print(json.dumps(client.status(), indent=1))
+  elif args.op == 'shutdown':
+    client.shutdown()
+  else:
+    ids = []
+    for filename in args.files:
+      cut = read_cutpaths(filename)
+      if cut is None:
+        sys.exit("Cannot find any cut paths in " + filename)
+      ids.append(client.submit(dict(media=args.media, toolholder=args.toolholder),
+                               dict(pathlist=cut), name=filename))
+      print("%s: job %d" % (filename, ids[-1]))
+    failed = 0
+    for job_id in ids if args.wait else []:
+      job = client.wait(job_id)
+      failed += job['state'] == 'failed'
+      print("job %d: %s %s" % (job_id, job['state'], job['error'] or ''))
+    sys.exit(1 if failed else 0)
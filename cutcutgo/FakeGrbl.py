@@ -0,0 +1,330 @@
+# Simulated GRBL / CutcutGo controller for offline testing and benchmarking.
+#
+# FakeGrblSerial is a drop-in replacement for the serial.Serial object that
+# CricutMaker talks to. It models
+#  - the serial line: bytes arrive after len*10/baudrate seconds,
+#  - the 128 byte receive buffer: overflowing bytes are dropped and counted,
+#  - the planner: a line is acknowledged with 'ok' once it has been parsed
+#    into a free planner block, motion blocks take distance/feed to execute,
+#  - the reply latency of the controller,
+#  - real-time '?' status reports,
+#  - G2/G3 arcs with grbl's radius check.
+#
+# By default time is virtual: whenever the host has to wait for the device,
+# the clock jumps forward instead of sleeping. The clock still includes the
+# real time spent in the host, so sender overhead shows up in the measurements.
+# Use realtime=True together with the status polling thread of CricutMaker,
+# virtual time only makes sense with a single thread talking to the device.
+#
+# Usage:
+#   from cutcutgo.FakeGrbl import FakeGrblSerial
+#   dev = CricutMaker(dev=FakeGrblSerial())
+
+import re
+import math
+import time
+import threading
+from collections import deque
+
+GRBL_PLANNER_BLOCKS = 15
+GRBL_RX_BUFFER_SIZE = 128
+
+_word_re = re.compile(r'([A-Z])([-+]?[0-9]*\.?[0-9]*)')
+
+
+class FakeGrblSerial:
+  def __init__(self, baudrate=115200, rx_buffer_size=GRBL_RX_BUFFER_SIZE,
+               planner_blocks=GRBL_PLANNER_BLOCKS, ok_latency=0.0005,
+               feed_override=None, realtime=False, port='fake-grbl'):
+    """
+        baudrate: serial speed, 10 bits are transferred per byte.
+        ok_latency: seconds between parsing a line and its reply.
+        feed_override: if set, all moves run at this feed [mm/min]
+          regardless of the F words. Use this to measure the sender
+          without being limited by (simulated) motion.
+        realtime: if True, waiting for the device really sleeps.
+    """
+    self.port = port
+    self.baudrate = baudrate
+    self.rx_buffer_size = rx_buffer_size
+    self.planner_blocks = planner_blocks
+    self.ok_latency = ok_latency
+    self.feed_override = feed_override
+    self.realtime = realtime
+    self.timeout = None
+    self.write_timeout = None
+    self.is_open = True
+    self.lock = threading.RLock()
+
+    self.skipped = 0.0            # virtual time added by waits
+    self.wire = deque()           # (arrival time, bytes) on their way to the device
+    self.wire_free = 0.0          # when the line is free for the next byte
+    self.rx = b''                 # controller receive buffer
+    self.out = deque()            # (time, bytes) replies, in order
+    self.planner = deque()        # [start, end, from, to] motion blocks
+    self.pos = [0.0, 0.0, 0.0]    # machine position after the last planned block
+    self.motion = 1               # modal G0/G1/G2/G3
+    self.feed = 0.0
+    self.settings = {110: 500.0, 111: 500.0, 112: 500.0, 120: 10.0, 121: 10.0, 122: 10.0}
+
+    # statistics
+    self.lines = 0
+    self.bytes = 0
+    self.errors = 0
+    self.overflows = 0
+    self.peak_rx = 0
+    self.start = self.clock()
+
+  #############################
+  # Clock
+  #############################
+
+  def clock(self):
+    return time.monotonic() + self.skipped
+
+  def _wait(self, until):
+    delay = until - self.clock()
+    if delay <= 0:
+      return
+    if self.realtime:
+      time.sleep(delay)
+    else:
+      self.skipped += delay
+
+  def elapsed(self):
+    return self.clock() - self.start
+
+  #############################
+  # Simulation
+  #############################
+
+  def _advance(self, now):
+    """Process all events up to the time now, in time order."""
+    while True:
+      t_arrive = self.wire[0][0] if self.wire else None
+      t_done = self.planner[0][1] if self.planner else None
+      if t_done is not None and t_done <= now and (t_arrive is None or t_done <= t_arrive):
+        blk = self.planner.popleft()
+        if self.planner:
+          self._start_block(self.planner[0], blk[1])
+        self._parse(blk[1])
+      elif t_arrive is not None and t_arrive <= now:
+        t, data = self.wire.popleft()
+        self._receive(t, data)
+        self._parse(t)
+      else:
+        break
+
+  def _receive(self, t, data):
+    for c in data:
+      if c in b'?!~\x18':
+        self._realtime_command(t, c)
+      elif len(self.rx) < self.rx_buffer_size:
+        self.rx += bytes((c,))
+      else:
+        self.overflows += 1
+    self.peak_rx = max(self.peak_rx, len(self.rx))
+
+  def _realtime_command(self, t, c):
+    if c == ord('?'):
+      self._reply(t, self.status_report(t))
+
+  def _parse(self, t):
+    """Move complete lines from the receive buffer into the planner."""
+    while b'\n' in self.rx and len(self.planner) < self.planner_blocks:
+      line, self.rx = self.rx.split(b'\n', 1)
+      line = line.strip().upper()
+      if not line:
+        continue
+      self.lines += 1
+      err = self._execute(t, line.decode(errors='replace'))
+      if err:
+        self.errors += 1
+        self._reply(t, 'error:%d' % err)
+      else:
+        self._reply(t, 'ok')
+
+  def _reply(self, t, msg):
+    t += self.ok_latency
+    if self.out and self.out[-1][0] > t:
+      t = self.out[-1][0]
+    self.out.append((t, msg.encode() + b'\r\n'))
+
+  def _execute(self, t, line):
+    """Execute one line, return a GRBL error code or 0."""
+    if line.startswith('$'):
+      if line == '$H':
+        return self._plan(t, [0.0, 0.0, 0.0], None)
+      m = re.match(r'\$(\d+)=([-+]?[0-9]*\.?[0-9]+)$', line)
+      if m:
+        self.settings[int(m.group(1))] = float(m.group(2))
+        return 0
+      if line == '$$':
+        for n, v in sorted(self.settings.items()):
+          self._reply(t, '$%d=%.3f' % (n, v))
+        return 0
+      if line in ('$X', '$#', '$G', '$I'):
+        return 0
+      return 3          # invalid statement
+    words = _word_re.findall(line)
+    if ''.join(w[0] + w[1] for w in words) != line.replace(' ', ''):
+      return 1          # expected command letter
+    target = list(self.pos)
+    moved = False
+    feed = None
+    offset = [0.0, 0.0]
+    for letter, value in words:
+      try:
+        v = float(value)
+      except ValueError:
+        return 2        # bad number format
+      if letter == 'G':
+        if v in (0, 1, 2, 3):
+          self.motion = int(v)
+        elif v not in (10, 17, 21, 90, 94):
+          return 20     # unsupported command
+      elif letter in 'XYZ':
+        target['XYZ'.index(letter)] = v
+        moved = True
+      elif letter in 'IJ':
+        offset['IJ'.index(letter)] = v
+      elif letter == 'F':
+        feed = v
+      elif letter not in 'TLPS':
+        return 20
+    if feed is not None:
+      self.feed = feed
+    if 'G10' in line or not moved:
+      return 0
+    if self.motion >= 1 and self.feed <= 0:
+      return 22         # undefined feed rate
+    if self.motion >= 2:
+      return self._plan_arc(t, target, offset)
+    if self.motion == 1:
+      return self._plan(t, target, self.feed)
+    return self._plan(t, target, None)
+
+  def _plan_arc(self, t, target, offset):
+    cx, cy = self.pos[0] + offset[0], self.pos[1] + offset[1]
+    r = math.hypot(offset[0], offset[1])
+    delta_r = abs(math.hypot(target[0]-cx, target[1]-cy) - r)
+    if delta_r > 0.005 and (delta_r > 0.5 or delta_r > 0.001*r):
+      return 33         # invalid target
+    a0 = math.atan2(self.pos[1]-cy, self.pos[0]-cx)
+    a1 = math.atan2(target[1]-cy, target[0]-cx)
+    sweep = a1 - a0
+    if self.motion == 3 and sweep <= 0: sweep += 2*math.pi
+    if self.motion == 2 and sweep >= 0: sweep -= 2*math.pi
+    feed = self.feed_override or self.feed
+    dz = target[2] - self.pos[2]
+    length = math.hypot(abs(sweep)*r, dz)
+    blk = [None, 60.0 * length / feed, list(self.pos), list(target)]
+    self.pos = target
+    self.planner.append(blk)
+    if len(self.planner) == 1:
+      self._start_block(blk, t)
+    return 0
+
+  def _plan(self, t, target, feed):
+    dist = sum((a - b) ** 2 for a, b in zip(target, self.pos)) ** 0.5
+    if dist == 0:
+      return 0          # zero length moves are dropped by grbl
+    if self.feed_override:
+      feed = self.feed_override
+    elif feed is None:
+      feed = self.settings.get(110, 500.0)     # rapid: max rate [mm/min]
+    blk = [None, 60.0 * dist / feed, list(self.pos), list(target)]
+    self.pos = target
+    self.planner.append(blk)
+    if len(self.planner) == 1:
+      self._start_block(blk, t)
+    return 0
+
+  def _start_block(self, blk, t):
+    duration = blk[1]
+    blk[0] = t
+    blk[1] = t + duration
+
+  def machine_position(self, t):
+    if not self.planner:
+      return self.pos
+    start, end, frm, to = self.planner[0]
+    f = (t - start) / (end - start) if end > start else 1.0
+    f = min(max(f, 0.0), 1.0)
+    return [a + (b - a) * f for a, b in zip(frm, to)]
+
+  def status_report(self, t):
+    state = 'Run' if self.planner else 'Idle'
+    x, y, z = self.machine_position(t)
+    return '<%s|MPos:%.3f,%.3f,%.3f|Bf:%d,%d|F:%d>' % (state, x, y, z,
+      self.planner_blocks - len(self.planner), self.rx_buffer_size - len(self.rx), self.feed)
+
+  def _next_event(self):
+    times = []
+    if self.wire: times.append(self.wire[0][0])
+    if self.planner: times.append(self.planner[0][1])
+    if self.out: times.append(self.out[0][0])
+    return min(times) if times else None
+
+  #############################
+  # serial.Serial interface
+  #############################
+
+  def write(self, data):
+    with self.lock:
+      now = self.clock()
+      self._advance(now)
+      start = max(now, self.wire_free)
+      self.wire_free = start + len(data) * 10.0 / self.baudrate
+      self.wire.append((self.wire_free, bytes(data)))
+      self.bytes += len(data)
+    return len(data)
+
+  @property
+  def in_waiting(self):
+    with self.lock:
+      now = self.clock()
+      self._advance(now)
+      return sum(len(d) for t, d in self.out if t <= now)
+
+  def readline(self):
+    """Return the next reply line, waiting up to self.timeout seconds.
+       Without a timeout, returns b'' right away if no reply can ever arrive.
+    """
+    deadline = None if self.timeout is None else self.clock() + self.timeout
+    while True:
+      with self.lock:
+        now = self.clock()
+        self._advance(now)
+        if self.out and self.out[0][0] <= now:
+          return self.out.popleft()[1]
+        t = self._next_event()
+      if t is None and deadline is None:
+        return b''
+      if t is None or (deadline is not None and t > deadline):
+        self._wait(deadline)
+        return b''
+      # in real time, wake up early for data written meanwhile
+      self._wait(min(t, self.clock() + 0.01) if self.realtime else t)
+
+  def read(self, size=1):
+    return self.readline()[:size]
+
+  def flush(self):
+    pass
+
+  def close(self):
+    self.is_open = False
+
+  def wait_idle(self):
+    """Let the simulation run until all sent data is executed."""
+    while self.wire or self.planner or b'\n' in self.rx:
+      t = self._next_event()
+      self._wait(t)
+      self._advance(self.clock())
+
+  def stats(self):
+    return {
+      'elapsed': self.elapsed(), 'lines': self.lines, 'bytes': self.bytes,
+      'errors': self.errors, 'overflows': self.overflows, 'peak_rx': self.peak_rx
+    }
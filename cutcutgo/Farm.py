@@ -0,0 +1,167 @@
+# Drive several cutters from one process.
+#
+# CutterFarm opens every attached cutter (or the given ports, or ready made
+# CricutMaker objects) and cuts a queue of jobs on them concurrently, one
+# thread per cutter. A job is a dict of CricutMaker.plot() arguments, at least
+# 'pathlist'. Each job is one sheet.
+#
+# Balancing: the jobs are queued longest estimated cut time first, and each
+# cutter takes the next job when it is done with its sheet. This is the
+# longest processing time first rule; it also copes with estimates that are
+# off, or cutters that are slower than others.
+#
+# Usage:
+#   farm = CutterFarm(log=log)
+#   farm.setup(media=1, toolholder=1)
+#   results = farm.run([dict(pathlist=sheet) for sheet in sheets])
+
+import sys
+import threading
+from collections import deque
+
+from cutcutgo.Cutcutgo import CricutMaker, find_devices
+
+
+class CutterFarm:
+  def __init__(self, log=sys.stderr, ports=None, cutters=None, journal=None,
+               progress_cb=None, **kwargs):
+    """
+        ports: serial port names to use. Default: all attached cutters.
+        cutters: CricutMaker objects to use instead of opening ports.
+        journal: path prefix, each cutter journals its jobs to
+          journal-<n>, see CricutMaker.resume(). True for the journal
+          of each device.
+        progress_cb: called with int(cutter_index) followed by the
+          arguments of the CricutMaker progress_cb.
+        Other keyword arguments are passed to each CricutMaker.
+    """
+    self.log = log
+    self.lock = threading.Lock()
+    if cutters is None:
+      if ports is None:
+        ports = [device for device, hardware in find_devices()]
+      if not ports:
+        raise ValueError('No Cricut Maker devices found.\nCheck USB and Power.')
+      cutters = []
+      for i, port in enumerate(ports):
+        cutters.append(CricutMaker(log=log, port=port,
+          journal=journal if journal is True else journal and "%s-%d" % (journal, i),
+          progress_cb=progress_cb and (lambda *a, i=i: progress_cb(i, *a)),
+          **kwargs))
+    self.cutters = list(cutters)
+
+  def _each(self, fn):
+    """Call fn(cutter) for all cutters in parallel, return the results."""
+    results = [None] * len(self.cutters)
+    errors = []
+    def call(i, cutter):
+      try:
+        results[i] = fn(cutter)
+      except Exception as e:
+        errors.append(e)
+    threads = [threading.Thread(target=call, args=(i, c), daemon=True) for i, c in enumerate(self.cutters)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    if errors:
+      raise errors[0]
+    return results
+
+  def setup(self, **kwargs):
+    """CricutMaker.setup() of all cutters, e.g. homing them in parallel."""
+    self._each(lambda cutter: cutter.setup(**kwargs))
+
+  def schedule(self, jobs):
+    """Predict which jobs each cutter cuts, as run() dispatches them if the
+       estimates are right. Returns a list of job index lists, one per cutter,
+       and the list of estimated seconds per cutter.
+    """
+    load = [0.0] * len(self.cutters)
+    plan = [[] for cutter in self.cutters]
+    for n, seconds in self._order(jobs):
+      i = min(range(len(load)), key=load.__getitem__)
+      plan[i].append(n)
+      load[i] += seconds
+    return plan, load
+
+  def _order(self, jobs):
+    estimate = self.cutters[0].estimate_time
+    order = [(n, estimate(job['pathlist'])) for n, job in enumerate(jobs)]
+    return sorted(order, key=lambda o: -o[1])
+
+  def run(self, jobs, next_sheet=None, wait_done=True):
+    """Cut all jobs, return a list with one dict per job: its 'cutter'
+       index and the 'bbox' returned by plot(), or the 'error' raised.
+
+       next_sheet(cutter_index, job_index) is called before each job, e.g.
+       to wait for the operator to load a sheet. With wait_done, a cutter
+       takes its next job only after finishing the motion of the last one.
+       A cutter that fails stops taking jobs; its job is not cut again
+       elsewhere, a partial sheet is better resumed from the journal. The
+       other jobs go to the cutters still working. Jobs no cutter is left
+       for get the 'error' 'not cut' and no 'cutter'.
+    """
+    todo = deque(n for n, seconds in self._order(jobs))
+    busy = [0]                # jobs taken, that may still be put back
+    cond = threading.Condition()
+    results = [None] * len(jobs)
+
+    def take():
+      # the next job, or None when there is none and none can come back
+      with cond:
+        while not todo:
+          if not busy[0]:
+            return None
+          cond.wait()
+        busy[0] += 1
+        return todo.popleft()
+
+    def release(n, put_back=False):
+      with cond:
+        busy[0] -= 1
+        if put_back:
+          todo.appendleft(n)
+        cond.notify_all()
+
+    def worker(i, cutter):
+      while True:
+        n = take()
+        if n is None:
+          return
+        with self.lock:
+          print("cutter %d: job %d" % (i, n), file=self.log)
+        try:
+          if next_sheet:
+            next_sheet(i, n)
+        except Exception as e:
+          # nothing was cut, another cutter may take the job
+          with self.lock:
+            print("cutter %d: no sheet for job %d: %s" % (i, n, e), file=self.log)
+          release(n, put_back=True)
+          return
+        try:
+          results[n] = dict(cutter=i, bbox=cutter.plot(**jobs[n]))
+          if wait_done:
+            cutter.wait_for_ready(timeout=24*3600)
+        except Exception as e:
+          results[n] = dict(cutter=i, error=e)
+          with self.lock:
+            print("cutter %d: job %d failed: %s" % (i, n, e), file=self.log)
+          return
+        finally:
+          release(n)
+
+    threads = [threading.Thread(target=worker, args=(i, c), daemon=True) for i, c in enumerate(self.cutters)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    # all cutters failed before the queue was empty
+    for n in todo:
+      results[n] = dict(cutter=None, error='not cut')
+    return results
+
+  def close(self):
+    for cutter in self.cutters:
+      cutter.stop_status_polling()
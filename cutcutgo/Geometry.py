@@ -4,6 +4,9 @@
 # Split from silhouette/Strategy.py
 #
 
+import math, itertools
+from bisect import bisect_left, bisect_right
+
 # minimum difference for geometric values to be considered equal.
 _eps = 1e-10
 
@@ -125,6 +128,60 @@ def sharp_turn(A,B,C,fwd_ratio):
   return ccw(B,F,C) == ccw_abc
 
 
+def ccw_many(A,B,C):
+  """ccw() for arrays of points. A, B, C are arrays of shape (N, 2),
+     a boolean array of shape (N,) is returned.
+  """
+  return (C[:,1]-A[:,1])*(B[:,0]-A[:,0]) > (B[:,1]-A[:,1])*(C[:,0]-A[:,0])
+
+
+def sharp_turn_90_many(A,B,C):
+  """sharp_turn_90() for arrays of points, see ccw_many().
+  """
+  import numpy as np
+  dx = B[:,0]-A[:,0]
+  dy = B[:,1]-A[:,1]
+  D = np.stack((B[:,0]-dy, B[:,1]+dx), axis=1)   # BD is now the normal to AB
+
+  return ccw_many(A,B,D) == ccw_many(C,B,D)
+
+
+def sharp_turn_116_many(A,B,C):
+  return sharp_turn_many(A,B,C, -0.5)
+
+
+def sharp_turn_63_many(A,B,C):
+  return sharp_turn_many(A,B,C, 0.5)
+
+
+def sharp_turn_45_many(A,B,C):
+  return sharp_turn_many(A,B,C, 1.0)
+
+
+def sharp_turn_26_many(A,B,C):
+  return sharp_turn_many(A,B,C, 2.0)
+
+
+def sharp_turn_many(A,B,C,fwd_ratio):
+  """sharp_turn() for arrays of points, see ccw_many().
+     All N corners are classified at once, with the same arithmetic
+     as the scalar version, so that both agree exactly.
+  """
+  import numpy as np
+  if fwd_ratio == 0.0: return sharp_turn_90_many(A,B,C)  # short cut.
+
+  dx = B[:,0]-A[:,0]
+  dy = B[:,1]-A[:,1]
+
+  ccw_abc = ccw_many(A,B,C)
+  # D is on the same side of AB as C
+  dx_bd = np.where(ccw_abc, -dy, +dy)
+  dy_bd = np.where(ccw_abc, +dx, -dx)
+  F = np.stack((B[:,0]+fwd_ratio*dx+dx_bd, B[:,1]+fwd_ratio*dy+dy_bd), axis=1)
+
+  return ccw_many(B,F,C) == ccw_abc
+
+
 def intersect_lines(A,B,C,D, limit1=False, limit2=False):
   """compute the intersection point of line AB with line CD.
      If limit1 is True, only the segment [AB] is considered.
@@ -219,6 +276,440 @@ def intersect_y(A,B,y_boundary, limit=False):
   return _intersect_y5(A.x, A.y, B.x, B.y, y_boundary, limit)
 
 
+def _arc_windows(x, y, starts, length, tol, max_radius):
+  """Test the windows of length points beginning at each of starts for
+     lying on a circular arc. The circle goes through the first, middle and
+     last point of a window, all points must be within tol of it, turning in
+     the same direction by less than 90 degrees per step and by at most 180
+     degrees in total, where the fit through three points is well conditioned.
+     Each chord must stay within tol of the arc, its sagitta added to the
+     deviation of its end points, so that coarse polygons are not rounded.
+     Returns the arrays ok, cx, cy, ccw.
+  """
+  import numpy as np
+  idx = starts[:,None] + np.arange(length)[None,:]
+  px = x[idx]
+  py = y[idx]
+  ax = px[:,0]
+  ay = py[:,0]
+  bx = px[:,(length-1)//2] - ax
+  by = py[:,(length-1)//2] - ay
+  ex = px[:,-1] - ax
+  ey = py[:,-1] - ay
+  d = 2.0*(bx*ey - by*ex)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    ux = (ey*(bx*bx+by*by) - by*(ex*ex+ey*ey)) / d
+    uy = (bx*(ex*ex+ey*ey) - ex*(bx*bx+by*by)) / d
+    r = np.hypot(ux, uy)
+    cx = ax + ux
+    cy = ay + uy
+    dx = px - cx[:,None]
+    dy = py - cy[:,None]
+    ok = (np.abs(d) > 1e-12) & (r <= max_radius)
+    dev = np.abs(np.hypot(dx, dy) - r[:,None])
+    ok &= np.all(dev <= tol, axis=1)
+    cross = dx[:,:-1]*dy[:,1:] - dy[:,:-1]*dx[:,1:]
+    dot = dx[:,:-1]*dx[:,1:] + dy[:,:-1]*dy[:,1:]
+    step = np.arctan2(cross, dot)
+    ok &= np.all(step > 0, axis=1) | np.all(step < 0, axis=1)
+    ok &= np.all(np.abs(step) < 0.5*np.pi, axis=1)
+    dev = np.maximum(dev[:,:-1], dev[:,1:]) + r[:,None]*(1.0-np.cos(0.5*step))
+    ok &= np.all(dev <= tol, axis=1)
+    sweep = step.sum(axis=1)
+    ok &= np.abs(sweep) <= np.pi
+  return ok, cx, cy, sweep > 0
+
+
+def arc_deviation(x, y, cx, cy, ccw):
+  """How far the arc around (cx, cy) from the first to the last of the points
+     (sequences x, y) strays from the polyline through them, at most [mm].
+     The radius is the distance of the first point, as on the device. Returns
+     inf if the polyline does not turn ccw (or clockwise) around the center in
+     steps of less than 90 degrees and by at most 180 degrees in total.
+  """
+  import numpy as np
+  dx = np.asarray(x, dtype=float) - cx
+  dy = np.asarray(y, dtype=float) - cy
+  r = math.hypot(dx[0], dy[0])
+  step = np.arctan2(dx[:-1]*dy[1:] - dy[:-1]*dx[1:], dx[:-1]*dx[1:] + dy[:-1]*dy[1:])
+  if not ccw:
+    step = -step
+  if not (np.all(step > 0) and np.all(step < 0.5*np.pi) and step.sum() <= np.pi):
+    return math.inf
+  dev = np.abs(np.hypot(dx, dy) - r)
+  return float(np.max(np.maximum(dev[:-1], dev[1:]) + r*(1.0-np.cos(0.5*step))))
+
+
+def fit_arcs(x, y, tolerance, min_points=4, max_radius=1000.0):
+  """Find runs of at least min_points consecutive points (sequences x, y)
+     that can be replaced by one circular arc, within tolerance.
+     Returns a list of (i, j, cx, cy, ccw): points i..j lie on the arc around
+     (cx, cy), counterclockwise if ccw. Consecutive arcs may share an end point.
+     Runs are found greedily from the start, each grown as far as it fits.
+  """
+  import numpy as np
+  x = np.asarray(x, dtype=float)
+  y = np.asarray(y, dtype=float)
+  n = len(x)
+  arcs = []
+  if tolerance <= 0 or n < min_points:
+    return arcs
+
+  def fit(i, j):
+    ok, cx, cy, ccw = _arc_windows(x, y, np.array([i]), j-i+1, tolerance, max_radius)
+    if ok[0]:
+      return float(cx[0]), float(cy[0]), bool(ccw[0])
+    return None
+
+  ok = _arc_windows(x, y, np.arange(n-min_points+1), min_points, tolerance, max_radius)[0]
+  i_next = 0
+  for i in np.flatnonzero(ok):
+    i = int(i)
+    if i < i_next:
+      continue
+    # grow in doubling steps, then bisect between the last fit and the first miss
+    lo = i+min_points-1
+    hi = None
+    step = 1
+    while lo < n-1:
+      j = min(lo+step, n-1)
+      if fit(i, j) is None:
+        hi = j
+        break
+      lo = j
+      step *= 2
+    while hi is not None and hi-lo > 1:
+      mid = (lo+hi)//2
+      if fit(i, mid) is None:
+        hi = mid
+      else:
+        lo = mid
+    cx, cy, ccw = fit(i, lo)
+    arcs.append((i, lo, cx, cy, ccw))
+    i_next = lo
+  return arcs
+
+
+def clip_segments(p, box):
+  """Clip the segments of a polyline to box = (xmin, ymin, xmax, ymax) with
+     the Liang-Barsky algorithm, all segments at once. p is an (n,2) array.
+     Returns the arrays visible, t0, t1, a, b of the n-1 segments: if
+     visible[i], the part of segment i from parameter t0[i] to t1[i], from
+     point a[i] to b[i], lies in the box. Where a segment starts (ends) inside,
+     t0 is 0 (t1 is 1) and a (b) is exactly the original point.
+  """
+  import numpy as np
+  p0 = p[:-1]
+  d = p[1:] - p0
+  t0 = np.zeros(len(d))
+  t1 = np.ones(len(d))
+  visible = np.ones(len(d), dtype=bool)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    # the low and high edge of both axes, as p + t*d entering or leaving
+    for pk, qk in ((-d, p0 - np.asarray(box[:2])), (d, np.asarray(box[2:]) - p0)):
+      r = qk / pk
+      t0 = np.maximum(t0, np.where(pk < 0, r, 0.0).max(axis=1))
+      t1 = np.minimum(t1, np.where(pk > 0, r, 1.0).min(axis=1))
+      visible &= np.all((pk != 0) | (qk >= 0), axis=1)
+  visible &= t0 < t1
+  a = np.where((t0 == 0)[:,None], p0, p0 + t0[:,None]*d)
+  b = np.where((t1 == 1)[:,None], p[1:], p0 + t1[:,None]*d)
+  return visible, t0, t1, a, b
+
+
+def _cubic_deviation(b):
+  """Upper bound of the distance of cubic Bezier curves b, an (n,4,2) array,
+     from their chords. Where both control points project onto the chord, the
+     curve stays within 3/4 of their distance from the chord line; elsewhere
+     within the largest distance of a control point from the chord.
+     Returns the bounds, and where the first applies.
+  """
+  import numpy as np
+  chord = b[:,3] - b[:,0]
+  length_sq = (chord*chord).sum(axis=1)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    c = b[:,1:3] - b[:,0,None]
+    t = (c*chord[:,None]).sum(axis=2) / length_sq[:,None]
+    within = np.all((t >= 0) & (t <= 1), axis=1)
+    perp = np.abs(c[:,:,0]*chord[:,None,1] - c[:,:,1]*chord[:,None,0]).max(axis=1) / np.sqrt(length_sq)
+    t = np.clip(np.nan_to_num(t), 0, 1)
+  off = c - t[:,:,None]*chord[:,None]
+  hull = np.sqrt((off*off).sum(axis=2)).max(axis=1)
+  return np.where(within, 0.75*perp, hull), within
+
+def _cubic_at(b, u):
+  """Points and derivatives of cubic Bezier curves b, an (n,4,2) array, at u (n,1)."""
+  v = 1 - u
+  p = v*v*v*b[:,0] + 3*v*v*u*b[:,1] + 3*v*u*u*b[:,2] + u*u*u*b[:,3]
+  d = 3*(v*v*(b[:,1] - b[:,0]) + 2*v*u*(b[:,2] - b[:,1]) + u*u*(b[:,3] - b[:,2]))
+  return p, d
+
+def flatten_superpath(csp, tolerance=0.05, max_depth=16):
+  """Flatten a cubic superpath, a list of subpaths of [control in, point,
+     control out] nodes as inkex.Path.to_superpath() makes them, into lines
+     that deviate less than tolerance from the curves. All segments of all
+     subpaths are subdivided together: in each round, every piece that is not
+     flat enough yet is split into about as many pieces as it needs, until
+     all are flat or max_depth rounds are done. Straight segments stay single
+     lines.
+     Returns a list of point lists, one per subpath.
+  """
+  import numpy as np
+  if not tolerance > 0:
+    raise ValueError('flatten_superpath: tolerance must be positive, not %r' % tolerance)
+  nseg = [max(len(sp)-1, 0) for sp in csp]
+  b = np.array([(sp[k-1][1], sp[k-1][2], sp[k][0], sp[k][1])
+                for sp in csp for k in range(1, len(sp))], dtype=float).reshape(-1, 4, 2)
+  owner = np.arange(len(b))
+  t = np.zeros(len(b))
+  dt = np.ones(len(b))
+  done_owner, done_t, done_end = [], [], []
+  for depth in range(max_depth+1):
+    dev, within = _cubic_deviation(b)
+    flat = dev <= tolerance if depth < max_depth else np.ones(len(b), dtype=bool)
+    done_owner.append(owner[flat])
+    done_t.append(t[flat])
+    done_end.append(b[flat,3])
+    b, owner, t, dt = b[~flat], owner[~flat], t[~flat], dt[~flat]
+    dev, within = dev[~flat], within[~flat]
+    if not len(b):
+      break
+    # the deviation from the chord shrinks with the square of the number of
+    # pieces: split into as many as needed, with a margin for the rounding.
+    # Loops and curves with control points beyond the chord are halved.
+    k = np.where(within, np.clip(np.ceil(1.05*np.sqrt(dev/tolerance)), 2, 64), 2).astype(int)
+    piece = np.repeat(np.arange(len(b)), k)
+    i = np.arange(k.sum()) - np.repeat(np.cumsum(k) - k, k)
+    u0 = (i / k[piece])[:,None]
+    u1 = ((i+1) / k[piece])[:,None]
+    q = b[piece]
+    # each piece from its end points and tangents
+    p0, d0 = _cubic_at(q, u0)
+    p1, d1 = _cubic_at(q, u1)
+    h = (u1 - u0)/3
+    b = np.stack((p0, p0 + h*d0, p1 - h*d1, p1), axis=1)
+    owner = owner[piece]
+    t = t[piece] + dt[piece]*u0[:,0]
+    dt = dt[piece] / k[piece]
+
+  owner = np.concatenate(done_owner)
+  order = np.lexsort((np.concatenate(done_t), owner))
+  ends = np.concatenate(done_end)[order].tolist()
+  # the pieces of each subpath, in order along it
+  bounds = np.searchsorted(owner[order], np.cumsum([0] + nseg)).tolist()
+  out = []
+  for i, sp in enumerate(csp):
+    start = [tuple(sp[0][1])] if sp else []
+    out.append(start + [tuple(pt) for pt in ends[bounds[i]:bounds[i+1]]])
+  return out
+
+
+def dash_paths(paths, pattern, offset=0.0):
+  """Cut paths into dashes, as a stroke-dasharray pattern of alternating
+     dash and gap lengths draws them, starting offset into the pattern.
+     The pattern restarts on each path. Arc length is measured along all
+     paths at once and the dash ends are looked up in it with searchsorted;
+     dashes start and end on the segments, interpolated, and carry the
+     points of the path in between.
+     Returns a list of point lists, one per dash.
+  """
+  import numpy as np
+  pattern = np.asarray(pattern, dtype=float)
+  if len(pattern) % 2:
+    pattern = np.concatenate((pattern, pattern))
+  period = pattern.sum()
+  lens = np.array([len(path) for path in paths], dtype=int).reshape(-1)
+  p = np.fromiter(itertools.chain.from_iterable(pt[:2] for path in paths for pt in path),
+                  dtype=float).reshape(-1, 2)
+  if (pattern < 0).any():
+    raise ValueError('dash_paths: negative dash length in %r' % pattern.tolist())
+  if not period > 0:
+    return [[tuple(pt[:2]) for pt in path] for path in paths if len(path) > 1]
+  starts = np.cumsum(lens) - lens
+  # arc length at each point, running on over all paths
+  step = np.hypot(*(p[1:] - p[:-1]).T)
+  step[starts[(starts > 0) & (starts < len(p))] - 1] = 0
+  arc = np.concatenate(([0.], np.cumsum(step)))
+  full = lens > 1
+  first, last = starts[full], starts[full] + lens[full] - 1
+  base, total = arc[first], arc[last] - arc[first]
+
+  # the dashes of every period that overlaps a path, in path arc length
+  offset = offset % period
+  dash0 = np.concatenate(([0.], np.cumsum(pattern)[:-1]))[0::2]
+  dash1 = dash0 + pattern[0::2]
+  nper = (np.floor((offset + total) / period) + 1).astype(int)
+  path = np.repeat(np.arange(len(total)), nper*len(dash0))
+  k = np.arange(nper.sum()) - np.repeat(np.cumsum(nper) - nper, nper)
+  k = np.repeat(k, len(dash0))
+  j = np.tile(np.arange(len(dash0)), nper.sum())
+  a = np.maximum(k*period + dash0[j] - offset, 0)
+  b = np.minimum(k*period + dash1[j] - offset, total[path])
+  live = b > a
+  path, a, b = path[live], a[live] + base[path[live]], b[live] + base[path[live]]
+
+  # segment of the start and end of each dash
+  i0 = np.clip(np.searchsorted(arc, a, 'right') - 1, first[path], last[path] - 1)
+  i1 = np.clip(np.searchsorted(arc, b, 'left'), i0 + 1, last[path])
+  def at(i, s):
+    d = arc[i+1] - arc[i]
+    with np.errstate(divide='ignore', invalid='ignore'):
+      t = np.where(d > 0, (s - arc[i]) / d, 0)[:,None]
+    pt = p[i] + t*(p[i+1] - p[i])
+    pt = np.where(t <= 0, p[i], pt)
+    return np.where(t >= 1, p[i+1], pt)
+
+  # each dash: its start, the points passed, its end
+  n = i1 - i0 + 1
+  idx = np.repeat(i0, n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+  q = p[idx]
+  ends = np.cumsum(n)
+  q[ends - n] = at(i0, a)
+  q[ends - 1] = at(i1 - 1, b)
+  q = list(zip(q[:,0].tolist(), q[:,1].tolist()))
+  return [q[e-m:e] for e, m in zip(ends.tolist(), n.tolist())]
+
+
+def simplify_paths(paths, tolerance=0.0, min_length=0.0, fwd_ratio=0.0):
+  """Drop redundant vertices of all paths at once, returning the paths with
+     the remaining points (the same objects). The first and last point of a
+     path and its sharp corners are always kept: points marked 'sharp', e.g.
+     by MatFree, and the corners sharp_turn_many() finds with fwd_ratio
+     (0.0: turning by 90 degrees or more, as the default MatFree preset).
+     Other points are dropped:
+     - if they are colinear() with their neighbours, and between them,
+     - if tolerance > 0, when within tolerance of the simplified path, by the
+       Ramer-Douglas-Peucker algorithm: all chords of all paths are split at
+       their farthest point together, until all points are within tolerance,
+     - if they are closer than min_length to the previous point kept.
+  """
+  import numpy as np
+  lens = np.array([len(path) for path in paths], dtype=int)
+  points = [pt for path in paths for pt in path]
+  p = np.array([pt[:2] for pt in points], dtype=float).reshape(-1, 2)
+  n = len(p)
+  sharp = np.array([bool(getattr(pt, 'sharp', False)) for pt in points], dtype=bool)
+  a, b, c = p[:-2], p[1:-1], p[2:]
+  if n > 2:
+    # between two segments of non zero length, ends are pinned below anyway
+    sharp[1:-1] |= sharp_turn_many(a, b, c, fwd_ratio) & np.any(a != b, axis=1) & np.any(b != c, axis=1)
+  starts = (np.cumsum(lens) - lens)[lens > 0]
+  pinned = sharp.copy()
+  pinned[starts] = True
+  pinned[starts + lens[lens > 0] - 1] = True
+
+  # colinear, and not turning back
+  cross = (c[:,1]-a[:,1])*(b[:,0]-a[:,0]) - (b[:,1]-a[:,1])*(c[:,0]-a[:,0])
+  ahead = ((b-a)*(c-b)).sum(axis=1) > 0
+  keep = pinned.copy()
+  keep[1:-1] |= (np.abs(cross) >= _eps) | ~ahead
+
+  if tolerance > 0:
+    # start from the pinned points, and split each chord at its farthest
+    # point while that is not within tolerance. The colinear points dropped
+    # lie between two candidates, they are never farther than those.
+    cand = keep & ~pinned
+    keep = pinned.copy()
+    while cand.any():
+      idx = np.flatnonzero(keep)
+      i = np.flatnonzero(cand)
+      chord = np.searchsorted(idx, i)
+      a, b = p[idx[chord-1]], p[idx[chord]]
+      ab = b - a
+      with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(np.nan_to_num(((p[i]-a)*ab).sum(axis=1) / (ab*ab).sum(axis=1)), 0, 1)
+      off = p[i] - a - t[:,None]*ab
+      dist = (off*off).sum(axis=1)
+      far = dist > tolerance*tolerance
+      if not far.any():
+        break
+      i, chord, dist = i[far], chord[far], dist[far]
+      order = np.lexsort((-dist, chord))
+      first = np.concatenate(([True], chord[order][1:] != chord[order][:-1]))
+      keep[i[order][first]] = True
+      cand[i[order][first]] = False
+
+  xy = p.tolist()
+  out = []
+  for start, path in zip(np.cumsum(lens) - lens, paths):
+    kept = (start + np.flatnonzero(keep[start:start+len(path)])).tolist()
+    if min_length > 0 and len(kept) > 2:
+      # drop points too close to the last one kept, always keeping the end
+      short = kept[:1]
+      for i in kept[1:]:
+        x, y = xy[short[-1]]
+        if sharp[i] or math.hypot(xy[i][0]-x, xy[i][1]-y) >= min_length:
+          short.append(i)
+        elif i == kept[-1]:
+          if len(short) > 1 and not sharp[short[-1]]:
+            short.pop()
+          short.append(i)
+      kept = short
+    out.append([points[i] for i in kept])
+  return out
+
+
+# rotation table for blade serifs, in steps of pi/20
+_serif_step = math.pi/20
+_serif_cos = [math.cos(j*_serif_step) for j in range(21)]
+_serif_sin = [math.sin(j*_serif_step) for j in range(21)]
+
+def path_serifs(path, blade_width=0.9):
+  """Add serifs to the corners of a path, turning a drag blade of
+     blade_width [mm] diameter around them: at each corner sharper than pi/8
+     the path overcuts by half the blade width, swings through the turn in
+     steps of pi/20 and continues from half the blade width into the next
+     segment. Computed for the whole path at once. Returns a list of tuples,
+     paths with fewer than two points have no segments and stay as they are.
+  """
+  import numpy as np
+  n = len(path)
+  if n < 2:
+    return [tuple(pt[:2]) for pt in path]
+  p = np.array([pt[:2] for pt in path], dtype=float)
+  b = p[1:-1]
+
+  # unit vectors of the incoming and outgoing segment at each inner vertex.
+  # Dot products are batched matmuls, rounding exactly like np.dot() does.
+  with np.errstate(divide='ignore', invalid='ignore'):
+    seg = np.diff(p, axis=0)
+    seg /= np.sqrt(seg[:,None,:] @ seg[:,:,None])[:,0]
+  v1, v2 = seg[:-1], seg[1:]
+  turn = np.arccos(np.clip((v1[:,None,:] @ v2[:,:,None])[:,0,0], -1.0, 1.0))
+  serif = turn > math.pi/8.           # false for nan, as for zero length segments
+  steps = np.where(serif, np.floor(turn/_serif_step), 0).astype(int)
+  clockwise = v1[:,0]*v2[:,1] - v1[:,1]*v2[:,0] < 0
+
+  # an inner vertex becomes one point, or the overcut, the swing and the exit
+  count = np.where(serif, steps+2, 1)
+  start = 1 + np.cumsum(count) - count
+  out = np.empty((2 + count.sum(), 2))
+  out[0] = p[0]
+  out[-1] = p[-1]
+
+  keep = ~serif
+  out[start[keep]] = b[keep]
+  d = v1[serif] * (blade_width/2.0)
+  bs = b[serif]
+  out[start[serif]] = bs + d
+  out[start[serif] + steps[serif] + 1] = bs + v2[serif] * (blade_width/2.0)
+
+  # the swing: d rotated by j*pi/20 for j in 0..steps-1, towards the turn
+  k = steps[serif]
+  corner = np.repeat(np.arange(len(k)), k)
+  j = np.arange(k.sum()) - np.repeat(np.cumsum(k) - k, k)
+  cos = np.array(_serif_cos)[j]
+  sin = np.array(_serif_sin)[j]
+  sin = np.where(clockwise[serif][corner], sin, -sin)
+  rot = np.empty((len(j), 2, 2))
+  rot[:,0,0] = cos
+  rot[:,0,1] = sin
+  rot[:,1,0] = -sin
+  rot[:,1,1] = cos
+  out[start[serif][corner] + 1 + j] = (rot @ d[corner,:,None])[:,:,0] + bs[corner]
+  return list(map(tuple, out.tolist()))
+
+
 class XY_Grid_Factory:
   def __init__(self, spacing=0.5):
     self.serial = 0
@@ -276,11 +767,27 @@ class Barrier:
        find(point). All these method return an index into the sorted list
        that can be used in pos(idx) or pslice(idx1, idx2).
        Additional points can be added to an existing barrier with insert(point).
+
+       The sort keys are kept in a parallel list, so that find() and insert()
+       can bisect. Points with an 'id' attribute are also hashed by id for lookup_id().
+       Cost per call: find() and lookup_id() are O(log n), insert() bisects in
+       O(log n) but list.insert() still moves the tail, O(n) (a memmove, fast
+       for the sizes seen here), and lookup() with its free predicate is a
+       linear scan, O(n).
     """
     self.key=key
     self.points = sorted(points, key=key)
+    self.keys = [key(p) for p in self.points]
+    self.ids = {}
+    for p in self.points:
+      self._hash_id(p)
     self.idx = 0
 
+  def _hash_id(self, point):
+    id = getattr(point, 'id', None)
+    if id is not None and id not in self.ids:
+      self.ids[id] = point
+
   def first(self):
     """reset the barrier to the first point.
     """
@@ -356,13 +863,24 @@ class Barrier:
        range, and uses a user provided predicate match instead of self.key() with a point.
        Use lookup() when one particular point is sought, and find()
        could return another point that happens to share the same key() value.
+       If the point is known by its id, lookup_id() does the same in logarithmic time;
+       lookup() itself stays a linear scan, as match can be any predicate.
     """
-    ## SPEEDUP:  provide the lambda function to __init__ and build a hash
-    ## that we can lookup by value here. (Would need a rebuild after insert(), but hey).
     for i in range(0, len(self.points)):
       if match(self.points[i]): return i
     return None
 
+  def lookup_id(self, id):
+    """Same as lookup(lambda a: a.id == id if a else False), but uses the id hash
+       and bisects to the run of points that share the key of the point.
+    """
+    point = self.ids.get(id)
+    if point is None: return None
+    k = self.key(point)
+    for i in range(bisect_left(self.keys, k), bisect_right(self.keys, k)):
+      if self.points[i] is point: return i
+    return None
+
   def find(self, targetpoint, backwards=False, start=None, id=None):
     """Advance the barrier so that it cuts through targetpoint. This
        targetpoint need not be amongst the set of points for which the barrier
@@ -373,30 +891,26 @@ class Barrier:
        If the targetpoint is beyond the the end, the barrier remains at the last point.
        Note: 'point(find(target)) == target' may or may not be true.
     """
-    ## SPEEDUP: uses a linear search. Look into bisect, just as with insert().
     saved_idx = self.idx
     if start is not None: self.idx = start
 
     key_limit = self.key(targetpoint)
     if backwards == True:
-      for i in reversed(range(0, self.idx+1)):
-        if self.key(self.points[i]) <= key_limit:
-          return self.idx
+      if self.idx >= 0 and len(self.keys) and self.keys[0] <= key_limit:
+        return self.idx
       self.idx = 0
       return self.idx     # stick at first point.
 
-    prev_idx = None
-    for i in range(self.idx, len(self.points)):
-      if self.key(self.points[i]) > key_limit:
-        if prev_idx is None:
-          if start is not None: self.idx = saved_idx
-          return None
-        else:
-          self.idx = prev_idx
-          return self.idx
-      prev_idx = i
-    self.idx = prev_idx
-    return self.idx     # stick at last point.
+    # first point beyond the targetpoint, starting at the current barrier
+    i = bisect_right(self.keys, key_limit, self.idx)
+    if i >= len(self.keys):
+      self.idx = len(self.keys)-1 if self.idx < len(self.keys) else None
+      return self.idx     # stick at last point.
+    if i == self.idx:
+      if start is not None: self.idx = saved_idx
+      return None
+    self.idx = i-1
+    return self.idx
 
 
   def ahead(self, point):
@@ -414,25 +928,13 @@ class Barrier:
        Otherwise the current barrier position is incremented to refer to the same
        element and True is returned.
     """
-    ## SPEEDUP: A sequential scan is used.
-    ##  * Should use bisect and __cmp__, __lt__, __eq__.
-    ##  * Should call find() for doing all the bisecting.
-    ## http://bugs.python.org/issue4356 asks for adding a key= parameter to bisect,
-    ## one of the reasons says:
-    ##   The lack of key may as well encourage you to continue using linear searches,
-    ##   or other sub-optimal solutions.
-    ## I chose the linear search for simplicity, as I fear hidden complexity while
-    ## tweaking compare functions.
-
-    insert_idx = len(self.points)       # if none is before, let insert become append.
     insert_key = self.key(point)
-    for i in range(0,len(self.points)):
-      if self.key(self.points[i]) > insert_key:
-        insert_idx = i
-        break
+    insert_idx = bisect_right(self.keys, insert_key)   # after all points with the same key
 
     # print "Barrier.insert", point, insert_idx, self.points
     self.points.insert(insert_idx, point)
+    self.keys.insert(insert_idx, insert_key)
+    self._hash_id(point)
     if insert_idx > self.idx:
       return False      # ahead
     self.idx += 1
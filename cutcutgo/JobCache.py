@@ -0,0 +1,196 @@
+# On-disk cache of compiled jobs.
+#
+# A job is stored under the hash of everything it was compiled from: the
+# document, the options and the driver sources, see JobCache.key() and
+# sources_hash(). The value is the command stream recorded by
+# CricutMaker.plot(record=...) in <key>.gcode, written while the job is sent,
+# and the cut paths and bounding box in <key>.json, so a repeated send can
+# preview the cut and go straight to CricutMaker.plot_compiled(). The commands
+# are read back from the file while they are sent again.
+#
+# The cache is bounded in size. A hit refreshes the modification time of the
+# entry, and the least recently used entries are evicted first.
+#
+# Usage:
+#   python3 -m cutcutgo.JobCache list|clear [--dir DIR]
+
+import os
+import sys
+import json
+import hashlib
+from tempfile import gettempdir
+
+
+def default_cache_dir():
+  return os.path.join(os.environ.get('XDG_CACHE_HOME') or gettempdir(), 'cutcutgo-jobs')
+
+
+def sources_hash(*paths):
+  """Hash of the cutcutgo modules and the given files, part of the key of a
+     job, so that a changed driver does not send jobs compiled by the old one.
+  """
+  package = os.path.dirname(os.path.abspath(__file__))
+  modules = sorted(os.path.join(package, name) for name in os.listdir(package)
+                   if name.endswith('.py'))
+  h = hashlib.sha256()
+  for path in modules + list(paths):
+    with open(path, 'rb') as f:
+      h.update(hashlib.sha256(f.read()).digest())
+  return h.hexdigest()
+
+
+class CachedCommands:
+  """The commands of a cache entry, read from its file while they are iterated."""
+  def __init__(self, path, count):
+    self.path = path
+    self.count = count
+
+  def __len__(self):
+    return self.count
+
+  def __iter__(self):
+    with open(self.path, 'rb') as f:
+      for line in f:
+        yield line.rstrip(b'\n')
+
+
+class JobRecord:
+  """Collects the commands of a job while it is sent, for CricutMaker.plot(record=...).
+     Each command is written to the file of the entry right away. commit()
+     stores the entry, abort() drops it.
+  """
+  def __init__(self, cache, key):
+    self.cache = cache
+    self.key = key
+    self.lines = 0
+    self.cmd_path, self.meta_path = cache._paths(key)
+    self.tmp_path = '%s.%d.tmp' % (self.cmd_path, os.getpid())
+    self.file = open(self.tmp_path, 'wb')
+
+  def append(self, cmd):
+    self.file.write(cmd + b'\n')
+    self.lines += 1
+
+  def commit(self, meta):
+    """Store the commands and the JSON serializable meta."""
+    self.file.close()
+    # the meta file is written last, get() ignores entries without it
+    os.replace(self.tmp_path, self.cmd_path)
+    with open(self.tmp_path, 'w') as f:
+      json.dump(dict(meta, lines=self.lines), f, default=lambda o: o.tolist())
+    os.replace(self.tmp_path, self.meta_path)
+    self.cache.evict()
+
+  def abort(self):
+    self.file.close()
+    try:
+      os.unlink(self.tmp_path)
+    except OSError:
+      pass
+
+
+class JobCache:
+  def __init__(self, directory=None, max_bytes=50*1024*1024):
+    self.directory = directory or default_cache_dir()
+    self.max_bytes = max_bytes
+    os.makedirs(self.directory, exist_ok=True)
+
+  @staticmethod
+  def key(*parts):
+    """Hash of parts, which are bytes, or anything with a stable repr()."""
+    h = hashlib.sha256()
+    for part in parts:
+      if not isinstance(part, bytes):
+        part = repr(part).encode()
+      h.update(b'%d:' % len(part))
+      h.update(part)
+    return h.hexdigest()
+
+  def _paths(self, key):
+    base = os.path.join(self.directory, key)
+    return base + '.gcode', base + '.json'
+
+  def get(self, key):
+    """Return (cmds, meta) of the entry, or None on a miss. cmds is a
+       CachedCommands, the commands are only read while it is iterated.
+    """
+    cmd_path, meta_path = self._paths(key)
+    try:
+      with open(meta_path) as f:
+        meta = json.load(f)
+      os.utime(cmd_path)
+      os.utime(meta_path)
+    except (OSError, ValueError):
+      return None
+    if 'lines' not in meta:
+      return None
+    return CachedCommands(cmd_path, meta['lines']), meta
+
+  def record(self, key):
+    """Return a JobRecord that stores the commands appended to it under key."""
+    return JobRecord(self, key)
+
+  def put(self, key, cmds, meta):
+    """Store the commands and the JSON serializable meta under key."""
+    record = self.record(key)
+    for cmd in cmds:
+      record.append(cmd)
+    record.commit(meta)
+
+  def entries(self):
+    """List (key, bytes, last use) of all entries, least recently used first."""
+    sizes = {}
+    used = {}
+    for name in os.listdir(self.directory):
+      key, ext = os.path.splitext(name)
+      if ext not in ('.gcode', '.json'):
+        continue
+      try:
+        st = os.stat(os.path.join(self.directory, name))
+      except OSError:
+        continue
+      sizes[key] = sizes.get(key, 0) + st.st_size
+      used[key] = max(used.get(key, 0), st.st_mtime)
+    return sorted(((key, sizes[key], used[key]) for key in sizes), key=lambda e: e[2])
+
+  def evict(self):
+    """Remove least recently used entries until the cache fits max_bytes."""
+    entries = self.entries()
+    total = sum(size for key, size, used in entries)
+    for key, size, used in entries:
+      if total <= self.max_bytes:
+        break
+      self.remove(key)
+      total -= size
+
+  def remove(self, key):
+    for path in self._paths(key):
+      try:
+        os.unlink(path)
+      except OSError:
+        pass
+
+  def clear(self):
+    """Invalidate all entries."""
+    for key, size, used in self.entries():
+      self.remove(key)
+
+
+if __name__ == "__main__":
+  import time
+  import argparse
+
+  parser = argparse.ArgumentParser(description='Manage the cache of compiled cutter jobs.')
+  parser.add_argument('op', choices=('list', 'clear'))
+  parser.add_argument('--dir', default=None, help="cache directory, default %s" % default_cache_dir())
+  args = parser.parse_args()
+
+  cache = JobCache(args.dir)
+  if args.op == 'clear':
+    cache.clear()
+    sys.exit(0)
+  total = 0
+  for key, size, used in cache.entries():
+    total += size
+    print("%s %10d %s" % (key, size, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(used))))
+  print("%d bytes in %s" % (total, cache.directory))
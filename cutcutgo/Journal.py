@@ -0,0 +1,149 @@
+# Job journal for resuming interrupted cuts.
+#
+# Each command of a job is written to <path>.gcode as it is sent, one
+# command per line. <path>.json holds the job metadata and the checkpoint:
+# the number of lines known to be executed by the device. It is rewritten
+# atomically while the job runs, after the lines it counts are flushed, so a
+# crash leaves a consistent journal behind. When the serial connection is
+# lost, the rest of the job is written as well and the journal is complete:
+# CricutMaker.resume() continues it. A job that ended for any other reason,
+# e.g. its commands could not be generated, stays incomplete.
+
+import os
+import re
+import json
+import time
+from tempfile import gettempdir
+
+_word_re = re.compile(rb'([A-Z])([-+]?[0-9]*\.?[0-9]*)')
+
+
+def journal_path(port=None):
+  """The default journal of the cutter on port, in the temporary directory.
+     Each cutter has its own, as only one job at a time runs on it.
+  """
+  name = re.sub(r'\W+', '_', port or '').strip('_') or 'cutter'
+  return os.path.join(gettempdir(), 'cutcutgo-job-' + name)
+
+
+class JobJournal:
+  def __init__(self, path, save_interval=0.5):
+    self.path = path
+    self.cmd_path = path + '.gcode'
+    self.state_path = path + '.json'
+    self.save_interval = save_interval
+    self.meta = {}
+    self.cmd_file = None
+    self.source_failed = False
+    self.last_save = 0.0
+
+  @classmethod
+  def load(cls, path):
+    """Return the journal at path, or None if there is none."""
+    job = cls(path)
+    try:
+      with open(job.state_path) as f:
+        job.meta = json.load(f)
+    except (OSError, ValueError):
+      return None
+    if not os.path.exists(job.cmd_path):
+      return None
+    return job
+
+  @property
+  def lines(self):
+    return self.meta['lines']
+
+  def create(self, **meta):
+    """Start a new job, meta is stored with it."""
+    self.meta = dict(meta, lines=0, executed=0, complete=False, done=False, created=time.time())
+    self.cmd_file = open(self.cmd_path, 'wb')
+    self.save()
+
+  def append(self, cmd):
+    self.cmd_file.write(cmd + b'\n')
+    self.meta['lines'] += 1
+
+  def recorded(self, cmds):
+    """Generate cmds, each appended to the journal before it is passed on.
+       If cmds raises, source_failed is set: the job is not complete.
+    """
+    cmds = iter(cmds)
+    while True:
+      try:
+        cmd = next(cmds)
+      except StopIteration:
+        return
+      except BaseException:
+        self.source_failed = True
+        raise
+      self.append(cmd)
+      yield cmd
+
+  def close(self):
+    """All commands are written."""
+    if self.cmd_file is None:
+      return
+    self.cmd_file.flush()
+    os.fsync(self.cmd_file.fileno())
+    self.cmd_file.close()
+    self.cmd_file = None
+    self.meta['complete'] = True
+    self.save()
+
+  def abort(self):
+    """Stop writing, the job stays incomplete and is not resumed."""
+    if self.cmd_file is None:
+      return
+    self.cmd_file.close()
+    self.cmd_file = None
+    self.save()
+
+  def commands(self, start=0):
+    """Generate the commands of the job, beginning with line start."""
+    with open(self.cmd_path, 'rb') as f:
+      for i, line in enumerate(f):
+        if i >= start:
+          yield line.rstrip(b'\n')
+
+  def executed(self, count):
+    """Checkpoint: the first count lines are done."""
+    self.meta['executed'] = count
+    now = time.monotonic()
+    if now - self.last_save >= self.save_interval:
+      self.save()
+
+  def finish(self):
+    self.meta['done'] = True
+    self.meta['executed'] = self.meta['lines']
+    self.save()
+
+  def save(self):
+    self.last_save = time.monotonic()
+    if self.cmd_file is not None:
+      # the checkpoint never counts lines that are not in the file
+      self.cmd_file.flush()
+    tmp = self.state_path + '.tmp'
+    with open(tmp, 'w') as f:
+      json.dump(self.meta, f)
+    os.replace(tmp, self.state_path)
+
+  def state_at(self, count):
+    """Modal state of the device after the first count lines:
+       a dict with the motion mode 'G', the feed 'F' and the axes 'X', 'Y',
+       'Z', as the bytes that were sent, or None where never set.
+    """
+    state = dict.fromkeys(('G', 'F', 'X', 'Y', 'Z'))
+    for i, line in enumerate(self.commands()):
+      if i >= count:
+        break
+      if line.startswith(b'$'):
+        continue
+      for letter, value in _word_re.findall(line):
+        letter = letter.decode()
+        if letter == 'G':
+          if value.lstrip(b'0') in (b'', b'1', b'2', b'3'):
+            state['G'] = int(value)
+        elif letter in state:
+          state[letter] = value
+    return state
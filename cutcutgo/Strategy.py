@@ -35,6 +35,8 @@ import copy     # deepcopy
 import math     # sqrt
 import sys      # maxsize
 
+import numpy as np
+
 from cutcutgo.Geometry import *
 
 
@@ -71,6 +73,180 @@ presets = {
 }
 
 
+class PointStore:
+  """Struct-of-arrays storage for the points of MatFree.
+
+     Coordinates are kept in float64 arrays x, y. The former point attributes
+     'sharp', 'seen', 'sub' and dropping a point (s.points[idx] = None) are
+     bits in flags, 'dup' is a counter. The segments of all points live in one
+     CSR-style array seg: the segments of point i are seg[segstart[i]:segstart[i]+segcount[i]].
+     Segments are marked done by negating them in place, as before.
+
+     Points are deduplicated by their coordinates through a dict keyed by the
+     float pair; it is built lazily, when add() is first needed after add_many().
+  """
+  SHARP   = 0x01
+  SEEN    = 0x02
+  SUB     = 0x04
+  DROPPED = 0x08
+
+  def __init__(self, capacity=1024):
+    self.n = 0
+    self.x = np.empty(capacity)
+    self.y = np.empty(capacity)
+    self.flags = np.zeros(capacity, dtype=np.uint8)
+    self.dup = np.zeros(capacity, dtype=np.int32)
+    self.segstart = np.zeros(capacity, dtype=np.int64)
+    self.segcount = np.zeros(capacity, dtype=np.int32)
+    self.seg = np.empty(0, dtype=np.int64)
+    self._index = {}
+
+  def __len__(self):
+    return self.n
+
+  @staticmethod
+  def key(x, y):
+    """dict key of a coordinate pair. Adding 0.0 merges -0.0 and 0.0"""
+    return (float(x)+0.0, float(y)+0.0)
+
+  def _grow(self, need):
+    cap = len(self.x)
+    if need <= cap: return
+    cap = max(need, 2*cap)
+    for name in ('x', 'y', 'flags', 'dup', 'segstart', 'segcount'):
+      old = getattr(self, name)
+      new = np.zeros(cap, dtype=old.dtype)
+      new[:self.n] = old[:self.n]
+      setattr(self, name, new)
+
+  @property
+  def index(self):
+    if self._index is None:
+      keep = (self.flags[:self.n] & self.DROPPED) == 0
+      ids = np.nonzero(keep)[0]
+      self._index = dict(zip(zip(self.x[ids].tolist(), self.y[ids].tolist()), ids.tolist()))
+    return self._index
+
+  def add(self, x, y):
+    """Returns the index of the point (x, y) and True if it was known already.
+       Known points get their dup counter incremented.
+    """
+    k = self.key(x, y)
+    idx = self.index.get(k)
+    if idx is not None:
+      self.dup[idx] += 1
+      return idx, True
+    idx = self.n
+    self._grow(idx+1)
+    self.x[idx], self.y[idx] = k
+    self.flags[idx] = 0
+    self.dup[idx] = 0
+    self.segstart[idx] = 0
+    self.segcount[idx] = 0
+    self.n += 1
+    self._index[k] = idx
+    return idx, False
+
+  def add_many(self, xy):
+    """Same as calling add() for each row of the (N, 2) array xy, but vectorized.
+       Returns the array of indices.
+    """
+    if len(xy) == 0:
+      return np.zeros(0, dtype=np.int64)
+    xy = xy + 0.0
+    n = self.n
+    live = np.nonzero((self.flags[:n] & self.DROPPED) == 0)[0]
+    allxy = np.concatenate((np.stack((self.x[live], self.y[live]), axis=1), xy))
+    uniq, first, inverse = np.unique(allxy, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    # known points keep their index, new points are numbered in the order
+    # of their first appearance, like add() does.
+    group = np.empty(len(uniq), dtype=np.int64)
+    known = first < len(live)
+    group[known] = live[first[known]]
+    fresh = np.nonzero(~known)[0]
+    fresh = fresh[np.argsort(first[fresh], kind='stable')]
+    group[fresh] = n + np.arange(len(fresh))
+    ids = group[inverse[len(live):]]
+
+    m = n + len(fresh)
+    self._grow(m)
+    self.x[n:m] = uniq[fresh, 0]
+    self.y[n:m] = uniq[fresh, 1]
+    self.flags[n:m] = 0
+    self.segstart[n:m] = 0
+    self.segcount[n:m] = 0
+    counts = np.bincount(ids, minlength=m)
+    self.dup[:n] += counts[:n].astype(np.int32)
+    self.dup[n:m] = counts[n:] - 1
+    self.n = m
+    self._index = None                  # rebuilt when needed
+    return ids
+
+  def drop(self, idx):
+    """Drop a point whose segments are all done. Its coordinates may be added again later."""
+    self.flags[idx] |= self.DROPPED
+    if self._index is not None:
+      k = self.key(self.x[idx], self.y[idx])
+      if self._index.get(k) == idx:
+        del self._index[k]
+
+  def link(self, paths):
+    """Build the segment arrays (back and forth) from paths of point indices.
+       The segments of each point are in the order in which the paths visit them.
+    """
+    pairs = [np.stack((p[:-1], p[1:]), axis=1) for p in paths if len(p) > 1]
+    if not pairs:
+      return
+    pairs = np.concatenate(pairs)
+    src = np.stack((pairs[:,0], pairs[:,1]), axis=1).ravel()
+    dst = np.stack((pairs[:,1], pairs[:,0]), axis=1).ravel()
+    order = np.argsort(src, kind='stable')
+    self.seg = dst[order].astype(np.int64)
+    self.segcount[:self.n] = np.bincount(src, minlength=self.n)
+    self.segstart[:self.n] = np.concatenate(([0], np.cumsum(self.segcount[:self.n])[:-1]))
+
+  def segs(self, idx):
+    """The (writable) segment view of a point"""
+    start = self.segstart[idx]
+    return self.seg[start:start+self.segcount[idx]]
+
+  def has(self, idx, flag):
+    return bool(self.flags[idx] & flag)
+
+  def xy_a(self, idx):
+    """The point as an XY_a() object with the attributes of the former object model"""
+    pt = XY_a((float(self.x[idx]), float(self.y[idx])))
+    pt.id = idx
+    if self.segcount[idx]: pt.seg = self.segs(idx).tolist()
+    if self.has(idx, self.SHARP): pt.sharp = True
+    if self.has(idx, self.SEEN): pt.seen = True
+    if self.has(idx, self.SUB): pt.sub = True
+    if self.dup[idx]: pt.dup = int(self.dup[idx])
+    return pt
+
+  def xy_a_many(self, idxs):
+    """Same as [xy_a(i) for i in idxs], reading the arrays only once"""
+    idxs = np.asarray(idxs, dtype=np.int64)
+    x, y = self.x[idxs].tolist(), self.y[idxs].tolist()
+    flags, dup = self.flags[idxs].tolist(), self.dup[idxs].tolist()
+    start, count = self.segstart[idxs].tolist(), self.segcount[idxs].tolist()
+    seg = self.seg.tolist()
+    points = []
+    for k, idx in enumerate(idxs.tolist()):
+      pt = XY_a((x[k], y[k]))
+      pt.id = idx
+      if count[k]: pt.seg = seg[start[k]:start[k]+count[k]]
+      f = flags[k]
+      if f & self.SHARP: pt.sharp = True
+      if f & self.SEEN: pt.seen = True
+      if f & self.SUB: pt.sub = True
+      if dup[k]: pt.dup = dup[k]
+      points.append(pt)
+    return points
+
+
 class MatFree:
   def __init__(self, preset="default", scale=1.0, pen=None):
     """This initializer defines settings for the apply() method.
@@ -101,7 +277,8 @@ class MatFree:
     # this avoids a busyloop after hitting Y_bar:
     if self.min_segmentlen < 0.001: self.min_segmentlen = 0.001
 
-    self.points = []
+    self.store = PointStore()
+    self.points = []                    # XY_a objects, only used by pyramids_barrier()
     self.points_dict = {}
     self.paths = []
 
@@ -119,8 +296,8 @@ class MatFree:
 
 
   def export(self):
-    """reverse of load(), except that the nodes are tuples of
-       [x, y, { ... attrs } ]
+    """reverse of load(), except that the nodes are XY_a() tuples of
+       (x, y) with attributes.
        Most notable attributes:
        - 'sharp', it is present on nodes where the path turns by more
           than 90 deg.
@@ -129,74 +306,51 @@ class MatFree:
     for path in self.paths:
       new_path = []
       for pt in path:
-        new_path.append(self.points[pt])
+        new_path.append(self.store.xy_a(pt))
       cut.append(new_path)
     return cut
 
-
   def pt2idx(self, x,y):
     """all points have an index, if the index differs, the point
        is at a different locations. All points also have attributes
-       stored with in the point object itself. Points that appear for the second
+       stored with in the point store. Points that appear for the second
        time receive an attribute 'dup':1, which is incremented on further reoccurences.
     """
-
-    k = str(x)+','+str(y)
-    if k in self.points_dict:
-      idx = self.points_dict[k]
-      if self.verbose:
-        print("%d found as dup" % idx, file=sys.stderr)
-      if 'dup' in self.points[idx].attr:
-        self.points[idx].dup += 1
-      else:
-        self.points[idx].dup = 1
-    else:
-      idx = len(self.points)
-      self.points.append(XY_a((x,y)))
-      self.points_dict[k] = idx
-      self.points[idx].id = idx
+    idx, found = self.store.add(x, y)
+    if found and self.verbose:
+      print("%d found as dup" % idx, file=sys.stderr)
     return idx
 
-
   def load(self, cut):
     """load a sequence of paths.
        Nodes are expected as tuples (x, y).
-       We extract points into a seperate list, with attributes as a third
-       element to the tuple. Typical attributes to be added by other methods
-       id, seg[] by method link_points(), sharp by method mark_sharp_segs(),
+       We extract points into the point store, paths become arrays of
+       point indices. Typical attributes to be added by other methods
+       seg[] by method link_points(), sharp by method mark_sharp_segs(),
        ...
     """
-
-    for path in cut:
-      new_path = []
-      for point in path:
-        idx = self.pt2idx(self.input_scale * point[0], self.input_scale * point[1])
-
-        if len(new_path) == 0 or new_path[-1] != idx or self.do_dedup == False:
-          # weed out repeated points
-          new_path.append(idx)
-          # self.points[idx].refcount += 1
-      self.paths.append(new_path)
-
+    lengths = np.array([len(path) for path in cut], dtype=np.int64)
+    xy = np.fromiter((c for path in cut for point in path for c in (point[0], point[1])),
+                     dtype=float, count=2*int(lengths.sum())).reshape(-1, 2)
+    idx = self.store.add_many(self.input_scale * xy)
+    ndup = len(idx) - len(self.store)
+    if ndup and self.verbose:
+      print("%d points found as dup" % ndup, file=sys.stderr)
+
+    keep = np.ones(len(idx), dtype=bool)
+    if self.do_dedup:
+      # weed out repeated points, but never the first point of a path
+      keep[1:] = idx[1:] != idx[:-1]
+      starts = np.cumsum(lengths)[:-1]
+      keep[starts[starts < len(idx)]] = True
+    path_of = np.repeat(np.arange(len(lengths)), lengths)
+    kept = np.bincount(path_of[keep], minlength=len(lengths))
+    self.paths.extend(np.split(idx[keep], np.cumsum(kept)[:-1]))
 
   def link_points(s):
     """add segments (back and forth) between connected points.
     """
-    for path in s.paths:
-      A = None
-      for pt in path:
-        if A is not None:
-          if 'seg' in s.points[A].attr:
-            s.points[A].seg.append(pt)
-          else:
-            s.points[A].seg = [ pt ]
-
-          if 'seg' in s.points[pt].attr:
-            s.points[pt].seg.append(A)
-          else:
-            s.points[pt].seg = [ A ]
-        A = pt
-
+    s.store.link(s.paths)
 
   def subdivide_segments(s, maxlen):
     """Insert addtional points along the paths, so that
@@ -205,32 +359,52 @@ class MatFree:
     if s.do_subdivide == False:
       return
     maxlen_sq = maxlen * maxlen
-    for path_idx in range(len(s.paths)):
-      path = s.paths[path_idx]
-      new_path = []
-      for pt in path:
-        if len(new_path):
-          A = new_path[-1]
-          dist_a_pt_sq = dist_sq(s.points[A], s.points[pt])
-          if dist_a_pt_sq > maxlen_sq:
-            dist = math.sqrt(dist_a_pt_sq)
-            nsub = int(dist/maxlen)
-            seg_len = dist/float(nsub+1)
-            dx = (s.points[pt].x - s.points[A].x)/float(nsub+1)
-            dy = (s.points[pt].y - s.points[A].y)/float(nsub+1)
-            if s.verbose > 1:
-              print("pt%d -- pt%d: need nsub=%d, seg_len=%g" % (A,pt,nsub,seg_len), file=sys.stderr)
-              print("dxdy", dx, dy, "to", (s.points[pt].x, s.points[pt].y), "from", (s.points[A].x,s.points[A].y), file=sys.stderr)
-            for subdiv in range(nsub):
-              sub_pt =s.pt2idx(s.points[A].x+dx+subdiv*dx,
-                               s.points[A].y+dy+subdiv*dy)
-              new_path.append(sub_pt)
-              s.points[sub_pt].sub = True
-              if s.verbose > 1:
-                print("   sub", (s.points[sub_pt].x, s.points[sub_pt].y), file=sys.stderr)
-        new_path.append(pt)
-      s.paths[path_idx] = new_path
-
+    st = s.store
+    if not s.paths: return
+    lengths = np.array([len(path) for path in s.paths], dtype=np.int64)
+    flat = np.concatenate(s.paths).astype(np.int64)
+    if len(flat) < 2: return
+
+    # segments flat[i] -- flat[i+1] that do not cross a path boundary
+    A = flat[:-1]
+    B = flat[1:]
+    within = np.ones(len(A), dtype=bool)
+    ends = np.cumsum(lengths)
+    within[ends[ends <= len(A)]-1] = False
+    dx = st.x[B] - st.x[A]
+    dy = st.y[B] - st.y[A]
+    long_segs = np.nonzero(within & (dx*dx + dy*dy > maxlen_sq))[0]
+    if not len(long_segs): return
+
+    dist = np.sqrt(dx[long_segs]*dx[long_segs] + dy[long_segs]*dy[long_segs])
+    nsub = (dist/maxlen).astype(np.int64)
+    dx = dx[long_segs]/(nsub+1.0)
+    dy = dy[long_segs]/(nsub+1.0)
+    if s.verbose > 1:
+      for j, k in enumerate(long_segs.tolist()):
+        print("pt%d -- pt%d: need nsub=%d, seg_len=%g" % (A[k],B[k],nsub[j],dist[j]/float(nsub[j]+1)), file=sys.stderr)
+
+    # all subdivision points, in path order
+    owner = np.repeat(np.arange(len(long_segs)), nsub)
+    step = np.arange(len(owner)) - np.repeat(np.cumsum(nsub)-nsub, nsub)
+    ax = st.x[A[long_segs]][owner]
+    ay = st.y[A[long_segs]][owner]
+    sub_xy = np.stack((ax+dx[owner]+step*dx[owner], ay+dy[owner]+step*dy[owner]), axis=1)
+    sub = st.add_many(sub_xy)
+    st.flags[sub] |= st.SUB
+
+    # splice the subdivision points in after the start point of their segment
+    nsub_at = np.zeros(len(flat), dtype=np.int64)
+    nsub_at[long_segs] = nsub
+    pos = np.arange(len(flat)) + np.concatenate(([0], np.cumsum(nsub_at)[:-1]))
+    out = np.empty(len(flat)+len(sub), dtype=np.int64)
+    is_sub = np.ones(len(out), dtype=bool)
+    is_sub[pos] = False
+    out[pos] = flat
+    out[is_sub] = sub
+    path_of = np.repeat(np.arange(len(lengths)), lengths)
+    new_lengths = lengths + np.bincount(path_of, weights=nsub_at, minlength=len(lengths)).astype(np.int64)
+    s.paths = np.split(out, np.cumsum(new_lengths)[:-1])
 
   def mark_sharp_segs(s):
     """walk all the points and check their segments attributes,
@@ -238,37 +412,32 @@ class MatFree:
        This needs link_points() to be called earlier.
        One sharp turn per point is enough to make us careful.
        We don't track which pair of turns actually is a sharp turn, if there
-       are more than two segs. Those cases are rare enough to allow the inefficiency.
+       are more than two segs.
+
+       All (A, pt, B) triples of all points are built from the segment arrays
+       and classified at once with sharp_turn_many(). Points are grouped by
+       their number of segments, so that each group is a regular array.
 
        TODO: can honor corner_detect_min_jump? Even if so, what should we do in the case
        where multiple points are so close together that the paper is likely to tear?
     """
-    for pt in s.points:
-      if 'sharp' in pt.attr:
-        ## shortcut existing flags. One sharp turn per point is enough to make us careful.
-        ## we don't want to track which pair of turns actually is a sharp turn, if there
-        ## are more than two segments per point. Those cases are rare enough
-        ## to handle them inefficiently.
-        continue
-      if 'seg' in pt.attr:
-        ll = len(pt.seg)
-        # if ll > 4:
-        #   ## You cannot attach 5 lines to a point without creating one sharp angle.
-        #   ## This is true for sharp turn defined as >90 degree.
-        #   pt.sharp = True
-        #   continue
-        ## look at each pair of segments once, check their angle.
-        for l1 in range(ll):
-          A = s.points[pt.seg[l1]]
-          for l2 in range(l1+1, ll):
-            B = s.points[pt.seg[l2]]
-            if sharp_turn(A,pt,B, s.sharp_turn_fwd_ratio):
-              pt.sharp = True
-          if 'sharp' in pt.attr:
-            break
-      else:
-        print("warning: no segments in point %d. Run link_points() before mark_sharp_segs()" % (pt.id), file=sys.stderr)
-
+    st = s.store
+    n = len(st)
+    segcount = st.segcount[:n]
+    for i in np.nonzero(segcount == 0)[0].tolist():
+      print("warning: no segments in point %d. Run link_points() before mark_sharp_segs()" % (i), file=sys.stderr)
+
+    xy = np.stack((st.x[:n], st.y[:n]), axis=1)
+    for ll in np.unique(segcount[segcount > 1]).tolist():
+      pts = np.nonzero(segcount == ll)[0]
+      l1, l2 = np.triu_indices(ll, 1)               # each pair of segments once
+      segs = st.seg[st.segstart[pts][:,None] + np.arange(ll)]
+      A = segs[:,l1].ravel()
+      B = segs[:,l2].ravel()
+      P = np.repeat(pts, len(l1))
+      sharp = sharp_turn_many(xy[A], xy[P], xy[B], s.sharp_turn_fwd_ratio)
+      sharp = sharp.reshape(len(pts), len(l1)).any(axis=1)
+      st.flags[pts[sharp]] |= st.SHARP
 
 
   def mark_sharp_paths(s):
@@ -291,19 +460,19 @@ class MatFree:
     A = None
     B = None
     for path in s.paths:
-      if B is not None and len(path) and dist_sq(B, s.points[path[0]]) > min_jump_sq:
+      if B is not None and len(path) and dist_sq(B, s.store.xy_a(path[0])) > min_jump_sq:
         # disconnect the path, if we jump more than 2mm
         A = None
         B = None
 
       for iC in path:
-        C = s.points[iC]
+        C = s.store.xy_a(iC)
         if B is not None and dist_sq(B,C) < dup_eps_sq:
           # less than 0.1 mm distance: ignore the point as a duplicate.
           continue
 
         if A is not None and sharp_turn(A,B,C, s.sharp_turn_fwd_ratio):
-          B.sharp = True
+          s.store.flags[B.id] |= s.store.SHARP
 
         A = B
         B = C
@@ -319,16 +488,18 @@ class MatFree:
        the previous segment if it would help. (FIXME: this possibility should
        be detected earlier)
        Otherwise, the segment is appended as a new path.
+       Segments and output paths are lists of point indices.
     """
     if not 'output' in s.__dict__: s.output = []
+    st = s.store
     if len(s.output) and s.verbose > 1:
       print("append_or_extend_hard...", s.output[-1][-1], seg, file=sys.stderr)
-    if (len(s.output) > 0 and len(s.output[-1]) >= 2 and
-         'sharp' not in s.output[-1][0] and
-         'sharp' not in s.output[-1][-1]):
+    ## FIXME: the sharp test of both ends used to be done on the point tuple, not its
+    ##        attributes, and thus never prevented the flip. Kept as is.
+    if (len(s.output) > 0 and len(s.output[-1]) >= 2):
       # we could flip around the previous segment, if needed:
-      if (s.output[-1][0].id == seg[0].id or
-          s.output[-1][0].id == seg[-1].id):
+      if (s.output[-1][0] == seg[0] or
+          s.output[-1][0] == seg[-1]):
         # yes, flipping the previous segment, will help below. do it.
         s.output[-1] = list(reversed(s.output[-1]))
         if s.verbose:
@@ -336,13 +507,13 @@ class MatFree:
       #
     #
 
-    if len(s.output) > 0 and s.output[-1][-1].id == seg[0].id:
+    if len(s.output) > 0 and s.output[-1][-1] == seg[0]:
       s.output[-1].extend(seg[1:])
       if s.verbose > 1:
         print("... extend", file=sys.stderr)
-    elif len(s.output) > 0 and s.output[-1][-1].id == seg[-1].id:
+    elif len(s.output) > 0 and s.output[-1][-1] == seg[-1]:
       ## check if we can turn it around
-      if 'sharp' not in s.output[-1][-1].attr and 'sharp' not in seg[-1].attr and 'sharp' not in seg[0].attr:
+      if not st.has(s.output[-1][-1], st.SHARP) and not st.has(seg[-1], st.SHARP) and not st.has(seg[0], st.SHARP):
         s.output[-1].extend(list(reversed(seg))[1:])
         if s.verbose > 1:
           print("... extend reveresed", file=sys.stderr)
@@ -357,18 +528,18 @@ class MatFree:
         print("... append", file=sys.stderr)
     #
 
-
   def append_or_extend_simple(s, seg):
     """adds a segment to the output list. The segment extends the previous segment,
        if the last point if the previous segment is identical with our first
        point.
        Otherwise, the segment is appended as a new path.
+       Segments and output paths are lists of point indices.
     """
     if not 'output' in s.__dict__: s.output = []
     if len(s.output) and s.verbose > 2:
       print("append_or_extend_simple...", s.output[-1][-1], seg, file=sys.stderr)
 
-    if len(s.output) > 0 and s.output[-1][-1].id == seg[0].id:
+    if len(s.output) > 0 and s.output[-1][-1] == seg[0]:
       s.output[-1].extend(seg[1:])
       if s.verbose > 1:
         print("... extend", file=sys.stderr)
@@ -378,17 +549,45 @@ class MatFree:
         print("... append", file=sys.stderr)
     #
 
+  def unlink(s, iA, iB):
+    """Remove the segment [AB] from the point store, given the point indices.
+       The segment is removed, by replacing its slot with a negative number.
+       The endpoints are marked with seen=True so that in case of a sharp turn,
+       we know we can no longer start there.
+       If now A or B are without other active segments, A and/or B are dropped
+       from the point store.
+
+       process_simple_barrier() ignores points and segments
+       that have already been done. This asserts progress in the algorithm.
+    """
+    st = s.store
+    st.flags[iA] |= st.SEEN
+    st.flags[iB] |= st.SEEN
+    a_seg = st.segs(iA)
+    a_seg[a_seg == iB] = -iB or -sys.maxsize
+    b_seg = st.segs(iB)
+    b_seg[b_seg == iA] = -iA or -sys.maxsize
+
+    # CAUTION: is this really helpful?:
+    ## it prevents points from a slice to go into process_simple_barrier()'s segment list,
+    ## but it also hides information....
+    if not (a_seg >= 0).any():
+      st.drop(iA)
+    if not (b_seg >= 0).any():
+      st.drop(iB)
+
 
   def unlink_segment(s, A, B):
-    """Remove the segment [AB] from the s.points list.
+    """Remove the segment [AB] from the s.points list of XY_a() objects.
        The segment is removed, by replacing its slot with a negative number.
        The endpoints are marked with seen=True so that in case of a sharp turn,
        we know we can no longer start there.
        If now A or B are without other active segments, A and/or B are dropped
        entirely from s.points .
 
-       process_simple_barrier() and process_pyramids_barrier() ignore points and segments
-       that have already been done. This asserts progress in the algorithms.
+       process_pyramids_barrier() ignores points and segments
+       that have already been done. This asserts progress in the algorithm.
+       See unlink() for the point store version.
     """
     A.seen = True
     B.seen = True
@@ -408,12 +607,10 @@ class MatFree:
     ## but it also hides information....
     if not a_seg_todo:
       s.points[iA] = None
-      k = str(A.x)+','+str(A.y)
-      del(s.points_dict[k])
+      del(s.points_dict[PointStore.key(A.x, A.y)])
     if not b_seg_todo:
       s.points[iB] = None
-      k = str(B.x)+','+str(B.y)
-      del(s.points_dict[k])
+      del(s.points_dict[PointStore.key(B.x, B.y)])
 
 
 
@@ -527,12 +724,16 @@ class MatFree:
   def _dump_all(s):
     """ dump all points in a readable way.
     """
-    for iP in range(0,len(s.points)):
-      pt = s.points[iP]
-      if pt is None: continue
-      a = pt.att() if pt else None
-      print(iP, ": ", pt, a)
-
+    if s.points:
+      for iP in range(0,len(s.points)):
+        pt = s.points[iP]
+        if pt is None: continue
+        print(iP, ": ", pt, pt.att())
+      return
+    for iP in range(len(s.store)):
+      if s.store.has(iP, s.store.DROPPED): continue
+      pt = s.store.xy_a(iP)
+      print(iP, ": ", pt, pt.att())
 
   def process_pyramids_barrier(s, y_slice, max_y, left2right=True):
     """ finding the next point involves overshadowing other points.
@@ -740,7 +941,7 @@ class MatFree:
 
       # tentatively advance Xf_bar from A to B
       Xf_a_idx = Xf_bar.pos()                   # unused, we never move back to A.
-      Xf_b_idx = Xf_bar.lookup(lambda b: b.id==B.id if b else False)
+      Xf_b_idx = Xf_bar.lookup_id(B.id)
       if Xf_b_idx is None:                      # Should never happen!
         print("Xf_bar.lookup(B)=None. B=",B)    # Okayish fallback, but find() may return
         Xf_b_idx = Xf_bar.find(B)               # a different point with the same key().
@@ -793,36 +994,40 @@ class MatFree:
        All line segments that are below max_y are promoted into the output list,
        with a carefully chosen ordering and direction. append_or_extend_hard()
        is used to merge segments into longer paths where possible.
+       y_slice is an array of point indices.
 
        The final x-coordinate is returned, so that the caller can provide us
        with its value on the next call.
     """
+    st = s.store
     if s.verbose:
       print("process_simple_barrier limit=%g, points=%d, %s" % (max_y, len(y_slice), last_x), file=sys.stderr)
-      print("                max_y=%g" % (y_slice[-1].y), file=sys.stderr)
+      print("                max_y=%g" % (st.y[y_slice[-1]]), file=sys.stderr)
 
     min_x = None
     max_x = None
 
     segments = []
-    for pt in y_slice:
-      if pt is None:            # all segments to that point are done.
-        continue
-      if not 'seg' in pt.attr:  # shit happens
+    for pt in y_slice.tolist():
+      if st.segcount[pt] == 0:    # shit happens
         continue
-      for iC in pt.seg:
-        if iC < 0:              # this segment is done.
+      pt_seg = st.segs(pt)
+      for n in range(len(pt_seg)):
+        iC = int(pt_seg[n])       # unlink() below may have marked it done meanwhile
+        if iC < 0:                # this segment is done.
           continue
-        C = s.points[iC]
-        if C is not None and C.y <= max_y:
+        C = iC
+        if not st.has(C, st.DROPPED) and st.y[C] <= max_y:
           if s.verbose > 1:
             print("   segments.append", C, pt, file=sys.stderr)
+          Cx = float(st.x[C])
+          Px = float(st.x[pt])
           segments.append((C,pt))
-          if min_x is None or min_x >  C.x: min_x =  C.x
-          if min_x is None or min_x > pt.x: min_x = pt.x
-          if max_x is None or max_x <  C.x: max_x =  C.x
-          if max_x is None or max_x < pt.x: max_x = pt.x
-          s.unlink_segment(C,pt)
+          if min_x is None or min_x >  Cx: min_x =  Cx
+          if min_x is None or min_x >  Px: min_x =  Px
+          if max_x is None or max_x <  Cx: max_x =  Cx
+          if max_x is None or max_x <  Px: max_x =  Px
+          s.unlink(C,pt)
         #
       #
     #
@@ -830,10 +1035,13 @@ class MatFree:
     left2right = s.decide_left2right(min_x, max_x, last_x)
     xsign = -1.0
     if left2right: xsign = 1.0
+    xs = st.x
+    ys = st.y
     def dovetail_both_key(a):
-      return a[0].y+a[1].y+xsign*(a[0].x+a[1].x)
+      return float(ys[a[0]])+float(ys[a[1]])+xsign*(float(xs[a[0]])+float(xs[a[1]]))
     segments.sort(key=dovetail_both_key)
 
+    sharp_seen = st.SHARP | st.SEEN
     for segment in segments:
       ## Flip the orientation of each line segment according to this strategy:
       ## check 'sharp' both ends. (sharp is irrelevent without 'seen')
@@ -843,11 +1051,12 @@ class MatFree:
       ##   midpoint to each end, in the order indicated by decide_left2right().
       A = segment[0]
       B = segment[1]
-      if 'sharp' in A.attr and 'seen' in A.attr:
-        if 'sharp' in B.attr and 'seen' in B.attr:              # both sharp
-          iM = s.pt2idx((A.x+B.x)*.5, (A.y+B.y)*.5 )
-          M = s.points[iM]
-          if xsign*A.x <= xsign*B.x:
+      Ax = float(xs[A])
+      Bx = float(xs[B])
+      if st.flags[A] & sharp_seen == sharp_seen:
+        if st.flags[B] & sharp_seen == sharp_seen:              # both sharp
+          M = s.pt2idx((Ax+Bx)*.5, (float(ys[A])+float(ys[B]))*.5 )
+          if xsign*Ax <= xsign*Bx:
             s.append_or_extend_hard([M, A])
             s.append_or_extend_hard([M, B])
           else:
@@ -856,10 +1065,10 @@ class MatFree:
         else:                                                   # only A sharp
           s.append_or_extend_hard([B, A])
       else:
-        if 'sharp' in B.attr and 'seen' in B.attr:              # only B sharp
+        if st.flags[B] & sharp_seen == sharp_seen:              # only B sharp
           s.append_or_extend_hard([A, B])
         else:                                                   # none sharp
-          if xsign*A.x <= xsign*B.x:
+          if xsign*Ax <= xsign*Bx:
             s.append_or_extend_hard([A, B])
           else:
             s.append_or_extend_hard([B, A])
@@ -869,8 +1078,7 @@ class MatFree:
 
     # return the last x coordinate of the last stroke
     if not 'output' in s.__dict__: return 0
-    return s.output[-1][-1].x
-
+    return float(st.x[s.output[-1][-1]])
 
   def decide_left2right(s, min_x, max_x, last_x=0.0):
     """given the current x coordinate of the cutting head and
@@ -898,6 +1106,10 @@ class MatFree:
        While obeying this shadow rule, we also sweep left and right through the data, similar to the
        simple_barrier() algorithm below.
     """
+    # this algorithm works on the XY_a() object model.
+    s.points = [None if s.store.has(i, s.store.DROPPED) else s.store.xy_a(i) for i in range(len(s.store))]
+    s.points_dict = dict((PointStore.key(p.x, p.y), p.id) for p in s.points if p is not None)
+
     s.output = []
     if not s.do_slicing:
       for path in s.paths:
@@ -946,33 +1158,29 @@ class MatFree:
        When no more cuts are possible, then move the barrier, try again.
        A point that has all segments with negative signs is removed.
 
-       Input is read from s.paths[] -- having lists of point indices.
-       The output is placed into s.output[] as lists of XY_a() objects
+       Input is read from s.paths[] -- having arrays of point indices.
+       The output is placed into s.output[] as lists of point indices
        by calling process_simple_barrier() and friends.
     """
 
     if not s.do_slicing:
       s.output = []
       for path in s.paths:
-        s.output.append([])
-        for idx in path:
-          s.output[-1].append(s.points[idx])
-        #
+        s.output.append(path.tolist())
       #
       return
 
 
     ## first step sort the points into an additional list by ascending y.
-    def by_y_key(a):
-      return a.y
-    sy = sorted(s.points, key=by_y_key)
+    sy = np.argsort(s.store.y[:len(s.store)], kind='stable')
+    sy_y = s.store.y[sy].tolist()
 
     barrier_y = s.barrier_increment
     barrier_idx = 0     # pointing to the first element that is beyond.
     last_x = 0.0        # we start at home.
     while True:
       old_idx = barrier_idx
-      while sy[barrier_idx].y < barrier_y:
+      while sy_y[barrier_idx] < barrier_y:
         barrier_idx += 1
         if barrier_idx >= len(sy):
           break
@@ -983,7 +1191,6 @@ class MatFree:
       barrier_y += s.barrier_increment
     #
 
-
   def apply_overshoot(s, paths, start_travel, end_travel):
     """Extrapolate path in the output list by the give travel at start and/or end
        Paths are extended linear, curves are not taken into accound.
@@ -992,13 +1199,13 @@ class MatFree:
        the split point.
     """
     def extend_b(A,B,travel):
-      d = math.sqrt(dist_sq(A,B))
+      dx = B[0]-A[0]
+      dy = B[1]-A[1]
+      d = math.sqrt(dx*dx + dy*dy)
       if d < 0.000001: return B         # cannot extrapolate if A == B
       ratio = travel/d
-      dx = B.x-A.x
-      dy = B.y-A.y
-      C = XY_a((B.x+dx*ratio,  B.y+dy*ratio))
-      if 'sharp' in B.attr: C.sharp = True
+      C = XY_a((B[0]+dx*ratio,  B[1]+dy*ratio))
+      if 'sharp' in getattr(B, 'attr', ()): C.sharp = True
       return C
 
     for path in paths:
@@ -1021,6 +1228,10 @@ class MatFree:
       self.link_points()
       self.mark_sharp_segs()
       self.simple_barrier()
+      # back to XY_a points with their attributes, one object per point as before
+      used = sorted(set(i for path in self.output for i in path))
+      points = dict(zip(used, self.store.xy_a_many(used)))
+      self.output = [[points[i] for i in path] for path in self.output]
     if self.tool_pen == False and self.overshoot > 0.0:
       self.output = self.apply_overshoot(self.output, self.overshoot, self.overshoot)
 
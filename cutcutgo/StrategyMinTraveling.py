@@ -5,6 +5,12 @@
 # Strategy is:
 # At each end of a cut search the nearest starting point for the next cut.
 # This will probably not find find the global optimum, but works well enough.
+# Optionally, improve() shortens the greedy order with 2-opt and Or-opt moves.
+# fuse() joins paths that meet end to start, saving a tool lift each.
+# fuse_adjacent() does the same without changing the order of the paths.
+
+import time
+from collections import deque
 
 
 # Calculates the distance between two given points.
@@ -42,14 +48,358 @@ def findnearestpath(paths, pos, entrycircular, reversible):
     return nearestindex,selected
 
 
+# Spatial index over the entry points of all paths.
+# Each path contributes its start point, its end point (if reversible) and,
+# for closed paths with entrycircular, all of its vertices. The points are
+# binned into a uniform grid of square cells, which is searched ring by ring
+# around the current position. Removed paths are only flagged dead, their
+# entries are skipped and dropped from a cell when the cell is visited.
+# When most paths are gone, the grid is rebuilt with a coarser cell size,
+# so that searches do not crawl through large empty areas.
+#
+# findnearest() returns the same result as findnearestpath() on the list of
+# remaining paths: ties are broken by the original path order, then by
+# start point, end point and vertex order, just like the linear scan does.
+class EntryGrid:
+    def __init__(self, paths, entrycircular=False, reversible=True):
+        self.paths = paths
+        self.entrycircular = entrycircular
+        self.reversible = reversible
+        self.alive = [True] * len(paths)
+        self.count = len(paths)
+        self._build()
+
+    def __len__(self):
+        return self.count
+
+    # entry kind: 0 = start, 1 = end (reversed), 2+i = vertex i of a closed path
+    def _entries(self, index):
+        path = self.paths[index]
+        yield path[0], 0
+        if self.reversible:
+            yield path[-1], 1
+        if (self.entrycircular & (path[0] == path[-1])):
+            for i,p in enumerate(path):
+                yield p, 2+i
+
+    def _build(self):
+        entries = []
+        self.nentries = [0] * len(self.paths)
+        for index in range(len(self.paths)):
+            if self.alive[index]:
+                for p,kind in self._entries(index):
+                    entries.append((p[0], p[1], index, kind))
+                    self.nentries[index] += 1
+        self.live = self.built = len(entries)
+        self.cells = {}
+        if not entries:
+            self.cellsize = 1.0
+            self.minx = self.maxx = self.miny = self.maxy = 0
+            return
+        xmin = min(e[0] for e in entries)
+        xmax = max(e[0] for e in entries)
+        ymin = min(e[1] for e in entries)
+        ymax = max(e[1] for e in entries)
+        # aim for roughly two entries per cell, also when all entries are on a line
+        extent = max(xmax-xmin, ymax-ymin, 1e-6)
+        thin = extent/len(entries)
+        area = max(xmax-xmin, thin) * max(ymax-ymin, thin)
+        self.cellsize = max((2.0*area/len(entries))**0.5, 1e-6)
+        cs = self.cellsize
+        for e in entries:
+            key = (int(e[0]//cs), int(e[1]//cs))
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = [e]
+            else:
+                cell.append(e)
+        self.minx = int(xmin//cs)
+        self.maxx = int(xmax//cs)
+        self.miny = int(ymin//cs)
+        self.maxy = int(ymax//cs)
+
+    def remove(self, index):
+        """Flag a path as done. Its entries are dropped lazily."""
+        self.alive[index] = False
+        self.count -= 1
+        self.live -= self.nentries[index]
+        if self.count and self.live*4 < self.built and self.built > 64:
+            self._build()
+
+    def _scan(self, key, pos, best):
+        cell = self.cells.get(key)
+        if cell is None:
+            return best
+        alive = self.alive
+        if not all(alive[e[2]] for e in cell):
+            cell[:] = [e for e in cell if alive[e[2]]]
+            if not cell:
+                del self.cells[key]
+                return best
+        for e in cell:
+            dx = pos[0]-e[0]
+            dy = pos[1]-e[1]
+            cand = (dx*dx+dy*dy, e[2], e[3])
+            if best is None or cand < best:
+                best = cand
+        return best
+
+    def findnearest(self, pos):
+        """Returns index,selected like findnearestpath() does."""
+        cs = self.cellsize
+        cx = int(pos[0]//cs)
+        cy = int(pos[1]//cs)
+        # chebyshev distance from the position cell to the occupied grid
+        r = max(self.minx-cx, cx-self.maxx, self.miny-cy, cy-self.maxy, 0)
+        rmax = max(cx-self.minx, self.maxx-cx, cy-self.miny, self.maxy-cy, 0)
+        best = None
+        while r <= rmax:
+            if r == 0:
+                best = self._scan((cx, cy), pos, best)
+            else:
+                for x in range(max(cx-r, self.minx), min(cx+r, self.maxx)+1):
+                    if cy-r >= self.miny: best = self._scan((x, cy-r), pos, best)
+                    if cy+r <= self.maxy: best = self._scan((x, cy+r), pos, best)
+                for y in range(max(cy-r+1, self.miny), min(cy+r-1, self.maxy)+1):
+                    if cx-r >= self.minx: best = self._scan((cx-r, y), pos, best)
+                    if cx+r <= self.maxx: best = self._scan((cx+r, y), pos, best)
+            if best is not None:
+                # every entry not yet scanned is at least this far away
+                bound = min(pos[0]-(cx-r)*cs, (cx+r+1)*cs-pos[0],
+                            pos[1]-(cy-r)*cs, (cy+r+1)*cs-pos[1])
+                if bound > 0 and best[0] < bound*bound:
+                    break
+            r += 1
+
+        if best is None:
+            raise ValueError("findnearest() on an empty index")
+        index, kind = best[1], best[2]
+        path = self.paths[index]
+        if kind == 0:
+            selected = path
+        elif kind == 1:
+            selected = path[::-1]
+        else:
+            i = kind-2
+            selected = path[i:] + path[1:i+1]
+        return index,selected
+
+
 # Sort paths to approximate minimal traveling times
 # (greedy algorithm not necessarily optimal)
 def sort(paths, entrycircular=False, reversible=True):
     pos=(0,0)
     sortedpaths=[]
-    while (len(paths) > 0):
-        i,path = findnearestpath(paths,pos,entrycircular,reversible)
-        paths.pop(i)             # delete found index
+    index = EntryGrid(paths, entrycircular, reversible)
+    while (len(index) > 0):
+        i,path = index.findnearest(pos)
+        index.remove(i)          # lazy deletion of all entries of path i
         pos = path[-1]           # endpoint is next start point for search
         sortedpaths.append(path) # append to output list
+    del paths[:]                 # consumed, as with the former paths.pop()
     return sortedpaths
+
+
+# Pen-up travel distances from each point in a to each point in b.
+# Rows of b that are NaN (no successor) contribute no travel.
+def _travel(a, b):
+    import numpy as np
+    d = np.hypot(a[...,0]-b[...,0], a[...,1]-b[...,1])
+    return np.nan_to_num(d, nan=0.0)
+
+
+# Improve the order of already sorted paths by local search, bounded by
+# a time budget of seconds. Two kinds of moves are tried:
+# 2-opt reverses a run of consecutive paths (each path is reversed too,
+# thus only used when reversible), Or-opt relocates a run of up to three
+# paths to another place in the order (optionally reversed).
+# For a fixed run, all possible targets are evaluated at once with numpy.
+# Only pen-up travel is counted, starting at pos.
+def improve(paths, seconds=1.0, reversible=True, pos=(0,0)):
+    n = len(paths)
+    if n < 3 or seconds <= 0:
+        return paths
+    import numpy as np
+    deadline = time.time() + seconds
+    eps = 1e-9
+
+    start0 = np.array([path[0] for path in paths], dtype=float)
+    end0 = np.array([path[-1] for path in paths], dtype=float)
+    home = np.array(pos, dtype=float)
+    order = np.arange(n)
+    flip = np.zeros(n, dtype=bool)
+
+    def endpoints():
+        s = np.where(flip[:,None], end0[order], start0[order])
+        e = np.where(flip[:,None], start0[order], end0[order])
+        return s, e
+
+    def two_opt_sweep():
+        nonlocal order, flip
+        improved = False
+        s, e = endpoints()
+        for i in range(n):
+            if time.time() > deadline: break
+            prev = home if i == 0 else e[i-1]
+            nxt = np.vstack((s[i+1:], np.full((1,2), np.nan)))   # s[j+1] for j in i..n-1
+            old = _travel(prev, s[i]) + _travel(e[i:], nxt)
+            new = _travel(prev, e[i:]) + _travel(s[i], nxt)
+            k = int(np.argmin(new-old))
+            if new[k]-old[k] < -eps:
+                j = i+k
+                order[i:j+1] = order[i:j+1][::-1]
+                flip[i:j+1] = ~flip[i:j+1][::-1]
+                s[i:j+1], e[i:j+1] = e[i:j+1][::-1].copy(), s[i:j+1][::-1].copy()
+                improved = True
+        return improved
+
+    def or_opt_sweep():
+        nonlocal order, flip
+        improved = False
+        for seglen in (1, 2, 3):
+            s, e = endpoints()
+            i = 0
+            while i+seglen <= n:
+                if time.time() > deadline: return improved
+                S = s[i]
+                E = e[i+seglen-1]
+                prev = home if i == 0 else e[i-1]
+                nxt = s[i+seglen] if i+seglen < n else np.full(2, np.nan)
+                gain = _travel(prev, S) + _travel(E, nxt) - _travel(prev, nxt)
+                # insert after position k, for k in -1..n-1 (-1: right after home)
+                a = np.vstack((home, e))
+                b = np.vstack((s, np.full((1,2), np.nan)))
+                ab = _travel(a, b)
+                cost = _travel(a, S) + _travel(E, b) - ab
+                rev = None
+                if reversible:
+                    rev = _travel(a, E) + _travel(S, b) - ab
+                    use_rev = rev < cost
+                    cost = np.where(use_rev, rev, cost)
+                cost[i:i+seglen+1] = np.inf             # k in i-1..i+seglen-1: stays in place
+                k = int(np.argmin(cost))
+                if cost[k]-gain < -eps:
+                    seg = slice(i, i+seglen)
+                    seg_order = order[seg]
+                    seg_flip = flip[seg]
+                    if rev is not None and use_rev[k]:
+                        seg_order = seg_order[::-1]
+                        seg_flip = ~seg_flip[::-1]
+                    keep = np.r_[0:i, i+seglen:n]
+                    at = k if k < i else k-seglen         # position of k after removal
+                    order = np.concatenate((order[keep][:at], seg_order, order[keep][at:]))
+                    flip = np.concatenate((flip[keep][:at], seg_flip, flip[keep][at:]))
+                    s, e = endpoints()
+                    improved = True
+                i += 1
+        return improved
+
+    improved = True
+    while improved and time.time() < deadline:
+        improved = False
+        if reversible:
+            improved |= two_opt_sweep()
+        improved |= or_opt_sweep()
+
+    return [paths[o][::-1] if f else paths[o] for o,f in zip(order, flip)]
+
+
+# Joins paths that meet end to start into one path.
+# The end points are hashed into cells of size tolerance (exact coordinates
+# for tolerance 0). A path is followed by the first remaining path in list
+# order that starts (or, if reversible, ends) within tolerance of its end,
+# and preceded by one that ends (or starts) at its start, until nothing fits.
+# The chains are emitted in order of their first path.
+# Runs in O(n), apart from many paths meeting in a single point.
+def fuse(paths, tolerance=0.0, reversible=True):
+    tol_sq = tolerance*tolerance
+    used = [len(path) < 2 for path in paths]
+    heads = {}      # cell -> deque of indices of paths starting there
+    tails = {}      # cell -> deque of indices of paths ending there
+
+    if tolerance > 0:
+        def cell(p):
+            return (p[0]//tolerance, p[1]//tolerance)
+        def cells(p):
+            cx, cy = cell(p)
+            return [(cx+dx, cy+dy) for dx in (-1,0,1) for dy in (-1,0,1)]
+    else:
+        def cell(p):
+            return (p[0], p[1])
+        def cells(p):
+            return [cell(p)]
+
+    for i,path in enumerate(paths):
+        if not used[i]:
+            heads.setdefault(cell(path[0]), deque()).append(i)
+            tails.setdefault(cell(path[-1]), deque()).append(i)
+
+    # first unused path in index with its end (0 or -1) near p, or None
+    def first(index, p, near, end):
+        best = None
+        for c in near:
+            queue = index.get(c)
+            if not queue:
+                continue
+            while queue and used[queue[0]]:
+                queue.popleft()
+            for i in queue:
+                if best is not None and i >= best:
+                    break
+                if not used[i] and dist_sq(p, paths[i][end]) <= tol_sq:
+                    best = i
+                    break
+        return best
+
+    # next path after p, as (index, reversed)
+    def follow(p, forward, backward):
+        near = cells(p)
+        i = first(forward, p, near, 0 if forward is heads else -1)
+        if reversible:
+            j = first(backward, p, near, 0 if backward is heads else -1)
+            if j is not None and (i is None or j < i):
+                return j, True
+        return i, False
+
+    result = []
+    for i,path in enumerate(paths):
+        if used[i]:
+            if len(path) < 2:
+                result.append(path)
+            continue
+        used[i] = True
+        chain = list(path)
+        while True:
+            j, rev = follow(chain[-1], heads, tails)
+            if j is None:
+                break
+            used[j] = True
+            chain.extend(paths[j][-2::-1] if rev else paths[j][1:])
+        prefix = []
+        head = chain[0]
+        while True:
+            j, rev = follow(head, tails, heads)
+            if j is None:
+                break
+            used[j] = True
+            part = paths[j][::-1] if rev else paths[j]
+            prefix.append(part[:-1])
+            head = part[0]
+        if prefix:
+            chain = [p for part in reversed(prefix) for p in part] + chain
+        result.append(chain)
+    return result
+
+
+# Joins each path to its predecessor in the list if it starts within
+# tolerance of the end of the predecessor. Paths are neither reordered nor
+# reversed, for strategies where the order is the point: z-order, matfree.
+def fuse_adjacent(paths, tolerance=0.0):
+    tol_sq = tolerance*tolerance
+    result = []
+    for path in paths:
+        if result and len(path) and len(result[-1]) and dist_sq(path[0], result[-1][-1]) <= tol_sq:
+            result[-1].extend(path[1:])
+        else:
+            result.append(list(path))
+    return result
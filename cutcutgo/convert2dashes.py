@@ -21,53 +21,30 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 #
 """
-This extension converts a path into a dashed line using 'stroke-dasharray'
-It is a modification of the file addnodes.py
+Read the dash pattern of a dashed stroke from 'stroke-dasharray' and
+'stroke-dashoffset', for cutting it as separate dashes, perforated.
+The dashes are made from the flattened path by Geometry.dash_paths().
 """
-from inkex import bezier, CubicSuperPath
+import re
 
 
-def convert2dash(node):
-        dashes = []
-        offset = 0
-        style = node.style
-        if 'stroke-dasharray' in style:
-            if style['stroke-dasharray'].find(',') > 0:
-                dashes = [float(dash) for dash in style['stroke-dasharray'].split(',')]
-        if 'stroke-dashoffset' in style:
-            offset = style['stroke-dashoffset']
-        if not dashes:
-            return
-        new = []
-        for sub in node.path.to_superpath():
-            idash = 0
-            dash = dashes[0]
-            length = float(offset)
-            while dash < length:
-                length = length - dash
-                idash = (idash + 1) % len(dashes)
-                dash = dashes[idash]
-            new.append([sub[0][:]])
-            i = 1
-            while i < len(sub):
-                dash = dash - length
-                length = bezier.cspseglength(new[-1][-1], sub[i])
-                while dash < length:
-                    new[-1][-1], nxt, sub[i] = \
-                        bezier.cspbezsplitatlength(new[-1][-1], sub[i], dash/length)
-                    if idash % 2:           # create a gap
-                        new.append([nxt[:]])
-                    else:                   # splice the curve
-                        new[-1].append(nxt[:])
-                    length = length - dash
-                    idash = (idash + 1) % len(dashes)
-                    dash = dashes[idash]
-                if idash % 2:
-                    new.append([sub[i]])
-                else:
-                    new[-1].append(sub[i])
-                i += 1
-        style.pop('stroke-dasharray')
-        node.pop('sodipodi:type')
-        node.path = CubicSuperPath(new)
-        node.style = style
+def _lengths(value):
+    return [float(v) for v in re.split(r'[\s,]+', value.strip()) if v]
+
+
+def dash_pattern(style, scale=1.0):
+    """
+    Return the dash and gap lengths and the offset of a style, multiplied
+    by scale, or None when the stroke is not dashed.
+    """
+    dasharray = str(style.get('stroke-dasharray', 'none')).replace('px', '')
+    if dasharray.strip() in ('', 'none'):
+        return None
+    try:
+        dashes = _lengths(dasharray)
+        offset = float(str(style.get('stroke-dashoffset', 0)).replace('px', ''))
+    except ValueError:
+        return None
+    if not dashes or min(dashes) < 0 or not sum(dashes) > 0:
+        return None
+    return [dash*scale for dash in dashes], offset*scale
@@ -1,33 +1,22 @@
 #!/usr/bin/env python3
 # this script reads inkscape dumpfiles and shows the plotter path
 
-import sys
-try:
-    import matplotlib.pyplot as plt
-    from matplotlib.widgets import Button
-except:
-    plt = None
+import sys, itertools
 from pathlib import Path
 
 
-# From https://stackoverflow.com/questions/24852345/hsv-to-rgb-color-conversion
-def hsv_to_rgb(h, s, v):
-    if s == 0.0: return (v, v, v)
-    i = int(h*6.)
-    f = (h*6.)-i; p,q,t = v*(1.-s), v*(1.-s*f), v*(1.-s*(1.-f)); i%=6
-    if i == 0: return (v, t, p)
-    if i == 1: return (q, v, p)
-    if i == 2: return (p, v, t)
-    if i == 3: return (p, q, v)
-    if i == 4: return (t, p, v)
-    if i == 5: return (v, p, q)
-
-def show_plotcuts(cuts, buttons=False, extraText=None):
+def show_plotcuts(cuts, buttons=False, extraText=None, travel=True, max_segments=200000):
     """
         Show a graphical representation of the cut paths in (the argument) cuts,
         and block until the display window has been closed.
 
         buttons: display Cut/Cancel buttons
+        travel: show the moves between the cuts
+        max_segments: leave out points of the cuts to draw no more segments
+          than this, for very large jobs
+
+        All cuts are drawn as one LineCollection, coloured from green to red
+        in cut order, with one arrowhead at the end of each.
 
         Returns > 0 on failure
         return value:
@@ -35,28 +24,78 @@ def show_plotcuts(cuts, buttons=False, extraText=None):
           2: matplotlib missing
           3: cut path empty
     """
+    # matplotlib takes long to import, only load it for showing
+    try:
+        import numpy as np
+        import matplotlib.pyplot as plt
+        from matplotlib.widgets import Button
+        from matplotlib.collections import LineCollection, PathCollection
+        from matplotlib.path import Path as MPath
+        from matplotlib.colors import hsv_to_rgb
+    except:
+        plt = None
     if plt is None:
         print("Install matplotlib for python to allow graphical display of cuts",
               file=sys.stderr)
         return 2
-    if cuts == []:
+    lens = np.array([len(xy) for xy in cuts], dtype=int).reshape(-1)
+    if not lens.sum():
         print("Empty cut path", file=sys.stderr)
         return 3
-    xy = sum(cuts, [])
-    least = min(min(p[0],p[1]) for p in xy)
-    greatest = max(max(p[0],p[1]) for p in xy)
+    p = np.fromiter(itertools.chain.from_iterable(pt[:2] for xy in cuts for pt in xy),
+                    dtype=float).reshape(-1, 2)
+    first = np.cumsum(lens) - lens
+    last = first + lens - 1
+    cut = np.flatnonzero(lens)
+    least, greatest = p.min(), p.max()
     scale = greatest - least
-    plt.figure("Sendto Silhouette - Preview")
-    plt.plot(*zip(*sum(cuts, [])), color="lightsteelblue")
-    plt.plot(xy[0][0],xy[0][1],'go')
-    plt.plot(xy[-1][0],xy[-1][1],'ro')
-    ncuts = len(cuts)
+
+    # level of detail: keep every k-th point of a cut, and its ends
+    k = max(1, -(-(len(p) - len(cut)) // max_segments))
+    keep = np.ones(len(p), dtype=bool)
+    if k > 1:
+        keep = (np.arange(len(p)) - np.repeat(first, lens)) % k == 0
+        keep[last[cut]] = True
+
+    # all cuts as polylines, broken by NaN, in bands of one colour each:
+    # every cut its own colour for up to 256 cuts
+    ends = np.cumsum(keep)[last[cut]]
+    q = np.insert(p[keep], ends, np.nan, axis=0)
+    starts = np.concatenate(([0], ends[:-1] + np.arange(1, len(cut))))
+    nbands = min(len(cut), 256)
+    band = -(-np.arange(nbands)*len(cut) // nbands)
+    ncuts = len(lens)
     maxhue = 0.33
-    for i, xy in enumerate(cuts):
-        plt.plot(*zip(*xy), color=hsv_to_rgb(maxhue*(1.0-i/ncuts),0.9,0.7))
-        plt.arrow(xy[-2][0], xy[-2][1], xy[-1][0]-xy[-2][0], xy[-1][1]-xy[-2][1],
-                  color="lightblue", length_includes_head=True,
-                  head_width=min(3,scale/50))
+    hsv = np.empty((nbands, 3))
+    hsv[:,0] = maxhue*(1.0 - cut[band]/ncuts)
+    hsv[:,1:] = (0.9, 0.7)
+
+    plt.figure("Sendto Silhouette - Preview")
+    ax = plt.gca()
+    if travel:
+        moves = np.full((len(cut)-1, 3, 2), np.nan)
+        moves[:,0] = p[last[cut[:-1]]]
+        moves[:,1] = p[first[cut[1:]]]
+        ax.add_collection(LineCollection([moves.reshape(-1, 2)], colors="lightsteelblue"))
+    ax.add_collection(LineCollection(np.split(q, starts[band[1:]]), colors=hsv_to_rgb(hsv)))
+    plt.plot(p[0,0], p[0,1], 'go')
+    plt.plot(p[-1,0], p[-1,1], 'ro')
+
+    # arrowheads on the last segment of each cut, as one compound path
+    tip, tail = p[last[cut]], p[np.maximum(last[cut] - 1, first[cut])]
+    d = tip - tail
+    length = np.hypot(d[:,0], d[:,1])
+    tip, d, length = tip[length > 0], d[length > 0], length[length > 0]
+    head = min(3, scale/50)
+    u = d * (1.5*head / length)[:,None]
+    n = u[:,::-1] * (1, -1) / 3
+    heads = np.stack((tip, tip - u + n, tip - u - n, tip), axis=1).reshape(-1, 2)
+    codes = np.tile([MPath.MOVETO, MPath.LINETO, MPath.LINETO, MPath.CLOSEPOLY], len(tip))
+    if len(tip):
+        ax.add_collection(PathCollection([MPath(heads, codes)], facecolors="lightblue",
+                                         edgecolors="none", transform=ax.transData), autolim=False)
+
+    ax.autoscale_view()
     plt.axis([plt.axis()[0], plt.axis()[1], plt.axis()[3], plt.axis()[2]])
     plt.gca().set_aspect('equal')
     class Response:
@@ -81,6 +120,20 @@ def show_plotcuts(cuts, buttons=False, extraText=None):
 
     return response.returnvalue
 
+def read_cutpaths(filename):
+    """
+        Read the cut paths from a dump file, or a log file written with
+        log_paths on. Returns None if there are none.
+    """
+    with open(filename, 'rt') as file:
+        triggered = False
+        for line in file:
+            if triggered and line[0] != '#':
+                return eval(line)
+            if '# driver version' in line:
+                triggered = True
+    return None
+
 if __name__ == "__main__":
     # The below is not correct under Windows; please help to correct.
     # I am not sure if it is correct under MacOS.
@@ -104,18 +157,10 @@ if __name__ == "__main__":
         sys.exit("Cannot find file with cut paths to display.\nUsage:\n  read_dump.py FILENAME_OF_LOG_OR_DUMP")
 
     print("Reading cut paths from:", filename)
-    cutpaths = ''
-    triggered = False
-    with open(filename, 'rt') as file:
-        for line in file:
-            if triggered and line[0] != '#':
-                cutpaths = line
-                break
-            if '# driver version' in line:
-                triggered = True
+    cutpaths = read_cutpaths(filename)
 
-    if not cutpaths:
+    if cutpaths is None:
         sys.exit("Cannot find any cut paths in " + filename + ".\n  Make sure it is an inkscape_silhouette dump or log file with log_paths on.")
 
-    retval = show_plotcuts(eval(cutpaths))
+    retval = show_plotcuts(cutpaths)
     sys.exit(retval)
@@ -0,0 +1,51 @@
+#! /usr/bin/python3
+#
+# Benchmark the CricutMaker serial sender against the simulated GRBL device.
+# No hardware needed. Reports the simulated job time, and the host CPU time
+# spent in the sender.
+#
+# Example:
+#   python3 misc/bench_serial.py --points 20000 --feed 100000
+
+import sys, time, math, random, argparse, io
+
+sys.path.extend(['..','.'])	# make it callable from top or misc directory.
+from cutcutgo.Cutcutgo import CricutMaker
+from cutcutgo.FakeGrbl import FakeGrblSerial
+
+ArgParser = argparse.ArgumentParser(description='Benchmark the serial sender with a simulated GRBL device.')
+ArgParser.add_argument('-n', '--points', type=int, default=10000, help="Number of points in the test job")
+ArgParser.add_argument('-p', '--paths', type=int, default=100, help="Number of paths in the test job")
+ArgParser.add_argument('-b', '--baudrate', type=int, default=115200, help="Simulated baud rate")
+ArgParser.add_argument('-l', '--latency', type=float, default=0.0005, help="Simulated reply latency [s]")
+ArgParser.add_argument('-f', '--feed', type=float, default=None, help="Override all feeds [mm/min]. Default: use the F words")
+ArgParser.add_argument('-s', '--seed', type=int, default=1, help="Random seed for the test job")
+args = ArgParser.parse_args()
+
+def test_job(npoints, npaths):
+  """Circles of small segments, like subdiv() produces for curves."""
+  random.seed(args.seed)
+  per_path = max(2, npoints // npaths)
+  job = []
+  for i in range(npaths):
+    cx, cy, r = random.uniform(20, 180), random.uniform(20, 270), random.uniform(2, 15)
+    job.append([(cx + r*math.cos(2*math.pi*j/(per_path-1)), cy + r*math.sin(2*math.pi*j/(per_path-1)))
+                for j in range(per_path)])
+  return job
+
+job = test_job(args.points, args.paths)
+
+for streaming in (False, True):
+  fake = FakeGrblSerial(baudrate=args.baudrate, ok_latency=args.latency, feed_override=args.feed)
+  dev = CricutMaker(log=io.StringIO(), dev=fake, streaming=streaming, progress_cb=lambda *a: None)
+  dev.setup(toolholder=1)
+  t0 = fake.elapsed()
+  cpu = time.process_time()
+  dev.plot(pathlist=job, offset=(0, 0))
+  cpu = time.process_time() - cpu
+  sent = fake.elapsed() - t0
+  fake.wait_idle()
+  st = fake.stats()
+  print("%-9s sent in %8.3fs, job done in %8.3fs, host cpu %6.3fs, %d lines, %d bytes, errors %d, overflows %d, peak rx %d" % (
+    'streaming' if streaming else 'ping-pong', sent, fake.elapsed() - t0, cpu,
+    st['lines'], st['bytes'], st['errors'], st['overflows'], st['peak_rx']))
@@ -0,0 +1,104 @@
+#! /usr/bin/python3
+#
+# Measure the cold start of sendto_cricut.py, as Inkscape runs it: importing
+# the extension, and a complete dry run send of a small document with the
+# preview off. Each is run in a fresh python with -X importtime; the wall
+# time of the best run and the slowest imports are reported.
+#
+# Fails (exit code 1) if the send takes longer than the budget, or imports
+# one of the forbidden modules, which should only be loaded when used.
+#
+# Example:
+#   python3 misc/bench_startup.py --budget 1.0 --record startup.jsonl
+
+import sys, os, re, json, time, argparse, subprocess, tempfile
+
+TOP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEST_SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm" viewBox="0 0 100 100">
+  <rect x="10" y="10" width="30" height="20" fill="none" stroke="black"/>
+  <circle cx="70" cy="30" r="15" fill="none" stroke="black"/>
+  <path d="M 10,60 C 30,40 50,90 90,60" fill="none" stroke="black"/>
+</svg>
+"""
+
+_importtime_re = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_importtime(stderr):
+  """Return [(module, self_us, cumulative_us, depth)] from -X importtime output."""
+  imports = []
+  for line in stderr.splitlines():
+    m = _importtime_re.match(line)
+    if m:
+      imports.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+  return imports
+
+
+def run(args, runs):
+  """Best wall time of runs, and the imports of that run."""
+  best = None
+  for i in range(runs):
+    t0 = time.perf_counter()
+    p = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=TOP,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+      errors = [line for line in p.stderr.splitlines() if not line.startswith('import time:')]
+      sys.exit("%s failed:\n%s" % (' '.join(args), '\n'.join(errors[-10:])))
+    if best is None or wall < best[0]:
+      best = (wall, parse_importtime(p.stderr))
+  return best
+
+
+def report(name, wall, imports, top):
+  total = sum(cum for mod, own, cum, depth in imports if depth == 0)
+  print("%-8s wall %6.3fs, imports %6.3fs in %d modules" % (name, wall, total / 1e6, len(imports)))
+  for mod, own, cum, depth in sorted((i for i in imports if i[3] == 0), key=lambda i: -i[2])[:top]:
+    print("           %6.3fs  %s" % (cum / 1e6, mod))
+  return total
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Measure the cold start of sendto_cricut.py.')
+  parser.add_argument('-b', '--budget', type=float, default=1.5, help="Maximum wall time of the send [s]")
+  parser.add_argument('-f', '--forbid', action='append', default=None,
+                      help="Module that a send without preview must not import, may be repeated. Default: matplotlib")
+  parser.add_argument('-n', '--runs', type=int, default=3, help="Runs of each measurement, the best is reported")
+  parser.add_argument('-t', '--top', type=int, default=8, help="Number of slowest imports to list")
+  parser.add_argument('-r', '--record', default=None, help="Append the results as a JSON line to this file")
+  args = parser.parse_args()
+  forbid = args.forbid or ['matplotlib']
+
+  with tempfile.TemporaryDirectory() as tmp:
+    svg = os.path.join(tmp, 'test.svg')
+    with open(svg, 'w') as f:
+      f.write(TEST_SVG)
+    results = {}
+    results['import'] = run(['-c', 'import sys; sys.argv = ["sendto_cricut.py"]; import sendto_cricut'], args.runs)
+    results['send'] = run(['sendto_cricut.py', '--dry_run=true', '--preview=false', '--tool=pen',
+                           '--cache_size=0', '--journal=', '--logfile=' + os.path.join(tmp, 'log'),
+                           svg], args.runs)
+
+  record = dict(time=time.time(), python=sys.version.split()[0], budget=args.budget)
+  for name, (wall, imports) in results.items():
+    total = report(name, wall, imports, args.top)
+    record[name] = dict(wall=wall, imports=total / 1e6)
+
+  failed = False
+  wall, imports = results['send']
+  if wall > args.budget:
+    print("send takes %.3fs, over the budget of %.3fs" % (wall, args.budget))
+    failed = True
+  loaded = set(mod.split('.')[0] for mod, own, cum, depth in imports)
+  for mod in forbid:
+    if mod in loaded:
+      print("send imports %s, it should only be loaded when used" % mod)
+      failed = True
+  record['failed'] = failed
+
+  if args.record:
+    with open(args.record, 'a') as f:
+      f.write(json.dumps(record) + '\n')
+  sys.exit(1 if failed else 0)
@@ -0,0 +1,75 @@
+#! /usr/bin/python3
+#
+# Cut several sheets on all attached cutters at once.
+# Each sheet is a dump file, or a log file written by the extension with
+# "Include final cut paths in log" on. The sheets are balanced over the
+# cutters by estimated cut time.
+#
+# Example:
+#   python3 misc/cricut_farm.py sheet1.dump sheet2.dump sheet3.dump
+#   python3 misc/cricut_farm.py --fake 2 misc/dump/*.dump
+
+import sys, argparse
+
+sys.path.extend(['..','.'])	# make it callable from top or misc directory.
+from cutcutgo.Cutcutgo import CricutMaker
+from cutcutgo.Farm import CutterFarm
+from cutcutgo.read_dump import read_cutpaths
+
+ArgParser = argparse.ArgumentParser(description='Cut sheets on all attached cutters, balanced by estimated cut time.')
+ArgParser.add_argument('sheets', nargs='+', help="Dump or log files with the cut paths, one per sheet")
+ArgParser.add_argument('-m', '--media', type=int, default=1, help="Media profile")
+ArgParser.add_argument('-t', '--toolholder', type=int, default=1, help="Toolholder")
+ArgParser.add_argument('-x', '--x-off', type=float, default=0.0, help="X-Offset [mm]")
+ArgParser.add_argument('-y', '--y-off', type=float, default=0.0, help="Y-Offset [mm]")
+ArgParser.add_argument('-p', '--port', action='append', help="Use only this serial port, may be repeated")
+ArgParser.add_argument('-s', '--streaming', action='store_true', help="Stream commands with GRBL character counting")
+ArgParser.add_argument('-j', '--journal', default=None, help="Journal path prefix, for resuming the jobs of a cutter")
+ArgParser.add_argument('-w', '--wait', action='store_true', help="Wait for Enter before each sheet")
+ArgParser.add_argument('-n', '--dry-run', action='store_true', help="Only print the plan")
+ArgParser.add_argument('--fake', type=int, default=0, help="Use this many simulated cutters instead of real ones")
+args = ArgParser.parse_args()
+
+jobs = []
+for filename in args.sheets:
+  cut = read_cutpaths(filename)
+  if cut is None:
+    sys.exit("Cannot find any cut paths in " + filename)
+  jobs.append(dict(pathlist=cut, offset=(args.x_off, args.y_off)))
+
+if args.fake:
+  from cutcutgo.FakeGrbl import FakeGrblSerial
+  cutters = [CricutMaker(dev=FakeGrblSerial(port='fake-%d' % i), streaming=args.streaming,
+                         progress_cb=lambda *a: None)
+             for i in range(args.fake)]
+  farm = CutterFarm(cutters=cutters)
+else:
+  farm = CutterFarm(ports=args.port, streaming=args.streaming, journal=args.journal,
+                    status_poll=0.25, progress_cb=lambda *a: None)
+farm.setup(media=args.media, toolholder=args.toolholder)
+
+plan, load = farm.schedule(jobs)
+for i, cutter in enumerate(farm.cutters):
+  print("cutter %d (%s): %s, about %.0f min" % (i, getattr(cutter.dev, 'port', None),
+        ", ".join(args.sheets[n] for n in plan[i]) or "idle", load[i] / 60))
+if args.dry_run:
+  sys.exit(0)
+
+def next_sheet(i, n):
+  input("cutter %d: load the sheet for %s, then press Enter" % (i, args.sheets[n]))
+
+# simulated cutters run on a virtual clock, that waiting for idle would not advance
+results = farm.run(jobs, next_sheet=next_sheet if args.wait else None, wait_done=not args.fake)
+farm.close()
+failed = 0
+for n, result in enumerate(results):
+  if result is None or 'error' in result:
+    failed += 1
+    result = result or dict(cutter=None, error='not cut')
+    if result['cutter'] is None:
+      print("%s: not cut: %s" % (args.sheets[n], result['error']))
+    else:
+      print("%s: cutter %d failed: %s" % (args.sheets[n], result['cutter'], result['error']))
+  else:
+    print("%s: done on cutter %d" % (args.sheets[n], result['cutter']))
+sys.exit(1 if failed else 0)
@@ -252,7 +252,7 @@ while True:
         del(doing['cmd_idx'])
         del(doing['name'])
       else:
-        doing['cmds'] = dev.plot_cmds(doing['data'], meta['bbox'], clock_margin, 0) # keep space for the clock
+        doing['cmds'] = list(dev.plot_cmds(doing['data'], meta['bbox'], clock_margin, 0)) # keep space for the clock
 
     if 'cmd_idx' in doing:
       doing['cmd_idx'] += 1
@@ -9,8 +9,6 @@ __version__ = "1.0"     # Keep in sync with sendto_silhouette.inx ca line 179
 __author__ = "Damien Cauquil <virtualabs@gmail.com>"
 
 import sys, os, time, math, operator
-import matplotlib.pyplot as plt
-import numpy as np
 
 # we sys.path.append() the directory where this script lives.
 sys.path.append(os.path.dirname(os.path.abspath(sys.argv[0])))
@@ -45,18 +43,18 @@ from inkex.extensions import EffectExtension
 from inkex import Boolean, Path, ShapeElement, PathElement, Rectangle, Circle, Ellipse, Line, Polyline, Polygon, Group, Use, TextElement, Image, BaseElement, SvgDocumentElement
 from inkex.transforms import Transform
 from inkex.units import convert_unit
-from inkex.bezier import subdiv
+from lxml import etree
 
 from gettext import gettext
 from optparse import SUPPRESS_HELP
 from tempfile import NamedTemporaryFile, gettempdir
 
-from cutcutgo.Cutcutgo import CricutMaker
-from cutcutgo.Strategy import MatFree
-from cutcutgo.convert2dashes import convert2dash
+from cutcutgo.Cutcutgo import CricutMaker, PathArray
+from cutcutgo.JobCache import JobCache, sources_hash
+from cutcutgo.convert2dashes import dash_pattern
 import cutcutgo.StrategyMinTraveling
 import cutcutgo.read_dump
-from cutcutgo.Geometry import dist_sq, XY_a
+from cutcutgo.Geometry import dist_sq, XY_a, path_serifs, flatten_superpath, dash_paths, simplify_paths
 
 # Temporary Monkey Backport Patches to support functions that exist only after v1.2
 # TODO: If support for Inkscape v1.1 is dropped then this backport can be removed
@@ -82,6 +80,12 @@ if not hasattr(inkex, "__version__") or inkex.__version__[0:3] < "1.2":
 # Default Logfile Filename
 LOGFILE_DEFAULT_NAME = "silhouette.log"
 
+# Options that do not change the compiled job, left out of the job cache key.
+# dry_run changes the device, that cached jobs are checked for separately.
+CACHE_IGNORED_OPTIONS = ("input_file", "output", "active_tab", "version", "logfile", "append_logs",
+        "dump_paths", "preview", "dry_run", "wait_done", "cmdfile", "inc_queries", "streaming",
+        "journal", "resume", "daemon", "daemon_socket", "cache_size", "cache_dir", "cache_clear")
+
 # Autogenerated Registration Mark SVG IDs
 REGMARK_LAYERNAME = 'Regmarks'
 REGMARK_LAYER_ID = 'regmark'
@@ -150,6 +154,12 @@ class SendtoCricut(EffectExtension):
     def add_arguments(self, pars):
         pars.add_argument("--active-tab", dest = "active_tab",
                 help=SUPPRESS_HELP)
+        pars.add_argument("--daemon",
+                dest = "daemon", type = Boolean, default = False,
+                help="Queue the job at a running cutcutgo daemon (python3 -m cutcutgo.Daemon serve), if there is one")
+        pars.add_argument("--daemon_socket",
+                dest = "daemon_socket", default = "",
+                help="Unix socket of the daemon, empty for the default")
         pars.add_argument("-d", "--dashes",
                 dest = "dashes", type = Boolean, default = False,
                 help="convert paths with dashed strokes to separate subpaths for perforated cuts")
@@ -159,6 +169,18 @@ class SendtoCricut(EffectExtension):
         pars.add_argument("-b", "--bbox", "--bbox-only", "--bbox_only",
                 dest = "bboxonly", type = Boolean, default = False,
                 help="draft the objects bounding box instead of the objects")
+        pars.add_argument("--arc_tolerance",
+                dest = "arc_tolerance", type = float, default = 0.0,
+                help="Cut runs of points within this distance of a circular arc as one G2/G3 arc [mm], 0 to disable")
+        pars.add_argument("--cache_size",
+                dest = "cache_size", type = float, default = 50.0,
+                help="Size of the cache of compiled jobs [MB], repeated sends of the same document and options skip compiling. 0 to disable")
+        pars.add_argument("--cache_dir",
+                dest = "cache_dir", default = "",
+                help="Directory of the job cache, empty for the default")
+        pars.add_argument("--cache_clear",
+                dest = "cache_clear", type = Boolean, default = False,
+                help="Invalidate all cached jobs")
         pars.add_argument("-c", "--bladediameter",
                 dest = "bladediameter", type = float, default = 0.9,
                 help="[0..2.3] diameter of the used blade [mm], default = 0.9")
@@ -178,13 +200,28 @@ class SendtoCricut(EffectExtension):
                 dest = "strategy", default = "mintravel",
                 choices=("mintravel", "mintravelfull", "mintravelfwd", "matfree", "zorder"),
                 help="Cutting Strategy: mintravel, mintravelfull, mintravelfwd, matfree or zorder")
+        pars.add_argument("--optimize_seconds",
+                dest = "optimize_seconds", type = float, default = 0.0,
+                help="Time budget [s] for improving the mintravel order with 2-opt/Or-opt moves, 0 to disable")
         pars.add_argument("--orient_paths",
                 dest = "orient_paths", default = "natural",
                 choices=("natural","desy","ascy","desx","ascx"),
                 help="Pre-orient paths: natural (as in svg), or [des(cending)|asc(ending)][y|x]")
         pars.add_argument("--fuse_paths",
                 dest = "fuse_paths", type = Boolean, default = True,
-                help="Merge any path with predecessor that ends at its start.")
+                help="Merge paths that meet end to start. Min travel strategies chain them in any order, the others merge a path into its predecessor only.")
+        pars.add_argument("--fuse_tolerance",
+                dest = "fuse_tolerance", type = float, default = 0.01,
+                help="End points closer than this are fused [mm]")
+        pars.add_argument("--simplify",
+                dest = "simplify", type = Boolean, default = False,
+                help="Drop colinear points, points closer than the device resolution and, with a simplify tolerance, points this close to the simplified path.")
+        pars.add_argument("--simplify_tolerance",
+                dest = "simplify_tolerance", type = float, default = 0.01,
+                help="Points within this distance of the simplified path are dropped [mm], 0 for colinear points only")
+        pars.add_argument("--journal",
+                dest = "journal", default = "auto",
+                help="Record each job in this journal (.gcode and .json) while it is sent, so it can be resumed. 'auto' for one per cutter in the temporary directory, empty to disable")
         pars.add_argument("-l", "--sw_clipping",
                 dest = "sw_clipping", type = Boolean, default = True,
                 help="Enable software clipping")
@@ -217,7 +254,10 @@ class SendtoCricut(EffectExtension):
                 dest = "speed", type = int, default = 0,
                 help="[1..10], or 0 for media default")
         pars.add_argument("-S", "--smoothness", type = float,
-                dest="smoothness", default=.05, help="Smoothness of curves")
+                dest="smoothness", default=.05, help="Maximum deviation of the cut from curves [mm]")
+        pars.add_argument("--streaming",
+                dest = "streaming", type = Boolean, default = False,
+                help="Stream commands with GRBL character counting instead of waiting for each ok")
         pars.add_argument("-t", "--tool",
                 choices=("pen", "blade"), dest = "tool", default = None, help="Optimize for pen or knive")
         pars.add_argument("--preview",
@@ -233,6 +273,9 @@ class SendtoCricut(EffectExtension):
                 type = float, dest = "x_off", default = 0.0, help="X-Offset [mm]")
         pars.add_argument("-y", "--y-off", "--y_off",
                 type = float, dest = "y_off", default = 0.0, help="Y-Offset [mm]")
+        pars.add_argument("--resume",
+                dest = "resume", type = Boolean, default = False,
+                help="Continue the interrupted job in the journal instead of cutting the document")
         pars.add_argument("-R", "--regmark",
                 dest = "regmark", type = Boolean, default = False,
                 help="The document has registration marks.")
@@ -299,21 +342,23 @@ class SendtoCricut(EffectExtension):
                   file=sys.stderr)
 
 
-    def plotPath(self, path: Path):
+    def plotPath(self, path: Path, dashes=None):
         """
-        Plot the path after smoothing curves to straights
+        Plot the path after flattening curves to straights,
+        cut into dashes if a (pattern, offset) is given
         """
         # convert into a cubicsuperpath (list of beziers)...
         p = path.to_superpath()
 
         # p is now a list of lists of cubic beziers [control pt1, control pt2, endpoint]
         # where the start-point is the last point in the previous segment.
-        for sp in p:
-            # subdivide beziers into smooth curved parts
-            subdiv(sp, self.options.smoothness)
-            # extract path
-            if len(sp) > 1:
-                self.paths.append([tuple(csp[1]) for csp in sp])
+        # The path is in mm already, smoothness is the deviation allowed [mm].
+        lines = flatten_superpath(p, self.options.smoothness)
+        if dashes:
+            lines = dash_paths(lines, *dashes)
+        for points in lines:
+            if len(points) > 1:
+                self.paths.append(points)
 
 
     def recursivelyTraverseSvg(self, aNodeList,
@@ -393,12 +438,14 @@ class SendtoCricut(EffectExtension):
                 # convert element to path
                 node = node.to_path_element()
 
-                # apply dashed style
+                # dashed style, scaled from user units to mm
+                dashes = None
                 if self.options.dashes:
-                    convert2dash(node)
+                    dashes = dash_pattern(node.style,
+                            math.sqrt(abs(transform.a*transform.d - transform.b*transform.c)))
 
                 self.pathcount += 1
-                self.plotPath(node.path.transform(transform))
+                self.plotPath(node.path.transform(transform), dashes)
 
             elif isinstance(node, TextElement):
                 texts = []
@@ -513,19 +560,11 @@ class SendtoCricut(EffectExtension):
 
 
     def writeProgress(self, done, total, msg):
-        """Show the current progress"""
-        if "write_start_tstamp" not in self.__dict__:
-            self.write_start_tstamp = time.time()
-            self.device_buffer_perc = 0.0
+        """Show the current progress.
+           done only counts commands that left the device planner, so this
+           is the progress of the cut, not of the transfer."""
         perc = 100.*done/total
-        if time.time() - self.write_start_tstamp < 1.0:
-            self.device_buffer_perc = perc
-        buf = ""
-        if self.device_buffer_perc > 1.0:
-            buf = " (+%d%%)" % (self.device_buffer_perc+.5)
-        self.report("%d%%%s %s\r" % (perc-self.device_buffer_perc+.5,
-                                        buf, msg),
-                    'tty')
+        self.report("%d%% %s\r" % (perc+.5, msg), 'tty')
 
 
     @staticmethod
@@ -616,10 +655,6 @@ class SendtoCricut(EffectExtension):
         return cut
 
 
-    def unit_vector(self, vector):
-        """ Returns the unit vector of the vector.  """
-        return vector / np.linalg.norm(vector)
-
     def dedup_paths(self, paths:list) -> list:
         output = []
         for path in paths:
@@ -634,81 +669,83 @@ class SendtoCricut(EffectExtension):
     def path_add_serifs(self, path: list, blade_width: float = 0.9) -> list:
         """Add serifs to a path
         """
-        # Sanity check
-        if len(path) == 0:
-            return []
-
-        start_point = path[0]
-        output = [start_point]
-        for i in range(1, len(path) - 1):
-            mid_point = path[i]
-            end_point = path[i+1]
-            
-            # Compute the angle formed by these two segments
-            xa,ya = start_point
-            xb,yb = mid_point
-            xc,yc = end_point
-            v1 = self.unit_vector(((xb - xa), (yb - ya)))
-            v2 = self.unit_vector(((xc - xb), (yc - yb)))
-            a = np.arccos(np.clip(np.dot(v1, v2), -1.0, 1.0))
-            
-            # If our blade has to turn, add serif
-            if a > (math.pi/8.):
-                # overcut
-                d = v1 * (blade_width/2.0)
-                extra_point = [xb+d[0],yb+d[1]]
-                output.append(extra_point)
-
-                # rotate to turn the blade
-                theta = a
-                #print(theta, theta>=pi/2)
-                steps = abs(int(theta/(math.pi/20)))
-                for j in range(steps):
-                    if np.cross(v1, v2) < 0:
-                        rotmat = np.array([
-                            [math.cos(j*(math.pi/20)), math.sin(j*(math.pi/20))],
-                            [-math.sin(j*(math.pi/20)), math.cos(j*(math.pi/20))]
-                        ])
-                    else:
-                        rotmat = np.array([
-                            [math.cos(j*(math.pi/20)), -math.sin(j*(math.pi/20))],
-                            [math.sin(j*(math.pi/20)), math.cos(j*(math.pi/20))]
-                        ])
-                    dest_point = np.matmul(rotmat, d)
-                    output.append((dest_point[0]+xb, dest_point[1]+yb))
-                z = v2*(blade_width/2.0)
-                output.append((xb + z[0], yb+z[1]))
-            else:
-                output.append(mid_point)
-
-            start_point = mid_point
-        output.append(path[-1])
-
-        return output
+        return path_serifs(path, blade_width)
 
     def add_serifs(self, paths: list, blade_width:float=0.9) -> list:
         return list(map(lambda x: self.path_add_serifs(x, blade_width), paths))
 
 
-    def effect(self):
-        log_path = self.options.logfile or self.default_logfile_path
-        mode = "a" if self.options.append_logs else "w"
-        self.log = open(log_path, mode)
-        if self.tty:
-            self.log = teeFile(self.tty, self.log)
-
-        if self.options.cmdfile:
-            mode = "ab" if self.options.append_logs else "wb"
-            self.cmdfile = open(self.options.cmdfile, mode)
-
-        self.logEnvironment()
+    def plotCut(self, dev, cut, plot, cache, cache_key):
+        """Send the cut paths, and store the compiled job in the cache, for this device."""
+        # the points are converted once, for autocrop and the plot
+        paths = PathArray(cut)
+        if self.options.autocrop:
+            bbox = dev.measure(paths,
+                    mediawidth=convert_unit(self.svg.viewport_width, "mm"),
+                    mediaheight=convert_unit(self.svg.viewport_height, "mm"),
+                    margintop=0,
+                    marginleft=0)
+            if bbox["count"]:
+                self.report("autocrop left=%.1fmm top=%.1fmm" % (bbox["llx"], bbox["ury"]), 'log')
+                self.options.x_off -= bbox["llx"]
+                self.options.y_off -= bbox["ury"]
+                plot["offset"] = (self.options.x_off, self.options.y_off)
+
+        if cache is None:
+            return dev.plot(pathlist=paths, **plot)
+        # the commands go to the cache file while they are sent
+        record = cache.record(cache_key)
+        try:
+            bbox = dev.plot(pathlist=paths, record=record, **plot)
+        except BaseException:
+            record.abort()
+            raise
+        record.commit(dict(cut=cut, bbox=bbox["bbox"], device=repr(dev.output_key())))
+        return bbox
+
+    def submitToDaemon(self, client, setup, plot):
+        """Queue the job at the cutcutgo daemon, optionally wait for it."""
+        try:
+            job_id = client.submit(setup, plot, name=self.svg.name)
+            self.report("queued as job %d at the cutcutgo daemon" % job_id, 'log')
+            if self.options.wait_done:
+                job = client.wait(job_id)
+                if job["state"] == "failed":
+                    self.report("job %d failed: %s" % (job_id, job["error"]), 'error')
+                else:
+                    self.report("job %d %s" % (job_id, job["state"]), 'log')
+        except Exception as e:
+            self.report(e, 'error')
+        finally:
+            client.close()
 
-        # Registration Mark Selection/Calcuation
-        self.sync_regmark_settings()
+    def journalPath(self):
+        """The journal option for CricutMaker: a path, True for the device's own or None."""
+        if self.options.journal == "auto":
+            return True
+        return self.options.journal or None
 
-        # Init docTransform
-        self.initDocScale()
+    def openDevice(self):
+        """Connect to the cutter, report and return None on failure."""
+        try:
+            dev = CricutMaker(log=self.log, progress_cb=self.writeProgress,
+                                  cmdfile=self.cmdfile,
+                                  inc_queries=self.options.inc_queries,
+                                  dry_run=self.options.dry_run,
+                                  streaming=self.options.streaming,
+                                  status_poll=None if self.options.dry_run else 0.25,
+                                  journal=None if self.options.dry_run else self.journalPath(),
+                                  force_hardware=self.options.force_hardware)
+        except Exception as e:
+            self.report(e, 'error')
+            return None
+        state = dev.status()  # hint at loading paper, if not ready.
+        self.report("status=%s" % (state), 'log')
+        self.report("device version: '%s'" % dev.get_version(), 'log')
+        return dev
 
+    def buildCut(self):
+        """Traverse the document and turn it into the ordered list of cut paths."""
         # Build a list of paths for the document's graphical elements
         if self.options.ids:
             # Traverse the selected objects
@@ -718,19 +755,6 @@ class SendtoCricut(EffectExtension):
             # Traverse the entire document
             self.recursivelyTraverseSvg(self.document.getroot())
 
-        # Select tool and toolholder
-        # TODO: rework this section
-        self.pen=None
-        if self.options.tool == "pen":
-            self.options.toolholder = 0 # left tool holder
-            self.options.x_off = 40 # 40mm offset required for left tool holder
-            self.pen=True
-            self.autoblade=False
-        elif self.options.tool == "blade":
-            self.options.toolholder = 1 # right tool holder
-            self.pen=False
-            self.autoblade=True
-
         # Reorder paths (except in case of Z-order)
         if self.options.orient_paths != "natural":
             index = dict(x=0,y=1)[self.options.orient_paths[-1]]
@@ -739,6 +763,7 @@ class SendtoCricut(EffectExtension):
 
         # Optimize paths
         if self.options.strategy == "matfree":
+            from cutcutgo.Strategy import MatFree
             mf = MatFree("default", scale=1.0, pen=self.pen)
             mf.verbose = 0    # inkscape crashes whenever something appears in stdout.
             self.paths = mf.apply(self.paths)
@@ -749,27 +774,123 @@ class SendtoCricut(EffectExtension):
         elif self.options.strategy == "mintravelfwd":
             self.paths = cutcutgo.StrategyMinTraveling.sort(self.paths, entrycircular=True, reversible=False)
 
-        # Fuse paths
+        if self.options.strategy.startswith("mintravel") and self.options.optimize_seconds > 0:
+            self.paths = cutcutgo.StrategyMinTraveling.improve(self.paths,
+                    seconds=self.options.optimize_seconds,
+                    reversible=(self.options.strategy != "mintravelfwd"))
+
+        # Fuse paths: the min travel strategies chain them in any order, reversing
+        # them only where allowed; the others keep their order
         if self.paths and self.options.fuse_paths:
-            rest_paths = self.paths[1:]
-            self.paths = [self.paths[0]]
-            for path in rest_paths:
-                if path[0] == self.paths[-1][-1]:
-                    self.paths[-1].extend(path[1:])
-                else:
-                    self.paths.append(path)
+            npaths = len(self.paths)
+            if self.options.strategy.startswith("mintravel"):
+                self.paths = cutcutgo.StrategyMinTraveling.fuse(self.paths,
+                        tolerance=self.options.fuse_tolerance,
+                        reversible=self.options.strategy in ("mintravel", "mintravelfull"))
+            else:
+                self.paths = cutcutgo.StrategyMinTraveling.fuse_adjacent(self.paths,
+                        tolerance=self.options.fuse_tolerance)
+            self.report("fuse_paths: %d paths fused into %d, %d tool lifts saved" % (
+                    npaths, len(self.paths), npaths - len(self.paths)), 'log')
 
         # Handle multipass & overcut
         cut = self.multipassOvercut(self.paths, self.options.multipass, self.options.reversetoggle, self.options.overcut)
-        
+
+        # Drop vertices that would only add G1 lines, keeping sharp corners
+        if self.options.simplify:
+            npoints = sum(map(len, cut))
+            cut = simplify_paths(cut, tolerance=self.options.simplify_tolerance,
+                    min_length=0.05)    # the device resolution
+            self.report("simplify: %d of %d points removed" % (
+                    npoints - sum(map(len, cut)), npoints), 'log')
+
         # If autoblade is selected, add serifs
         if self.autoblade:
             cut = self.dedup_paths(cut)
             cut = self.add_serifs(cut)
 
+        return cut
+
+    def cacheKey(self):
+        """Hash of the document or the selection, the options and the driver sources."""
+        if self.options.ids:
+            nodes = [self.svg.selected[id] for id in self.options.ids]
+            # a selection is placed by its ancestors
+            transforms = [tuple(node.composed_transform().to_hexad())
+                          if isinstance(node, ShapeElement) else None for node in nodes]
+        else:
+            nodes = [self.document.getroot()]
+            transforms = []
+        page = [self.svg.get(name) for name in ("width", "height", "viewBox")]
+        regmarks = (self.reg_origin_X, self.reg_origin_Y, self.reg_width, self.reg_length)
+        options = sorted((k, v) for k, v in vars(self.options).items() if k not in CACHE_IGNORED_OPTIONS)
+        return JobCache.key(sources_hash(os.path.abspath(__file__)), options, page, regmarks,
+                            transforms, *[etree.tostring(node) for node in nodes])
+
+    def effect(self):
+        log_path = self.options.logfile or self.default_logfile_path
+        mode = "a" if self.options.append_logs else "w"
+        self.log = open(log_path, mode)
+        if self.tty:
+            self.log = teeFile(self.tty, self.log)
+
+        if self.options.cmdfile:
+            mode = "ab" if self.options.append_logs else "wb"
+            self.cmdfile = open(self.options.cmdfile, mode)
+
+        self.logEnvironment()
+
+        if self.options.resume:
+            dev = self.openDevice()
+            if dev is None:
+                return
+            try:
+                if dev.resume():
+                    self.report("resumed job from journal %s" % dev.journal, 'log')
+                else:
+                    self.report("No interrupted job to resume.", 'error')
+            finally:
+                dev.stop_status_polling()
+            return
+
+        # Registration Mark Selection/Calcuation
+        self.sync_regmark_settings()
+
+        # Init docTransform
+        self.initDocScale()
+
+        # Select tool and toolholder
+        # TODO: rework this section
+        self.pen=None
+        if self.options.tool == "pen":
+            self.options.toolholder = 0 # left tool holder
+            self.options.x_off = 40 # 40mm offset required for left tool holder
+            self.pen=True
+            self.autoblade=False
+        elif self.options.tool == "blade":
+            self.options.toolholder = 1 # right tool holder
+            self.pen=False
+            self.autoblade=True
+
+        # Skip straight to sending a job that was compiled before
+        if self.options.cache_clear:
+            JobCache(self.options.cache_dir or None).clear()
+            self.report("job cache cleared", 'log')
+        cache = cache_key = compiled = None
+        if self.options.cache_size > 0:
+            cache = JobCache(self.options.cache_dir or None, int(self.options.cache_size * 1024 * 1024))
+            cache_key = self.cacheKey()
+            compiled = cache.get(cache_key)
+        if compiled is not None:
+            cmds, cached = compiled
+            cut = cached["cut"]
+            self.report("job cache hit: %d commands, for %s" % (len(cmds), cached.get("device")), 'log')
+        else:
+            cut = self.buildCut()
+
         if self.options.dump_paths:
             pointcount = 0
-            for path in self.paths:
+            for path in cut:
                 pointcount += len(path)
             self.report(f"Logging {len(cut)} cut paths containing "
                         f"{pointcount} points:", 'log')
@@ -792,20 +913,7 @@ class SendtoCricut(EffectExtension):
         if self.options.depth == -1:
             self.options.depth = None
 
-        try:
-            dev = CricutMaker(log=self.log, progress_cb=self.writeProgress,
-                                  cmdfile=self.cmdfile,
-                                  inc_queries=self.options.inc_queries,
-                                  dry_run=self.options.dry_run,
-                                  force_hardware=self.options.force_hardware)
-        except Exception as e:
-            self.report(e, 'error')
-            return
-        state = dev.status()  # hint at loading paper, if not ready.
-        self.report("status=%s" % (state), 'log')
-        self.report("device version: '%s'" % dev.get_version(), 'log')
-
-        dev.setup(media=int(self.options.media, 10),
+        setup = dict(media=int(self.options.media, 10),
                 pen=self.pen,
                 toolholder=self.options.toolholder,
                 cuttingmat=None,
@@ -815,35 +923,11 @@ class SendtoCricut(EffectExtension):
                 autoblade=self.autoblade,
                 depth=self.options.depth,
                 sw_clipping=self.options.sw_clipping,
+                arc_tolerance=self.options.arc_tolerance,
                 bladediameter=self.options.bladediameter,
                 pressure=self.options.pressure,
                 speed=self.options.speed)
-
-        if self.options.autocrop:
-            # this takes much longer, if we have a complext drawing
-            bbox = dev.plot(pathlist=cut,
-                    mediawidth=convert_unit(self.svg.viewport_width, "mm"),
-                    mediaheight=convert_unit(self.svg.viewport_height, "mm"),
-                    margintop=0,
-                    marginleft=0,
-                    bboxonly=None,         # only return the bbox, do not draw it.
-                    endposition="start",
-                    regmark=self.options.regmark,
-                    regsearch=self.options.regsearch,
-                    regwidth=self.reg_width,
-                    reglength=self.reg_length,
-                    regoriginx=self.reg_origin_X,
-                    regoriginy=self.reg_origin_Y)
-
-            if len(bbox["bbox"].keys()):
-                    self.report(
-                        "autocrop left=%.1fmm top=%.1fmm" % (
-                            bbox["bbox"]["llx"]*bbox["unit"],
-                            bbox["bbox"]["ury"]*bbox["unit"]), 'log')
-                    self.options.x_off -= bbox["bbox"]["llx"]*bbox["unit"]
-                    self.options.y_off -= bbox["bbox"]["ury"]*bbox["unit"]
-
-        bbox = dev.plot(pathlist=cut,
+        plot = dict(
             mediawidth=convert_unit(self.svg.viewport_width, "mm"),
             mediaheight=convert_unit(self.svg.viewport_height, "mm"),
             offset=(self.options.x_off, self.options.y_off),
@@ -856,6 +940,31 @@ class SendtoCricut(EffectExtension):
             reglength=self.reg_length,
             regoriginx=self.reg_origin_X,
             regoriginy=self.reg_origin_Y)
+
+        if self.options.daemon:
+            from cutcutgo.Daemon import DaemonClient
+            client = DaemonClient.connect(self.options.daemon_socket or None)
+            if client is not None:
+                self.submitToDaemon(client, setup, dict(plot, pathlist=cut, autocrop=self.options.autocrop))
+                return
+            self.report("No cutcutgo daemon running, sending directly.", 'log')
+
+        dev = self.openDevice()
+        if dev is None:
+            return
+
+        dev.setup(**setup)
+
+        # the commands are clipped to the media of the device they were compiled for
+        if compiled is not None and cached.get("device") != repr(dev.output_key()):
+            self.report("cached job was compiled for another device, compiling it again", 'log')
+            compiled = None
+        if compiled is not None:
+            bbox = dev.plot_compiled(cmds, cached["bbox"])
+        else:
+            bbox = self.plotCut(dev, cut, plot, cache, cache_key)
+        # status() waits for the next status report, no sleeps needed
+        state = dev.status()
         if len(bbox["bbox"].keys()) == 0:
             self.report("empty page?", 'error')
         else:
@@ -866,31 +975,16 @@ class SendtoCricut(EffectExtension):
                         bbox["bbox"]["lly"]*bbox["unit"],
                         bbox["bbox"]["count"]))
             self.report("", 'tty')
-            state = dev.status()
-            write_duration = time.time() - self.write_start_tstamp
-            # we took write_duration seconds for actualy cutting
-            # 100-device_buffer_perc percent of all data.
-            # Thus we can compute the average write speed like this:
-            if write_duration > 1.0:
-                percent_per_sec = (100.0-self.device_buffer_perc) / write_duration
-            else:
-                percent_per_sec = 1000.     # unreliable data
-
-            wait_sec = 1
-            if percent_per_sec > 1:   # prevent overflow if device_buffer_perc is almost 100
-                while (percent_per_sec*wait_sec < 1.6):   # max 60 dots
-                    wait_sec *= 2
-            dots = "."
             while self.options.wait_done and state == "moving":
-                time.sleep(wait_sec)
-                self.device_buffer_perc -= wait_sec * percent_per_sec
-                if self.device_buffer_perc < 0.0:
-                    self.device_buffer_perc = 0.0
-                self.writeProgress(1, 1, dots)
-                dots += "."
+                machine = dev.machine_state()
+                if machine is not None and machine["mpos"] is not None:
+                    queued = ""
+                    if machine["planner_free"] is not None:
+                        queued = ", %d moves queued" % (dev.planner_size - machine["planner_free"])
+                    self.report("at (%.1f, %.1f)mm%s      \r" % (
+                        machine["mpos"][0], machine["mpos"][1], queued), 'tty')
                 state = dev.status()
-            self.device_buffer_perc = 0.0
-            self.writeProgress(1, 1, dots)
+        dev.stop_status_polling()
         self.report("\nstatus=%s" % (state), 'log')
 
 
@@ -0,0 +1,90 @@
+"""G2/G3 arcs sent by plot() stay within arc_tolerance of the drawn polyline."""
+import io
+import math
+import re
+
+import numpy as np
+import pytest
+
+from cutcutgo.Cutcutgo import CricutMaker
+from cutcutgo.FakeGrbl import FakeGrblSerial
+from cutcutgo.Geometry import fit_arcs
+
+WORD = re.compile(rb'([A-Z])([-+]?[0-9]*\.?[0-9]*)')
+RESOLUTION = 0.05
+
+
+def cut_samples(cmds, step=0.01):
+    """Points every step [mm] along the cutting moves of cmds, and the number of arcs."""
+    mode = None
+    pos = [None, None, 0.0]
+    out = []
+    arcs = 0
+    for cmd in cmds:
+        words = dict((letter.decode(), float(value)) for letter, value in WORD.findall(cmd) if value)
+        if 'G' in words:
+            mode = int(words['G'])
+        target = [words.get('X', pos[0]), words.get('Y', pos[1]), words.get('Z', pos[2])]
+        cutting = pos[2] < 0 and target[2] == pos[2] and pos[0] is not None
+        if cutting and target[:2] != pos[:2]:
+            if mode in (2, 3):
+                arcs += 1
+                cx, cy = pos[0] + words.get('I', 0.0), pos[1] + words.get('J', 0.0)
+                r = math.hypot(pos[0] - cx, pos[1] - cy)
+                a0 = math.atan2(pos[1] - cy, pos[0] - cx)
+                sweep = math.atan2(target[1] - cy, target[0] - cx) - a0
+                if mode == 3 and sweep <= 0:
+                    sweep += 2 * math.pi
+                if mode == 2 and sweep >= 0:
+                    sweep -= 2 * math.pi
+                a = a0 + sweep * np.linspace(0, 1, max(2, int(abs(sweep) * r / step)))
+                out.append(np.stack((cx + r * np.cos(a), cy + r * np.sin(a)), 1))
+            else:
+                t = np.linspace(0, 1, max(2, int(math.dist(pos[:2], target[:2]) / step)))[:, None]
+                out.append(np.array(pos[:2]) + t * (np.array(target[:2]) - np.array(pos[:2])))
+        pos = target
+    return np.concatenate(out), arcs
+
+
+def distance_to_polyline(q, path):
+    p = np.asarray(path, dtype=float)
+    a, ab = p[:-1], p[1:] - p[:-1]
+    qa = q[:, None, :] - a
+    t = np.clip((qa * ab).sum(2) / (ab * ab).sum(1), 0, 1)
+    return np.hypot(*(qa - t[..., None] * ab).transpose(2, 0, 1)).min(1)
+
+
+def arc_path(cx, cy, r, a0, sweep, n):
+    return [(cx + r * math.cos(a0 + sweep * k / n), cy + r * math.sin(a0 + sweep * k / n))
+            for k in range(n + 1)]
+
+
+@pytest.mark.parametrize('tolerance', [0.02, 0.05, 0.1])
+@pytest.mark.parametrize('path', [
+    arc_path(100, 100, 30, 0, 2 * math.pi, 200),
+    arc_path(60, 80, 30.67, 1.0, -5.5, 40),
+    arc_path(90, 120, 8.0, 2.0, 4.5, 44),
+    arc_path(50, 50, 37.1, 0.3, 3.0, 61),
+], ids=['circle', 'cw', 'small', 'half'])
+def test_arcs_follow_the_path(path, tolerance):
+    fake = FakeGrblSerial(feed_override=1e5)
+    dev = CricutMaker(log=io.StringIO(), dev=fake, progress_cb=lambda *args: None)
+    dev.setup(toolholder=1, arc_tolerance=tolerance, clip_fuzz=RESOLUTION)
+    record = []
+    dev.plot(pathlist=[path], offset=(0, 0), record=record)
+    q, arcs = cut_samples(record)
+    assert fake.errors == 0
+    # the ends of arcs and lines alike are rounded to the device resolution
+    assert distance_to_polyline(q, path).max() <= tolerance + 0.5 * RESOLUTION * math.sqrt(2)
+    if tolerance >= 0.1:
+        assert arcs > 0
+
+
+def test_arcs_up_to_half_circle():
+    path = arc_path(100, 100, 30, 0, 2 * math.pi, 200)
+    xs, ys = zip(*path)
+    arcs = fit_arcs(xs, ys, 0.02)
+    assert len(arcs) >= 2
+    for i, j, cx, cy, ccw in arcs:
+        a = [math.atan2(ys[k] - cy, xs[k] - cx) for k in (i, j)]
+        assert (a[1] - a[0]) % (2 * math.pi) <= math.pi + 1e-9
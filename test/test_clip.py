@@ -0,0 +1,56 @@
+"""Clipping of the segments to the media, in clip_segments and in plot()."""
+import io
+
+import numpy as np
+
+from cutcutgo.Cutcutgo import CricutMaker
+from cutcutgo.FakeGrbl import FakeGrblSerial
+from cutcutgo.Geometry import clip_segments
+
+BOX = (0.0, 0.0, 10.0, 10.0)
+
+
+def test_clipped_end_points():
+    p = np.array([(5.0, 5.0), (15.0, 5.0), (15.0, 7.0), (5.0, 9.0),
+                  (-5.0, 12.0), (-5.0, -1.0), (3.3, 4.1), (6.7, 2.9)])
+    visible, t0, t1, a, b = clip_segments(p, BOX)
+    assert visible.tolist() == [True, False, True, True, False, True, True]
+    # leaves the box at the right edge
+    assert t0[0] == 0 and t1[0] == 0.5
+    assert a[0].tolist() == [5.0, 5.0] and b[0].tolist() == [10.0, 5.0]
+    # enters again at the right edge
+    assert t0[2] == 0.5 and t1[2] == 1
+    assert a[2].tolist() == [10.0, 8.0] and b[2].tolist() == [5.0, 9.0]
+    # leaves at the top edge
+    assert np.isclose(t1[3], 1 / 3.) and np.allclose(b[3], (5 - 10 / 3., 10.0))
+    assert a[3].tolist() == [5.0, 9.0]
+    # enters at the left edge, from outside of two edges
+    assert np.allclose(a[5], (0.0, -1 + 5.1 * 5 / 8.3)) and b[5].tolist() == [3.3, 4.1]
+    # inside: the original points, not interpolated ones
+    assert t0[6] == 0 and t1[6] == 1
+    assert a[6].tolist() == [3.3, 4.1] and b[6].tolist() == [6.7, 2.9]
+
+
+def test_segments_along_and_through_the_edges():
+    p = np.array([(0.0, 2.0), (0.0, 8.0), (-1.0, 8.0), (-1.0, 2.0), (-2.0, -2.0), (12.0, 12.0)])
+    visible, t0, t1, a, b = clip_segments(p, BOX)
+    # on the edge is inside, parallel outside of it is not
+    assert visible.tolist() == [True, False, False, False, True]
+    assert a[0].tolist() == [0.0, 2.0] and b[0].tolist() == [0.0, 8.0]
+    # through the box, across two corners
+    assert np.allclose(a[4], (0, 0)) and np.allclose(b[4], (10, 10))
+
+
+def test_plot_cuts_up_to_the_media_border():
+    fake = FakeGrblSerial(feed_override=1e5)
+    dev = CricutMaker(log=io.StringIO(), dev=fake, progress_cb=lambda *args: None)
+    dev.setup(toolholder=1)
+    record = []
+    bbox = dev.plot(pathlist=[[(10, 10), (300, 10), (300, 20), (10, 20)]], offset=(0, 0),
+                    record=record)
+    border = bbox['bbox']['clip']['urx'] + dev.clip_fuzz
+    assert bbox['bbox']['clip']['count'] == 2
+    # a cut to the border, one move along outside, a cut back from the border
+    assert record[2:8] == [b'G1Z-8.5', b'X%g' % border, b'Z-6.5', b'G0Y20', b'G1Z-8.5', b'X10']
+    fake.wait_idle()
+    assert fake.errors == 0
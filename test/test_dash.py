@@ -0,0 +1,37 @@
+"""dash_paths: where the dashes of a pattern start and end."""
+import pytest
+
+from cutcutgo.Geometry import dash_paths
+
+LINE = [(0, 0), (10, 0)]
+
+
+def test_dashes_along_a_line():
+    assert dash_paths([LINE], [2, 1]) == [[(0, 0), (2, 0)], [(3, 0), (5, 0)],
+                                          [(6, 0), (8, 0)], [(9, 0), (10, 0)]]
+    # an odd pattern is repeated: dash 2, gap 2
+    assert dash_paths([LINE], [2]) == [[(0, 0), (2, 0)], [(4, 0), (6, 0)], [(8, 0), (10, 0)]]
+
+
+def test_offset_shifts_the_phase():
+    assert dash_paths([LINE], [2, 1], offset=1) == [[(0, 0), (1, 0)], [(2, 0), (4, 0)],
+                                                    [(5, 0), (7, 0)], [(8, 0), (10, 0)]]
+    # whole periods make no difference
+    assert dash_paths([LINE], [2, 1], offset=7) == dash_paths([LINE], [2, 1], offset=1)
+
+
+def test_pattern_restarts_on_each_path():
+    paths = [[(0, 0), (4, 0)], [(0, 5), (4, 5)], [(2, 2), (2, 6)]]
+    assert dash_paths(paths, [3, 2]) == [[(0, 0), (3, 0)], [(0, 5), (3, 5)], [(2, 2), (2, 5)]]
+
+
+def test_dash_carries_the_corner():
+    # the first dash turns the corner, the second starts after it
+    assert dash_paths([[(0, 0), (3, 0), (3, 4)]], [4, 1]) == \
+           [[(0, 0), (3, 0), (3, 1)], [(3, 2), (3, 4)]]
+
+
+def test_without_pattern():
+    assert dash_paths([[(0, 0), (3, 0)], [(1, 1)]], [0, 0]) == [[(0, 0), (3, 0)]]
+    with pytest.raises(ValueError):
+        dash_paths([LINE], [2, -1])
@@ -0,0 +1,61 @@
+"""CutterFarm.run with simulated cutters, some of which fail."""
+import io
+
+from serial import SerialException
+
+from cutcutgo.Cutcutgo import CricutMaker
+from cutcutgo.Farm import CutterFarm
+from cutcutgo.FakeGrbl import FakeGrblSerial
+
+
+class BrokenGrbl(FakeGrblSerial):
+    """Loses the connection after the setup commands."""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.broken = False
+
+    def write(self, data):
+        if self.broken and data != b'?':
+            raise SerialException('device disconnected')
+        return super().write(data)
+
+
+def farm(*broken):
+    cutters = []
+    for i, fail in enumerate(broken):
+        fake = BrokenGrbl(feed_override=1e5, port='fake-%d' % i)
+        cutters.append(CricutMaker(log=io.StringIO(), dev=fake, progress_cb=lambda *args: None))
+    f = CutterFarm(log=io.StringIO(), cutters=cutters)
+    f.setup(toolholder=1)
+    for cutter, fail in zip(cutters, broken):
+        cutter.dev.broken = fail
+    return f
+
+
+def jobs(n):
+    return [dict(pathlist=[[(10, 10 + k), (20 + k, 10)]], offset=(0, 0)) for k in range(n)]
+
+
+def test_one_failing_cutter_leaves_no_job_unreported():
+    results = farm(True).run(jobs(3), wait_done=False)
+    assert all(result is not None for result in results)
+    failed = [result for result in results if result['cutter'] == 0]
+    assert len(failed) == 1 and isinstance(failed[0]['error'], SerialException)
+    assert sorted(map(str, (result['error'] for result in results))) == \
+           ['device disconnected', 'not cut', 'not cut']
+
+
+def test_remaining_jobs_go_to_working_cutters():
+    results = farm(True, False).run(jobs(6), wait_done=False)
+    assert sum('error' in result for result in results) <= 1
+    assert all(result['cutter'] == 1 for result in results if 'bbox' in result)
+    assert sum('bbox' in result for result in results) >= 5
+
+
+def test_failing_next_sheet_puts_the_job_back():
+    def next_sheet(i, n):
+        if i == 0:
+            raise RuntimeError('no sheet')
+    results = farm(False, False).run(jobs(4), next_sheet=next_sheet, wait_done=False)
+    assert [result['cutter'] for result in results] == [1, 1, 1, 1]
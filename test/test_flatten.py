@@ -0,0 +1,46 @@
+"""flatten_superpath stays within the tolerance of the curves."""
+import numpy as np
+import pytest
+
+from cutcutgo.Geometry import flatten_superpath
+
+K = 4 / 3. * (2 ** 0.5 - 1)
+# a quarter circle of radius 50, and an S curve, as inkex superpaths
+QUARTER = [[[50, 0], [50, 0], [50, 50 * K]], [[50 * K, 50], [0, 50], [0, 50]]]
+S = [[[0, 0], [0, 0], [40, 60]], [[-20, 60], [30, 30], [30, 30]]]
+
+
+def cubic(node0, node1, n=5000):
+    u = np.linspace(0, 1, n)[:, None]
+    b = np.array((node0[1], node0[2], node1[0], node1[1]), dtype=float)
+    return (1-u)**3*b[0] + 3*(1-u)**2*u*b[1] + 3*(1-u)*u**2*b[2] + u**3*b[3]
+
+
+def distance(points, line):
+    """Distance of each point to the polyline."""
+    a, b = np.array(line[:-1]), np.array(line[1:])
+    d = b - a
+    t = ((points[:, None] - a) * d).sum(axis=2) / (d * d).sum(axis=1)
+    near = a + np.clip(t, 0, 1)[:, :, None] * d
+    return np.hypot(*(points[:, None] - near).T).min(axis=0)
+
+
+@pytest.mark.parametrize('tolerance', [1.0, 0.05, 0.001])
+def test_deviation_within_tolerance(tolerance):
+    quarter, s = flatten_superpath([QUARTER, S], tolerance=tolerance)
+    for sp, line in ((QUARTER, quarter), (S, s)):
+        assert line[0] == tuple(sp[0][1]) and line[-1] == tuple(sp[-1][1])
+        assert distance(cubic(*sp), line).max() <= tolerance
+    # not more pieces than needed: a circle needs about 1/sqrt(8 tolerance/r) per radian
+    assert len(quarter) - 1 <= 2 * np.pi / 2 / np.sqrt(8 * tolerance / 50) + 2
+
+
+def test_straight_segments_stay_single_lines():
+    line = [[[0, 0], [0, 0], [3, 4]], [[6, 8], [9, 12], [9, 12]], [[9, 12], [0, 12], [0, 12]]]
+    assert flatten_superpath([line, []]) == [[(0, 0), (9, 12), (0, 12)], []]
+
+
+@pytest.mark.parametrize('tolerance', [0, -1])
+def test_tolerance_must_be_positive(tolerance):
+    with pytest.raises(ValueError):
+        flatten_superpath([QUARTER], tolerance=tolerance)
@@ -0,0 +1,28 @@
+"""Path fusing must not reorder paths for the order keeping strategies."""
+from cutcutgo.StrategyMinTraveling import fuse, fuse_adjacent
+
+PATHS = [
+    [(0, 0), (1, 0)],
+    [(5, 5), (6, 6)],
+    [(1, 0), (2, 0)],           # continues the first path, but comes later
+    [(2, 0), (3, 0)],
+    [(6, 6.005), (7, 7)],
+]
+
+
+def test_fuse_adjacent_keeps_order():
+    got = fuse_adjacent([list(p) for p in PATHS], tolerance=0.01)
+    assert got == [
+        [(0, 0), (1, 0)],
+        [(5, 5), (6, 6)],
+        [(1, 0), (2, 0), (3, 0)],
+        [(6, 6.005), (7, 7)],
+    ]
+
+
+def test_fuse_chains_out_of_order():
+    got = fuse([list(p) for p in PATHS], tolerance=0.01)
+    assert got == [
+        [(0, 0), (1, 0), (2, 0), (3, 0)],
+        [(5, 5), (6, 6), (7, 7)],
+    ]
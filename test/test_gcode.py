@@ -0,0 +1,88 @@
+"""The G-code that plot() records and sends."""
+import io
+import re
+
+import pytest
+
+from cutcutgo.Cutcutgo import CricutMaker
+from cutcutgo.FakeGrbl import FakeGrblSerial
+
+WORD = re.compile(rb'([A-Z])([-+]?[0-9]*\.?[0-9]*)')
+
+
+def cutter():
+    fake = FakeGrblSerial(feed_override=1e5)
+    dev = CricutMaker(log=io.StringIO(), dev=fake, progress_cb=lambda *args: None)
+    dev.setup(toolholder=1)
+    return dev, fake
+
+
+def check_modal(cmds):
+    """Every move runs in a motion mode set by the stream itself, with a feed for G1."""
+    mode = feed = None
+    for cmd in cmds:
+        if cmd.startswith(b'$') or cmd.startswith(b'T'):
+            continue
+        words = dict((letter, value) for letter, value in WORD.findall(cmd))
+        if b'G' in words:
+            mode = int(words[b'G'])
+        if b'F' in words:
+            feed = float(words[b'F'])
+        if any(axis in words for axis in (b'X', b'Y', b'Z')):
+            assert mode is not None, cmd
+            assert mode == 0 or feed is not None, cmd
+
+
+@pytest.mark.parametrize('bboxonly', [True, False])
+def test_plot_stream_is_modal_complete(bboxonly):
+    dev, fake = cutter()
+    record = []
+    dev.plot(pathlist=[[(10, 10), (20, 10), (20, 20)]], offset=(0, 0),
+             bboxonly=bboxonly, record=record)
+    check_modal(record)
+    assert fake.errors == 0
+    # the approach comes first, with its motion mode and feed
+    assert record[0] == b'G1Z-6.5F10'
+
+
+def test_bboxonly_stream():
+    dev, fake = cutter()
+    record = []
+    dev.plot(pathlist=[[(10, 10), (20, 10), (20, 20)]], offset=(0, 0),
+             bboxonly=True, record=record)
+    assert record == [b'G1Z-6.5F10', b'G0X10Y10', b'G1Z-8.5', b'X20', b'Y20', b'X10', b'Y10',
+                      b'Z0', b'G0Y0']
+    fake.wait_idle()
+    assert fake.pos == [10.0, 0.0, 0.0]
+
+
+def test_long_paths_are_cut_in_chunks(monkeypatch):
+    import math
+    import cutcutgo.Cutcutgo
+    paths = [[(100 + 60 * math.cos(k * 0.01), 150 + 60 * math.sin(k * 0.01)) for k in range(700)],
+             [(-5, 5), (20, 5)],
+             [(10 + k * 0.1, 20 + (k % 2)) for k in range(300)]]
+    streams = []
+    for chunk in (100000, 64, 7):
+        monkeypatch.setattr(cutcutgo.Cutcutgo, 'PLOT_CHUNK_POINTS', chunk)
+        dev, fake = cutter()
+        record = []
+        bbox = dev.plot(pathlist=paths, offset=(0, 0), record=record)['bbox']
+        streams.append((record, bbox['count'], bbox['clip']['count']))
+    assert streams[1] == streams[0] and streams[2] == streams[0]
+    assert streams[0][1:] == (1002, 1)
+
+
+def test_commands_start_before_all_paths_are_converted():
+    consumed = []
+
+    def paths():
+        for i in range(100000):
+            consumed.append(i)
+            yield [(10, 10 + i * 0.001), (20, 10 + i * 0.001)]
+
+    dev, fake = cutter()
+    bbox = {'clip': dev._media_clip(210, 297, None, None)}
+    cmds = dev.plot_cmds(paths(), bbox, 0, 0)
+    next(cmds)
+    assert len(consumed) < 5000
@@ -0,0 +1,71 @@
+"""Job cache: commands stored while the job is sent, read back while it is sent again."""
+import io
+import os
+
+from cutcutgo.Cutcutgo import CricutMaker
+from cutcutgo.FakeGrbl import FakeGrblSerial
+from cutcutgo.JobCache import CachedCommands, JobCache, sources_hash
+
+
+def cutter():
+    fake = FakeGrblSerial(feed_override=1e5)
+    dev = CricutMaker(log=io.StringIO(), dev=fake, progress_cb=lambda *args: None)
+    dev.setup(toolholder=1)
+    return dev, fake
+
+
+def test_record_and_replay(tmp_path):
+    cache = JobCache(str(tmp_path))
+    key = JobCache.key('job')
+    path = [[(10, 10), (20, 10), (20, 20)]]
+    record = cache.record(key)
+    dev, fake = cutter()
+    bbox = dev.plot(pathlist=path, offset=(0, 0), record=record)
+    assert record.lines == fake.lines - 2       # after the setup commands
+    record.commit(dict(bbox=bbox['bbox']))
+    cmds = []
+    cutter()[0].plot(pathlist=path, offset=(0, 0), record=cmds)
+    assert cache.get(JobCache.key('other')) is None
+
+    compiled, meta = cache.get(key)
+    assert isinstance(compiled, CachedCommands) and len(compiled) == len(cmds)
+    assert list(compiled) == cmds
+    assert meta['lines'] == len(cmds)
+
+    dev, fake = cutter()
+    dev.plot_compiled(compiled, meta['bbox'])
+    fake.wait_idle()
+    assert fake.errors == 0
+    assert fake.pos == [20.0, 0.0, 0.0]
+
+
+def test_abort_leaves_no_entry(tmp_path):
+    cache = JobCache(str(tmp_path))
+    record = cache.record('k')
+    record.append(b'G1X1')
+    record.abort()
+    assert cache.get('k') is None
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_sources_hash(tmp_path):
+    extra = tmp_path / 'extension.py'
+    extra.write_text('a = 1\n')
+    before = sources_hash(str(extra))
+    assert sources_hash(str(extra)) == before
+    extra.write_text('a = 2\n')
+    assert sources_hash(str(extra)) != before
+
+
+def test_output_key_follows_the_device():
+    dev, fake = cutter()
+    same, fake = cutter()
+    assert dev.output_key() == same.output_key()
+    dry = CricutMaker(log=io.StringIO(), dry_run=True, dev=None)
+    assert dry.output_key() != dev.output_key()
+    wider = cutter()[0]
+    wider.hardware = dict(wider.hardware, width_mm=300)
+    assert wider.output_key() != dev.output_key()
+    right = cutter()[0]
+    right.setup(toolholder=1, leftaligned=not dev.leftaligned)
+    assert right.output_key() != dev.output_key()
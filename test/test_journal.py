@@ -0,0 +1,135 @@
+"""Job journal: written while the job is sent, resumed after a lost connection."""
+import io
+import json
+
+import pytest
+from serial import SerialException
+
+from cutcutgo.Cutcutgo import CricutMaker
+from cutcutgo.FakeGrbl import FakeGrblSerial
+from cutcutgo.Journal import JobJournal, journal_path
+
+
+class FlakyGrbl(FakeGrblSerial):
+    """Loses the connection after the given number of writes."""
+
+    def __init__(self, fail_after, **kw):
+        super().__init__(**kw)
+        self.fail_after = fail_after
+
+    def write(self, data):
+        if data != b'?':
+            if self.fail_after <= 0:
+                raise SerialException('device disconnected')
+            self.fail_after -= 1
+        return super().write(data)
+
+
+def job():
+    return [[(10 + i, 10 + (i % 2) * 5) for i in range(80)],
+            [(100, 100), (120, 100), (120, 120)]]
+
+
+def cutter(fake, journal, **kw):
+    dev = CricutMaker(log=io.StringIO(), dev=fake, journal=journal,
+                      progress_cb=lambda *args: None, **kw)
+    dev.setup(toolholder=1)
+    return dev
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_resume_after_serial_exception(tmp_path, streaming):
+    path = str(tmp_path / 'job')
+    reference = FakeGrblSerial(feed_override=1e5)
+    record = []
+    cutter(reference, None, streaming=streaming).plot(pathlist=job(), offset=(0, 0), record=record)
+    reference.wait_idle()
+
+    dev = cutter(FlakyGrbl(40, feed_override=1e5), path, streaming=streaming)
+    with pytest.raises(SerialException):
+        dev.plot(pathlist=job(), offset=(0, 0))
+    # the whole job is in the journal, the checkpoint only counts sent lines
+    interrupted = JobJournal.load(path)
+    assert interrupted.meta['complete'] and not interrupted.meta['done']
+    assert interrupted.meta['executed'] <= 40 < interrupted.lines
+    assert list(interrupted.commands()) == record
+
+    fake = FakeGrblSerial(feed_override=1e5)
+    resumed = cutter(fake, path, streaming=streaming)
+    assert resumed.resume()
+    fake.wait_idle()
+    assert fake.errors == 0
+    assert fake.pos == reference.pos
+    finished = JobJournal.load(path)
+    assert finished.meta['done'] and finished.meta['executed'] == finished.lines
+    assert not resumed.resume()
+
+
+def test_journal_is_written_while_sending(tmp_path):
+    path = str(tmp_path / 'job')
+    fake = FakeGrblSerial(feed_override=1e5)
+    dev = cutter(fake, path, streaming=True)
+    sent_before_last = []
+
+    def cmds():
+        yield from (b'G1X%dY%dF6000' % (i % 7, i % 5) for i in range(300))
+        sent_before_last.append(fake.lines)
+        yield b'G1X0Y0'
+
+    dev.send_journaled(cmds())
+    # the first lines were executed before the job was compiled completely
+    assert sent_before_last[0] > 0
+    with open(path + '.json') as f:
+        meta = json.load(f)
+    assert meta['lines'] == 301 and meta['done']
+    assert list(JobJournal(path).commands(299)) == [b'G1X5Y4F6000', b'G1X0Y0']
+
+
+def test_journal_per_device():
+    assert journal_path('/dev/ttyACM0') != journal_path('/dev/ttyACM1')
+    dev = CricutMaker(log=io.StringIO(), dev=FakeGrblSerial(port='/dev/ttyACM1'), journal=True)
+    assert dev.journal == journal_path('/dev/ttyACM1')
+
+
+
+class InterruptedGrbl(FlakyGrbl):
+    """Ctrl-C while the job is sent."""
+
+    def write(self, data):
+        if data != b'?' and self.fail_after <= 0:
+            raise KeyboardInterrupt
+        return super().write(data)
+
+
+def test_failing_generator_leaves_the_job_incomplete(tmp_path):
+    path = str(tmp_path / 'job')
+    dev = cutter(FakeGrblSerial(feed_override=1e5), path, streaming=True)
+
+    def cmds():
+        yield from (b'G1X%dY%dF6000' % (i % 7, i % 5) for i in range(200))
+        raise OSError('cannot read the rest of the job')
+
+    with pytest.raises(OSError):
+        dev.send_journaled(cmds())
+    job = JobJournal.load(path)
+    assert job.lines == 200
+    assert not job.meta['complete'] and not job.meta['done']
+    assert not dev.resume()
+
+
+def test_interrupt_does_not_compile_the_rest(tmp_path):
+    path = str(tmp_path / 'job')
+    dev = cutter(InterruptedGrbl(50, feed_override=1e5), path, streaming=True)
+    generated = []
+
+    def cmds():
+        for i in range(100000):
+            generated.append(i)
+            yield b'G1X%dY%dF6000' % (i % 7, i % 5)
+
+    with pytest.raises(KeyboardInterrupt):
+        dev.send_journaled(cmds())
+    job = JobJournal.load(path)
+    assert job.lines == len(generated) < 100
+    assert not job.meta['complete']
+    assert not dev.resume()
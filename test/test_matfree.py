@@ -0,0 +1,46 @@
+"""MatFree on the PointStore must give the results of the former XY_a object model.
+
+The expected outputs in data/matfree_*.json were recorded with the XY_a
+implementation, with their point attributes.
+"""
+import json
+import os
+
+import pytest
+
+from cutcutgo.Strategy import MatFree
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def read_dump(name):
+    with open(os.path.join(ROOT, name)) as f:
+        return eval([line for line in f if line.strip() and line[0] != '#'][0])
+
+
+@pytest.mark.parametrize('dump, expected', [
+    ('misc/dump/boxed_triangle.dump', 'matfree_boxed_triangle.json'),
+    ('examples/testcut_square_triangle.dump', 'matfree_testcut_square_triangle.json'),
+])
+@pytest.mark.parametrize('tool', ['knife', 'pen'])
+def test_matfree_output_and_attributes(dump, expected, tool):
+    with open(os.path.join(DATA, expected)) as f:
+        want = json.load(f)[tool]
+    mf = MatFree('default', scale=1.0, pen=(tool == 'pen'))
+    mf.verbose = 0
+    got = mf.apply(read_dump(dump))
+
+    assert [[(pt[0], pt[1]) for pt in path] for path in got] == \
+           [[(x, y) for x, y, att in path] for path in want]
+    assert [[pt.att() for pt in path] for path in got] == \
+           [[att for x, y, att in path] for path in want]
+    assert any(att.get('sharp') for path in want for x, y, att in path)
+
+
+def test_overshoot_keeps_sharp():
+    mf = MatFree('default', scale=1.0, pen=False)
+    mf.verbose = 0
+    got = mf.apply(read_dump('misc/dump/boxed_triangle.dump'))
+    ends = [pt for path in got for pt in (path[0], path[-1])]
+    assert any(getattr(pt, 'sharp', False) for pt in ends)
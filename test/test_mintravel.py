@@ -0,0 +1,77 @@
+"""Path ordering of the min travel strategies: greedy sort and local improvement."""
+import math
+import random
+
+import pytest
+
+from cutcutgo.StrategyMinTraveling import findnearestpath, improve, sort
+
+
+def random_paths(seed, n=150):
+    rnd = random.Random(seed)
+    paths = []
+    for i in range(n):
+        # a coarse grid, so that some end points coincide and ties are broken
+        pts = [(rnd.randint(0, 40) * 0.5, rnd.randint(0, 40) * 0.5) for k in range(rnd.randint(2, 6))]
+        if i % 4 == 0:
+            pts.append(pts[0])          # closed path
+        paths.append(pts)
+    return paths
+
+
+def linear_sort(paths, entrycircular, reversible):
+    """The former sort(): a linear scan for the nearest path, every time."""
+    pos = (0, 0)
+    out = []
+    while paths:
+        i, path = findnearestpath(paths, pos, entrycircular, reversible)
+        paths.pop(i)
+        pos = path[-1]
+        out.append(path)
+    return out
+
+
+def travel(paths, pos=(0, 0)):
+    total = 0.0
+    for path in paths:
+        total += math.dist(pos, path[0])
+        pos = path[-1]
+    return total
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+@pytest.mark.parametrize('entrycircular, reversible', [(False, True), (True, True), (True, False)])
+def test_sort_matches_linear_scan(seed, entrycircular, reversible):
+    expected = linear_sort(random_paths(seed), entrycircular, reversible)
+    paths = random_paths(seed)
+    got = sort(paths, entrycircular=entrycircular, reversible=reversible)
+    assert got == expected
+    assert paths == []                  # consumed, as before
+
+
+def test_sort_enters_closed_paths_anywhere():
+    square = [(10, 10), (20, 10), (20, 0), (10, 0), (10, 10)]
+    line = [(30, 0), (40, 0)]
+    got = sort([list(line), list(square)], entrycircular=True)
+    # the corner nearest to the origin is the entry, the path stays closed
+    assert got[0] == [(10, 0), (10, 10), (20, 10), (20, 0), (10, 0)]
+    assert got[1] == line
+
+
+@pytest.mark.parametrize('reversible', [True, False])
+def test_improve_reduces_travel(reversible):
+    # every other path lies far to the right: the given order zigzags
+    paths = [[(x, 0), (x, 5)] if i % 2 == 0 else [(x + 100, 5), (x + 100, 0)]
+             for i, x in enumerate(range(0, 40, 2))]
+    better = improve([list(p) for p in paths], seconds=5.0, reversible=reversible)
+    assert travel(better) < 0.5 * travel(paths)
+    # the same paths, each once; only reversible orders turn them around
+    key = (lambda p: tuple(sorted((p[0], p[-1])))) if reversible else (lambda p: tuple(p))
+    assert sorted(map(key, better)) == sorted(map(key, paths))
+
+
+def test_improve_never_makes_it_worse():
+    paths = sort(random_paths(7), entrycircular=True)
+    better = improve([list(p) for p in paths], seconds=2.0)
+    assert travel(better) <= travel(paths) + 1e-9
+    assert len(better) == len(paths)
@@ -0,0 +1,26 @@
+"""Blade serifs at the corners of a path."""
+import math
+
+from cutcutgo.Geometry import path_serifs
+
+
+def test_short_paths_stay_as_they_are():
+    assert path_serifs([]) == []
+    assert path_serifs([(1.0, 2.0)]) == [(1.0, 2.0)]
+    assert path_serifs([(0.0, 0.0), (5.0, 0.0)]) == [(0.0, 0.0), (5.0, 0.0)]
+
+
+def test_right_angle_corner():
+    out = path_serifs([(0, 0), (10, 0), (10, 10)], blade_width=0.9)
+    assert out[0] == (0.0, 0.0) and out[-1] == (10.0, 10.0)
+    # overcut by half the blade width, swing around the corner, enter the next segment
+    assert out[1] == (10.45, 0.0)
+    assert out[-2] == (10.0, 0.45)
+    swing = out[2:-1]
+    assert all(abs(math.dist(pt, (10, 0)) - 0.45) < 1e-12 for pt in swing)
+    assert len(swing) == 11             # pi/2 in steps of pi/20, both ends included
+
+
+def test_shallow_turns_get_no_serif():
+    path = [(0, 0), (10, 0), (20, 1), (30, 1)]
+    assert path_serifs(path) == [(float(x), float(y)) for x, y in path]
@@ -0,0 +1,41 @@
+"""simplify_paths keeps the ends and the sharp corners of the paths."""
+import os
+
+import pytest
+
+from cutcutgo.Geometry import simplify_paths
+from cutcutgo.Strategy import MatFree
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def read_dump(name):
+    with open(os.path.join(ROOT, name)) as f:
+        return eval([line for line in f if line.strip() and line[0] != '#'][0])
+
+
+@pytest.mark.parametrize('dump', ['misc/dump/boxed_triangle.dump',
+                                  'examples/testcut_square_triangle.dump'])
+@pytest.mark.parametrize('tolerance', [0.0, 0.01, 1.0])
+def test_matfree_corners_are_kept(dump, tolerance):
+    mf = MatFree('default', scale=1.0)
+    mf.verbose = 0
+    paths = mf.apply(read_dump(dump))
+    corners = [pt for path in paths for pt in path if getattr(pt, 'sharp', False)]
+    assert corners
+
+    simplified = simplify_paths(paths, tolerance=tolerance, min_length=0.05)
+    kept = set(id(pt) for path in simplified for pt in path)
+    assert all(id(pt) in kept for pt in corners)
+    for before, after in zip(paths, simplified):
+        assert after[0] is before[0] and after[-1] is before[-1]
+
+
+def test_corners_without_attributes_are_kept():
+    spike = [(0, 0), (5, 0), (4.998, 0.008), (10, 0)]
+    assert simplify_paths([spike], tolerance=0.01) == [spike]
+    # shallow bends within the tolerance are dropped
+    assert simplify_paths([[(0, 0), (5, 0.005), (10, 0)]], tolerance=0.01) == [[(0, 0), (10, 0)]]
+    # repeated points are no corners, min_length drops the repetition
+    assert simplify_paths([[(0, 0), (5, 0), (5, 0), (10, 0)]], min_length=0.05) == \
+           [[(0, 0), (5, 0), (10, 0)]]
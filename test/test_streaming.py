@@ -0,0 +1,122 @@
+"""The serial sender of CricutMaker, against the simulated controller."""
+import io
+from collections import deque
+
+from cutcutgo.Cutcutgo import CricutMaker
+from cutcutgo.FakeGrbl import FakeGrblSerial, GRBL_RX_BUFFER_SIZE
+
+
+class CountingGrbl(FakeGrblSerial):
+    """Tracks the bytes of the lines the host sent and has no reply for yet."""
+
+    def __init__(self, **kw):
+        super().__init__(**kw)
+        self.inflight = deque()
+        self.peak_inflight = 0
+        self.acks = 0
+
+    def write(self, data):
+        if data != b'?':
+            self.inflight.append(len(data))
+            self.peak_inflight = max(self.peak_inflight, sum(self.inflight))
+        return super().write(data)
+
+    def readline(self):
+        line = super().readline()
+        if line.startswith((b'ok', b'error')):
+            self.inflight.popleft()
+            self.acks += 1
+        return line
+
+
+def moves(n):
+    cmds = [b'G1F6000']
+    for i in range(1, n):
+        cmds.append(b'X%gY%g' % (i % 7 * 0.5, i % 5 * 0.5))
+    return cmds
+
+
+def test_character_counting_flow_control():
+    cmds = moves(500)
+    cmds[100] = b'G5X1'                 # unsupported, answered with error:20
+    fake = CountingGrbl(feed_override=1e5)
+    progress = []
+    dev = CricutMaker(log=io.StringIO(), dev=fake, streaming=True,
+                      progress_cb=lambda done, total, msg: progress.append(done))
+    dev.send_receive_command(iter(cmds), total=len(cmds))
+
+    assert fake.peak_inflight <= GRBL_RX_BUFFER_SIZE
+    assert fake.peak_rx <= GRBL_RX_BUFFER_SIZE
+    assert fake.overflows == 0
+    # more than one line was in flight at a time
+    assert fake.peak_inflight > 2 * len(cmds[1]) + 2
+    # every line was executed and acknowledged exactly once
+    assert fake.lines == len(cmds)
+    assert fake.acks == len(cmds)
+    assert not fake.inflight
+    assert progress[-1] == len(cmds)
+    assert dev.line_errors == [(101, b'G5X1', 'error:20')]
+
+
+def test_streaming_is_faster_than_lockstep():
+    elapsed = {}
+    for streaming in (False, True):
+        fake = FakeGrblSerial(feed_override=1e5)
+        dev = CricutMaker(log=io.StringIO(), dev=fake, streaming=streaming,
+                          progress_cb=lambda *args: None)
+        dev.send_receive_command(moves(300))
+        elapsed[streaming] = fake.elapsed()
+        assert fake.lines == 300
+    assert elapsed[True] < 0.75 * elapsed[False]
+
+
+def test_status_polling_while_streaming():
+    fake = CountingGrbl(feed_override=3000, realtime=True)
+    reports = []
+    dev = CricutMaker(log=io.StringIO(), dev=fake, streaming=True, status_poll=0.02,
+                      progress_cb=lambda *args: reports.append(dev.machine_state()))
+    try:
+        dev.send_receive_command(moves(120))
+        assert dev.wait_for_ready(timeout=30, poll_interval=0.05)
+        # the reader thread parsed status reports while the lines were streamed
+        running = set(r['time'] for r in reports if r is not None and r['state'] == 'Run')
+        assert len(running) >= 2
+        assert dev.planner_size > 0
+        assert fake.acks == 120
+        assert not fake.inflight
+        assert dev.replies.empty()
+        assert dev.line_errors == []
+        assert dev.status() == 'ready'
+    finally:
+        dev.stop_status_polling()
+    assert dev.reader is None
+
+
+class TimeoutCountingGrbl(FakeGrblSerial):
+    """Counts the changes of the read timeout, each reconfigures a real port."""
+
+    def __init__(self, **kw):
+        self.timeout_changes = []
+        super().__init__(**kw)
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.timeout_changes.append(value)
+        self._timeout = value
+
+
+def test_status_polling_sets_the_timeout_once():
+    fake = TimeoutCountingGrbl(feed_override=1e5, realtime=True)
+    dev = CricutMaker(log=io.StringIO(), dev=fake, streaming=True, status_poll=0.01,
+                      progress_cb=lambda *args: None)
+    try:
+        dev.send_receive_command(moves(50))
+        assert dev.wait_for_ready(timeout=30, poll_interval=0.05)
+    finally:
+        dev.stop_status_polling()
+    # the constructor of the fake, and start_status_polling()
+    assert fake.timeout_changes == [None, 0.01]